@@ -1,30 +1,126 @@
+import argparse
+import multiprocessing
 import os
 import random
 import time
 import webbrowser
-from datetime import datetime
-from threading import Thread, Event
-from urllib.parse import urlparse, urljoin
-import pygame
-import requests
+from queue import Queue, Empty
+from threading import Thread, Event, Lock
+from urllib.parse import urlparse
 import tkinter as tk
-from bs4 import BeautifulSoup
-from PIL import Image, ImageTk
 from tkinter import ttk, messagebox, filedialog
 
+from aeropull import DownloadJournal, AsyncDownloadEngine, JobQueue, verify_folder
+from aeropull.frontier import SCHEDULES
+from aeropull.metrics import MetricsServer, SnapshotWriter
+
+
+class SoundCache:
+    """Decodes every sound in resources/ once, on a background thread.
+    
+    pygame is imported and the mixer started by the loader thread, so neither
+    the import nor any file I/O happens on the Tk thread. Sounds requested
+    before the loader reaches them are played as soon as they are decoded.
+    """
+    
+    EXTENSIONS = (".wav", ".mp3", ".ogg")
+    
+    def __init__(self, directory="resources"):
+        self.directory = directory
+        self.sounds = {}
+        self.pending = {}  # filename -> (volume, loops) requested before it was decoded
+        self.lock = Lock()
+        self.ready = Event()
+        self.pygame = None
+    
+    def preload(self):
+        """Start decoding in the background."""
+        Thread(target=self._load_all, daemon=True).start()
+    
+    def _load_all(self):
+        try:
+            import pygame
+            pygame.mixer.init()
+            self.pygame = pygame
+            filenames = sorted(
+                f for f in os.listdir(self.directory)
+                if f.lower().endswith(self.EXTENSIONS)
+            )
+        except Exception:
+            filenames = []  # No audio device or no resources; play() becomes a no-op
+        
+        for filename in filenames:
+            try:
+                sound = self.pygame.mixer.Sound(os.path.join(self.directory, filename))
+            except Exception:
+                continue
+            with self.lock:
+                self.sounds[filename] = sound
+                request = self.pending.pop(filename, None)
+            if request:
+                self._play(sound, *request)
+        
+        with self.lock:
+            self.pending.clear()  # Anything still pending doesn't exist
+        self.ready.set()
+    
+    def _play(self, sound, volume, loops):
+        try:
+            sound.set_volume(volume)
+            sound.play(loops)
+        except Exception:
+            pass
+    
+    def play(self, filename, volume=1.0, loops=0):
+        """Play a sound from resources/; missing files are silently ignored."""
+        with self.lock:
+            sound = self.sounds.get(filename)
+            if sound is None:
+                if not self.ready.is_set():
+                    self.pending[filename] = (volume, loops)
+                return
+        self._play(sound, volume, loops)
+    
+    def stop(self, filename):
+        """Stop every channel playing a sound, or cancel a pending play."""
+        with self.lock:
+            self.pending.pop(filename, None)
+            sound = self.sounds.get(filename)
+        if sound is not None:
+            try:
+                sound.stop()
+            except Exception:
+                pass
+    
+    def busy(self):
+        """Return True while any sound is still playing."""
+        try:
+            return bool(self.pygame and self.pygame.mixer.get_busy())
+        except Exception:
+            return False
+
 
 class SplashScreen:
-    """Splash screen displayed on application startup."""
+    """Splash screen displayed on application startup.
+    
+    Shown as a Toplevel of the (still hidden) main window, so the main window
+    is built while the splash is up. Click it to skip.
+    """
     
-    def __init__(self):
-        self.splash = tk.Tk()
+    DURATION = 3000  # ms
+    
+    def __init__(self, root, sounds, on_close=None):
+        self.splash = tk.Toplevel(root)
+        self.sounds = sounds
+        self.on_close = on_close
         self._setup_window()
         self._load_icon()
         self.play_random_sound()
         self._setup_images()
         self._setup_labels()
         self._setup_loading_animation()
-        self.splash.after(3000, self.close)
+        self.splash.bind('<Button-1>', lambda e: self.close())
+        self.splash.after(self.DURATION, self.close)
     
     def _setup_window(self):
         """Configure splash window appearance."""
@@ -50,6 +146,8 @@ class SplashScreen:
     def _setup_images(self):
         """Load and display splash screen images."""
         try:
+            from PIL import Image, ImageTk  # Only the splash needs PIL
+            
             img_frame = tk.Frame(self.splash, bg='#1e1e1e')
             img_frame.pack(side=tk.TOP, pady=(10, 0))
             
@@ -113,7 +211,7 @@ class SplashScreen:
         """Animate loading dots."""
         if not hasattr(self, 'splash') or not self.splash.winfo_exists():
             return
-            
+        
         dots = '.' * ((count % 4) + 1)
         self.loading_var.set(f"Loading{dots}")
         if hasattr(self, 'splash') and self.splash.winfo_exists():
@@ -122,17 +220,12 @@ class SplashScreen:
     def play_random_sound(self):
         """Play random startup sound."""
         try:
-            pygame.mixer.init()
             preopen_files = [
                 f"preopen{i}.mp3" for i in range(1, 3) 
                 if os.path.exists(os.path.join("resources", f"preopen{i}.mp3"))
             ]
             if preopen_files:
-                chosen = random.choice(preopen_files)
-                sound_path = os.path.join("resources", chosen)
-                sound = pygame.mixer.Sound(sound_path)
-                sound.set_volume(0.5)
-                sound.play()
+                self.sounds.play(random.choice(preopen_files), volume=0.5)
         except Exception:
             pass
     
@@ -140,66 +233,60 @@ class SplashScreen:
         """Close splash screen."""
         if hasattr(self, 'splash') and self.splash.winfo_exists():
             self.splash.destroy()
-    
-    def show(self):
-        """Display splash screen."""
-        self.splash.mainloop()
+            if self.on_close:
+                self.on_close()
 
 
 class FastDLDownloader:
     """Main application for FastDL downloading with enhanced features."""
     
-    def __init__(self, root):
+    def __init__(self, root, sounds=None):
         self.root = root
+        self.sounds = sounds or SoundCache()
+        if sounds is None:
+            self.sounds.preload()
         self._initialize_properties()
         self._setup_window()
         self._create_custom_title_bar()
         self._setup_ui()
         self._setup_event_handlers()
+        self._start_queue()
+    
+    def show(self):
+        """Show the main window once it has been built."""
+        self.root.deiconify()
         self.play_sound("open.wav")
     
     def _initialize_properties(self):
         """Initialize class properties."""
         self.root.title("AeroPull v1.0")  # Updated version
-        pygame.mixer.init()
-        
-        # Download tracking
-        self.total_files = 0
-        self.downloaded_files = 0
-        self.failed_files = 0
-        self.total_bytes = 0
-        self.downloaded_bytes = 0
+        
+        # Jobs run side by side from a queue saved between sessions; the selected one fills the stats row
+        self.jobs = None
+        self.shown_job = None
+        self.job_phases = {}  # job id -> last phase seen while it ran this session, for the phase sounds
+        self.job_events = Queue()  # Ids of jobs whose state changed, and verify results, posted by worker threads
+        self.metrics_reporters = []  # Metrics endpoint and snapshot writer, if asked for on the command line
         self.start_time = None
         self.last_update_time = None
         self.last_bytes = 0
+        self.last_rows_update = 0
         self.update_interval = 1.0  # Update stats every second
+        self.frame_interval = 100  # ms between progress refreshes, however fast the download
+        self.shown_status = ""
         
         # State flags
         self.running = True
-        self.downloading = False
-        self.cancel_requested = False
-        self.paused = False
-        self.pause_event = Event()
-        self.counting_files = False
-        
-        # Sound
-        self.waiting_sound = None
-        
-        # History log
-        self.history_file = "download_history.log"
-        if not os.path.exists(self.history_file):
-            with open(self.history_file, 'w') as f:
-                f.write("AeroPull Download History\n")
-                f.write("="*40 + "\n")
-        
-        # Failed downloads tracking
-        self.failed_downloads = []
-        self.max_retries = 3
-        self.retry_delay = 5  # seconds between retries
+        self.waiting_sound_playing = False
+        
+        # Defaults for the options row
+        self.max_workers = 8
+        self.engine_type = "threaded"  # or "asyncio"
+        self.prune_deleted = False
     
     def _setup_window(self):
         """Configure main window appearance."""
-        self._center_window(650, 400)  # Slightly taller for new features
+        self._center_window(700, 560)  # Tall enough for the job list
         self._set_dark_theme()
     
     def _setup_event_handlers(self):
@@ -262,7 +349,7 @@ class FastDLDownloader:
         self.main_frame.pack(fill=tk.BOTH, expand=True)
         
         # URL input
-        ttk.Label(self.main_frame, text="Enter FastDL Base URL:").pack(anchor=tk.W, pady=(0, 5))
+        ttk.Label(self.main_frame, text="Enter FastDL Base URL (mirrors of it may follow, separated by spaces):").pack(anchor=tk.W, pady=(0, 5))
         self.url_entry = ttk.Entry(self.main_frame, width=80)
         self.url_entry.pack(fill=tk.X, pady=(0, 10))
         self.url_entry.insert(0, "")
@@ -281,6 +368,68 @@ class FastDLDownloader:
         self.filetypes_entry = ttk.Entry(options_frame, textvariable=self.filetypes_var, width=40)
         self.filetypes_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
         
+        ttk.Label(options_frame, text="Workers:").pack(side=tk.LEFT, padx=(10, 5))
+        self.workers_var = tk.StringVar(value=str(self.max_workers))
+        self.workers_entry = ttk.Entry(options_frame, textvariable=self.workers_var, width=4)
+        self.workers_entry.pack(side=tk.LEFT)
+        
+        ttk.Label(options_frame, text="Engine:").pack(side=tk.LEFT, padx=(10, 5))
+        self.engine_var = tk.StringVar(value=self.engine_type)
+        self.engine_combo = ttk.Combobox(
+            options_frame,
+            textvariable=self.engine_var,
+            values=["threaded", "asyncio"],
+            state="readonly",
+            width=8
+        )
+        self.engine_combo.pack(side=tk.LEFT)
+        
+        # Link identical files to one shared copy instead of storing them in every scrape folder
+        self.store_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Dedup", variable=self.store_var).pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Unpack .bz2 files as they finish, optionally keeping the originals for later syncs
+        self.decompress_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Unpack .bz2", variable=self.decompress_var).pack(side=tk.LEFT, padx=(10, 0))
+        self.keep_compressed_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="Keep .bz2", variable=self.keep_compressed_var).pack(side=tk.LEFT, padx=(5, 0))
+        
+        sync_frame = ttk.Frame(self.main_frame)
+        sync_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        self.prune_var = tk.BooleanVar(value=self.prune_deleted)
+        ttk.Checkbutton(
+            sync_frame,
+            text="Sync: delete local files that are gone upstream",
+            variable=self.prune_var
+        ).pack(side=tk.LEFT)
+        
+        # Rate limits, applied live with Enter or when the field loses focus
+        ttk.Label(sync_frame, text="Limit KB/s:").pack(side=tk.LEFT, padx=(10, 5))
+        self.rate_limit_var = tk.StringVar(value="0")
+        rate_entry = ttk.Entry(sync_frame, textvariable=self.rate_limit_var, width=6)
+        rate_entry.pack(side=tk.LEFT)
+        
+        ttk.Label(sync_frame, text="Req/s:").pack(side=tk.LEFT, padx=(10, 5))
+        self.request_limit_var = tk.StringVar(value="0")
+        request_entry = ttk.Entry(sync_frame, textvariable=self.request_limit_var, width=4)
+        request_entry.pack(side=tk.LEFT)
+        
+        for entry in (rate_entry, request_entry):
+            entry.bind('<Return>', self.apply_limits)
+            entry.bind('<FocusOut>', self.apply_limits)
+        
+        # Which queued files download first; the crawl feeds the queue as it goes
+        ttk.Label(sync_frame, text="Order:").pack(side=tk.LEFT, padx=(10, 5))
+        self.schedule_var = tk.StringVar(value="discovery")
+        ttk.Combobox(
+            sync_frame,
+            textvariable=self.schedule_var,
+            values=list(SCHEDULES),
+            state="readonly",
+            width=9
+        ).pack(side=tk.LEFT)
+        
         # Enhanced stats display
         stats_frame = ttk.Frame(self.main_frame)
         stats_frame.pack(fill=tk.X, pady=(0, 5))
@@ -291,6 +440,10 @@ class FastDLDownloader:
         self.speed_label = ttk.Label(stats_frame, text=" | Speed: 0 KB/s")
         self.speed_label.pack(side=tk.LEFT, padx=10)
         
+        # Connections per host the engine has settled on for this server
+        self.concurrency_label = ttk.Label(stats_frame, text=" | Parallel: -")
+        self.concurrency_label.pack(side=tk.LEFT, padx=(0, 10))
+        
         self.eta_label = ttk.Label(stats_frame, text=" | ETA: --:--:--")
         self.eta_label.pack(side=tk.LEFT)
         
@@ -306,6 +459,23 @@ class FastDLDownloader:
         self.status = ttk.Label(self.main_frame, text="Ready to download")
         self.status.pack(fill=tk.X)
         
+        # Job queue; select a job to see its stats and to pause, cancel or remove it
+        self.job_tree = ttk.Treeview(
+            self.main_frame,
+            columns=("url", "state", "progress"),
+            show="headings",
+            selectmode="browse",
+            height=5
+        )
+        self.job_tree.heading("url", text="FastDL URL")
+        self.job_tree.heading("state", text="State")
+        self.job_tree.heading("progress", text="Progress")
+        self.job_tree.column("url", width=360)
+        self.job_tree.column("state", width=80, anchor=tk.CENTER)
+        self.job_tree.column("progress", width=160)
+        self.job_tree.pack(fill=tk.X, pady=(10, 0))
+        self.job_tree.bind('<<TreeviewSelect>>', self._show_selected_job)
+        
         # Buttons - Added Pause button
         btn_frame = ttk.Frame(self.main_frame)
         btn_frame.pack(pady=10)
@@ -313,12 +483,21 @@ class FastDLDownloader:
         self.download_btn = ttk.Button(btn_frame, text="Download Entire Library", command=self.start_download)
         self.download_btn.pack(side=tk.LEFT, padx=5)
         
+        self.sync_btn = ttk.Button(btn_frame, text="Sync Existing Mirror...", command=self.start_sync)
+        self.sync_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.verify_btn = ttk.Button(btn_frame, text="Verify Folder...", command=self.start_verify)
+        self.verify_btn.pack(side=tk.LEFT, padx=5)
+        
         self.pause_btn = ttk.Button(btn_frame, text="Pause", command=self.toggle_pause, state=tk.DISABLED)
         self.pause_btn.pack(side=tk.LEFT, padx=5)
         
         self.cancel_btn = ttk.Button(btn_frame, text="Cancel", command=self.cancel_download, state=tk.DISABLED)
         self.cancel_btn.pack(side=tk.LEFT, padx=5)
         
+        self.remove_btn = ttk.Button(btn_frame, text="Remove", command=self.remove_job, state=tk.DISABLED)
+        self.remove_btn.pack(side=tk.LEFT, padx=5)
+        
         # Bottom left corner links
         bottom_frame = ttk.Frame(self.main_frame)
         bottom_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=5)
@@ -338,7 +517,7 @@ class FastDLDownloader:
             webbrowser.open("https://gaq9.com")
             self.play_sound("information.wav")
         self.gaq9_label.bind("<Button-1>", open_gaq9)
-
+        
         # YouTube Channel Link
         self.youtube_label = tk.Label(
             bottom_frame, 
@@ -384,6 +563,12 @@ class FastDLDownloader:
                  background=[('active', self.button_active), ('disabled', self.button_bg)],
                  foreground=[('active', self.button_fg), ('disabled', self.fg_color)])
         style.configure('TProgressbar', background=self.progress_color, troughcolor=self.entry_bg)
+        style.configure('TCheckbutton', background=self.bg_color, foreground=self.fg_color)
+        style.map('TCheckbutton', background=[('active', self.bg_color)])
+        style.configure('Treeview', background=self.entry_bg, fieldbackground=self.entry_bg,
+                        foreground=self.fg_color)
+        style.configure('Treeview.Heading', background=self.button_bg, foreground=self.button_fg)
+        style.map('Treeview', background=[('selected', self.progress_color)])
     
     def _center_window(self, width, height):
         """Center the window on screen."""
@@ -417,11 +602,53 @@ class FastDLDownloader:
         except:
             return False
     
-    def start_download(self):
-        """Start the download process with enhanced tracking."""
-        url = self.url_entry.get().strip()
+    def start_sync(self):
+        """Ask for an existing mirror folder and bring it up to date."""
+        folder = filedialog.askdirectory(title="Select the mirror folder to sync")
+        if folder:
+            self.start_download(sync_folder=folder)
+    
+    def start_verify(self):
+        """Ask for a scrape folder and check its files against their manifest in the background."""
+        folder = filedialog.askdirectory(title="Select the scrape folder to verify")
+        if not folder:
+            return
+        self.verify_btn.config(state=tk.DISABLED)
+        self.status.config(text=f"Verifying {os.path.basename(folder)}...")
+        
+        def run():
+            try:
+                problems = verify_folder(folder)
+            except Exception as e:
+                self.job_events.put((folder, None, e))
+            else:
+                self.job_events.put((folder, problems, None))
+        
+        Thread(target=run, daemon=True).start()
+    
+    def _verify_done(self, folder, problems, error):
+        self.verify_btn.config(state=tk.NORMAL)
+        self.status.config(text="Ready to download")
+        if error:
+            messagebox.showerror("Verify Failed", str(error))
+        elif problems:
+            shown = "\n".join(f"{path}: {problem}" for path, problem in problems[:20])
+            more = f"\n...and {len(problems) - 20} more" if len(problems) > 20 else ""
+            messagebox.showwarning("Verify", f"{len(problems)} files don't match the manifest:\n\n{shown}{more}")
+        else:
+            messagebox.showinfo("Verify", f"Every file in {os.path.basename(folder)} matches its manifest.")
+    
+    def start_download(self, sync_folder=None):
+        """Queue a download of the URL in the form; it starts as soon as the queue has room.
+        
+        With sync_folder, update that existing mirror in place instead of
+        creating a new SCRAPE folder.
+        """
+        # The first URL is crawled; any others are mirrors serving the same files
+        urls = self.url_entry.get().split()
+        url = urls[0] if urls else ""
         
-        if not self.validate_url(url):
+        if not all(self.validate_url(u) for u in urls) or not url:
             self.play_sound("error.wav")  # Play error sound when URL is invalid
             return
         
@@ -431,307 +658,264 @@ class FastDLDownloader:
             messagebox.showerror("Invalid Depth", "Please enter a valid number for max depth")
             return
         
-        file_types = [ext.strip().lower() for ext in self.filetypes_var.get().split(",")]
+        try:
+            self.max_workers = max(1, int(self.workers_var.get()))
+        except ValueError:
+            messagebox.showerror("Invalid Workers", "Please enter a valid number of workers")
+            return
         
-        # Create download directory
-        now = datetime.now()
-        folder_name = f"SCRAPE_{now.strftime('%d-%m_%H-%M')}"
-        self.scrape_folder = os.path.join(os.getcwd(), folder_name)
+        limits = self._read_limits()
+        if limits is None:
+            return
         
-        try:
-            os.makedirs(self.scrape_folder, exist_ok=True)
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not create scrape folder: {str(e)}")
+        self.engine_type = self.engine_var.get()
+        if self.engine_type == "asyncio" and not AsyncDownloadEngine.available():
+            messagebox.showerror("Engine Unavailable", "The asyncio engine requires the aiohttp package")
             return
         
-        # Play waiting sound at 25% volume
-        self.play_waiting_sound()
-        
-        # Initialize download
-        self.base_url = url if url.endswith('/') else url + '/'
-        self.status.config(text=f"Counting files from: {self.base_url}")
-        
-        self.downloading = True
-        self.cancel_requested = False
-        self.paused = False
-        self.download_btn.config(state=tk.DISABLED)
-        self.pause_btn.config(state=tk.NORMAL)
-        self.cancel_btn.config(state=tk.NORMAL)
-        self.pause_event.set()  # Ensure downloads can start
-        
-        # Reset counters
-        self.total_files = 0
-        self.total_bytes = 0
-        self.downloaded_files = 0
-        self.downloaded_bytes = 0
-        self.failed_files = 0
-        self.failed_downloads = []
-        self.start_time = time.time()
-        self.last_update_time = time.time()
-        self.last_bytes = 0
+        file_types = self.filetypes_var.get().split(",")
         
-        # Update progress bar to 0
-        self.update_progress(0)
+        base_url = url if url.endswith('/') else url + '/'
         
-        # Start counting thread first
-        count_thread = Thread(
-            target=self._perform_file_count_then_download, 
-            args=(self.base_url, max_depth, file_types)
-        )
-        count_thread.start()
+        # Sync into the given mirror, resume an unfinished scrape of the same URL,
+        # or let the queue create a new download directory
+        sync_mode = sync_folder is not None
+        resumable = None if sync_mode else DownloadJournal.find_resumable(os.getcwd(), base_url)
+        if resumable and any(os.path.abspath(job.output_dir) == os.path.abspath(resumable)
+                             and not job.finished for job in self.jobs.jobs):
+            resumable = None  # Already queued
+        if sync_mode:
+            scrape_folder = sync_folder
+        elif resumable and messagebox.askyesno(
+            "Resume Download",
+            f"Resume the unfinished download in {os.path.basename(resumable)}?"
+        ):
+            scrape_folder = resumable
+        else:
+            scrape_folder = None
         
-        # Start the stats update loop
-        self.update_stats_loop()
+        # Every job shares the Workers field's download slots; the newest value wins
+        self.jobs.set_workers(self.max_workers)
+        job = self.jobs.add(
+            base_url, scrape_folder,
+            parent=os.getcwd(),
+            max_depth=max_depth,
+            file_types=file_types,
+            workers=self.max_workers,
+            engine_type=self.engine_type,
+            sync=sync_mode,
+            prune=self.prune_var.get(),
+            limits=limits,
+            schedule=self.schedule_var.get(),
+            mirrors=urls[1:],
+            store=os.path.join(os.getcwd(), "AEROPULL_STORE") if self.store_var.get() else None,
+            decompress=self.decompress_var.get(),
+            keep_compressed=self.keep_compressed_var.get()
+        )
+        self._show_job_row(job)
+        self.job_tree.selection_set(str(job.id))
+        self.job_tree.see(str(job.id))
     
-    def update_stats_loop(self):
-        """Continuously update stats every second while downloading."""
-        if self.downloading and not self.cancel_requested:
-            self.update_stats()
-            self.root.after(int(self.update_interval * 1000), self.update_stats_loop)
+    def _start_queue(self):
+        """Load the saved job queue and start refreshing the UI.
+        
+        Unfinished jobs from the last session are held back until the user
+        resumes them; new downloads start as soon as there is room.
+        """
+        self.jobs = JobQueue(workers=self.max_workers, on_change=lambda job: self.job_events.put(job.id))
+        restored = [job for job in self.jobs.jobs if job.state == "queued"]
+        for job in restored:
+            self.jobs.pause(job)
+        for job in self.jobs.jobs:
+            self._show_job_row(job)
+        if restored:
+            self.status.config(text=f"Unfinished downloads restored: {len(restored)}; select one and press Resume")
+        self.jobs.start()
+        self._refresh_ui()
     
-    def _perform_file_count_then_download(self, base_url, max_depth, file_types):
-        """Count files first, then start download."""
+    def start_metrics(self, port=None, path=None, interval=10):
+        """Serve the queue's metrics on a local port and/or append JSON snapshots of them to path."""
         try:
-            # First count files
-            self.counting_files = True
-            self._perform_file_count(base_url, max_depth, file_types)
-            # Stop waiting sound before download starts
-            self.stop_waiting_sound()
-            # Only proceed with download if not cancelled and files were found
-            if not self.cancel_requested and self.total_files > 0:
+            if port is not None:
+                self.metrics_reporters.append(MetricsServer(self.jobs.metrics, port).start())
+        except OSError as e:
+            messagebox.showerror("Metrics", f"Can't serve metrics on port {port}: {e.strerror or e}")
+        if path:
+            self.metrics_reporters.append(SnapshotWriter(self.jobs.metrics, path, interval).start())
+    
+    def _refresh_ui(self):
+        """Apply job changes and sample the selected job's counters, on the Tk thread."""
+        if not self.running:
+            return
+        while True:
+            try:
+                event = self.job_events.get_nowait()
+            except Empty:
+                break
+            if isinstance(event, tuple):
+                self._verify_done(*event)
+                continue
+            job = self.jobs.get(event)
+            if job:
+                self._job_changed(job)
+        
+        # The waiting loop plays while any job is still looking for files; join.wav as each starts downloading
+        counting = False
+        for job in self.jobs.jobs:
+            progress = job.snapshot()
+            if progress is None or job.id not in self.job_phases or job.finished:
+                continue
+            if progress.phase == "counting":
+                counting = True
+            elif progress.phase == "downloading" and self.job_phases[job.id] != "downloading":
                 self.play_sound("join.wav")
-                self.status.config(text=f"Downloading {self.total_files} files...")
-                # Start the main download process
-                self.scrape_and_download(base_url, max_depth, file_types, already_counted=True)
-                # After initial download, retry failed downloads if any
-                if self.failed_downloads and not self.cancel_requested:
-                    self.retry_failed_downloads()
-                # Final status update
-                if not self.cancel_requested:
-                    if self.failed_files > 0:
-                        self.update_status(f"Completed with {self.failed_files} failed downloads")
-                    else:
-                        self.update_status("All files downloaded successfully!")
-                        self.play_complete_sound()
-        except Exception as e:
-            self.update_status(f"Error: {str(e)}")
-        finally:
-            self.counting_files = False
+            self.job_phases[job.id] = progress.phase
+        if counting and not self.waiting_sound_playing:
+            self.play_waiting_sound()
+        elif not counting and self.waiting_sound_playing:
             self.stop_waiting_sound()
-            self._reset_ui()
+        
+        now = time.time()
+        if now - self.last_rows_update >= self.update_interval:
+            self.last_rows_update = now
+            for job in self.jobs.jobs:
+                if job.state in ("running", "paused"):
+                    self._show_job_row(job)
+        
+        job = self.shown_job
+        progress = job.snapshot() if job else None
+        if progress:
+            if progress.total_bytes > 0:
+                self.update_progress(int(progress.downloaded_bytes / progress.total_bytes * 100))
+            self.failed_label.config(text=f" | Failed: {progress.failed_files}")
+            if progress.status != self.shown_status:
+                self.shown_status = progress.status
+                self.update_status(progress.status)
+            if job.state == "running" and now - self.last_update_time >= self.update_interval:
+                self.start_time = job.engine.start_time
+                self.update_stats(progress)
+        
+        self.root.after(self.frame_interval, self._refresh_ui)
+    
+    def _job_changed(self, job):
+        """Show a job's new state, with a sound when it ends."""
+        self._show_job_row(job)
+        if job.state == "running":
+            self.job_phases.setdefault(job.id, None)
+        elif job.finished and job.id in self.job_phases:
+            del self.job_phases[job.id]  # Ran this session; say how it went
+            if job.state == "complete":
+                self.play_complete_sound()
+            elif job.state in ("incomplete", "error"):
+                self.play_sound("warning.wav")
+            if job is self.shown_job:
+                self.update_stats(job.snapshot())
+                self._reset_stats()
+        if job is self.shown_job:
+            self._update_job_buttons()
+    
+    def _show_job_row(self, job):
+        """Add or update a job's row in the job list."""
+        progress = job.snapshot()
+        text = ""
+        if progress and progress.total_files:
+            more = "+" if progress.crawling else ""
+            percent = progress.downloaded_bytes / progress.total_bytes * 100 if progress.total_bytes else 0
+            text = f"{progress.downloaded_files}/{progress.total_files}{more} files ({percent:.0f}%)"
+        values = (job.url, job.state, text)
+        if self.job_tree.exists(str(job.id)):
+            self.job_tree.item(str(job.id), values=values)
+        else:
+            self.job_tree.insert("", tk.END, iid=str(job.id), values=values)
+    
+    def _show_selected_job(self, event=None):
+        """Point the stats row and the job buttons at the selected job."""
+        selection = self.job_tree.selection()
+        job = self.jobs.get(int(selection[0])) if selection else None
+        if job is self.shown_job:
+            return
+        self.shown_job = job
+        self.shown_status = ""
+        progress = job.snapshot() if job else None
+        self.start_time = job.engine.start_time if progress else None
+        self.last_update_time = time.time()
+        self.last_bytes = progress.transferred_bytes if progress else 0
+        self._reset_stats()
+        self.update_progress(0)
+        self.failed_label.config(text=" | Failed: 0")
+        if progress:
+            self.update_stats(progress)
+        else:
+            self.stats_label.config(text="Files: 0/0 | Bytes: 0/0")
+            self.timer_label.config(text="Elapsed time: 00:00:00")
+            self.update_status(f"Job {job.id} is {job.state}" if job else "Ready to download")
+        self._update_job_buttons()
+    
+    def _update_job_buttons(self):
+        """Enable the job buttons that apply to the selected job's state."""
+        job = self.shown_job
+        state = job.state if job else None
+        if state in ("running", "queued"):
+            self.pause_btn.config(state=tk.NORMAL, text="Pause")
+        elif state in ("paused", "cancelled", "incomplete", "error"):
+            self.pause_btn.config(state=tk.NORMAL, text="Resume" if state == "paused" else "Retry")
+        else:
+            self.pause_btn.config(state=tk.DISABLED, text="Pause")
+        self.cancel_btn.config(state=tk.NORMAL if job and not job.finished else tk.DISABLED)
+        self.remove_btn.config(state=tk.NORMAL if job else tk.DISABLED)
     
     def play_complete_sound(self):
         """Play completion sound."""
-        try:
-            sound_path = os.path.join("resources", "complete.wav")
-            if os.path.exists(sound_path):
-                sound = pygame.mixer.Sound(sound_path)
-                sound.set_volume(0.5)
-                sound.play()
-        except Exception:
-            pass
-            
-    def retry_failed_downloads(self):
-        """Retry failed downloads until all are downloaded or max retries reached."""
-        retry_count = 0
-        while self.failed_downloads and retry_count < self.max_retries and not self.cancel_requested:
-            retry_count += 1
-            self.update_status(f"Retrying failed downloads (attempt {retry_count}/{self.max_retries})...")
-            time.sleep(self.retry_delay)  # Small delay before retry
-            
-            # Make a copy of current failed downloads to process
-            current_failed = self.failed_downloads.copy()
-            self.failed_downloads = []  # Clear for new attempts
-            
-            for file_url, base_url in current_failed:
-                if self.cancel_requested:
-                    break
-                    
-                self.download_file(file_url, base_url)
-            
-            # Update failed count display
-            self.failed_label.config(text=f" | Failed: {len(self.failed_downloads)}")
-        
-        # Update final status after retries
-        if self.failed_downloads:
-            self.update_status(f"Completed with {len(self.failed_downloads)} files still failed after {self.max_retries} retries")
-            self.play_sound("warning.wav")
-        else:
-            self.update_status("All files successfully downloaded after retry!")
-            self.play_sound("complete.wav")
+        self.sounds.play("complete.wav", volume=0.5)
     
-    def _perform_file_count(self, url, max_depth, file_types):
-        """Perform the actual file counting operation."""
+    def _read_limits(self):
+        """Return the limit fields as RateLimiter limits (0 is unlimited), or None if invalid."""
         try:
-            base_url = url if url.endswith('/') else url + '/'
-            total_files = 0
-            total_bytes = 0
-            
-            def count_files_recursive(current_url, current_depth):
-                nonlocal total_files, total_bytes
-                
-                if current_depth > max_depth or self.cancel_requested:
-                    return
-                
-                try:
-                    response = requests.get(current_url)
-                    response.raise_for_status()
-                    
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    links = soup.find_all('a')
-                    
-                    for link in links:
-                        if self.cancel_requested:
-                            return
-                            
-                        href = link.get('href')
-                        if href == '../' or href == './':
-                            continue
-                            
-                        full_url = urljoin(current_url, href)
-                        
-                        if href.endswith('/'):
-                            count_files_recursive(full_url, current_depth + 1)
-                        else:
-                            ext = os.path.splitext(href)[1].lower()
-                            if any(ext == file_ext for file_ext in file_types):
-                                total_files += 1
-                                
-                                # Get file size if possible
-                                try:
-                                    head = requests.head(full_url)
-                                    total_bytes += int(head.headers.get('content-length', 0))
-                                except:
-                                    pass
-                
-                except Exception as e:
-                    pass  # Silently handle errors during counting
-            
-            # Start counting
-            count_files_recursive(base_url, 0)
-            
-            # Update the counts
-            self.total_files = total_files
-            self.total_bytes = total_bytes
-            
-            # Update the stats display
-            self.update_stats()
-            
-        except Exception as e:
-            self.update_status(f"Error counting files: {str(e)}")
+            rate = float(self.rate_limit_var.get() or 0)
+            requests_per_second = float(self.request_limit_var.get() or 0)
+        except ValueError:
+            messagebox.showerror("Invalid Limit", "Please enter numbers for the limits (0 for no limit)")
+            return None
+        return {
+            'bytes_per_second': rate * 1024 or None,
+            'requests_per_second': requests_per_second or None
+        }
     
-    def scrape_and_download(self, url, max_depth, file_types, already_counted=False, current_depth=0):
-        """Recursively scrape and download files from the given URL."""
-        if self.cancel_requested or current_depth > max_depth:
+    def apply_limits(self, event=None):
+        """Apply the limit fields to the limits every job shares."""
+        limits = self._read_limits()
+        if limits is None:
             return
-            
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            links = soup.find_all('a')
-            
-            for link in links:
-                if self.cancel_requested:
-                    return
-                    
-                href = link.get('href')
-                if href == '../' or href == './':
-                    continue
-                    
-                full_url = urljoin(url, href)
-                
-                if href.endswith('/'):
-                    self.scrape_and_download(full_url, max_depth, file_types, already_counted, current_depth + 1)
-                else:
-                    ext = os.path.splitext(href)[1].lower()
-                    if any(ext == file_ext for file_ext in file_types):
-                        if not already_counted:
-                            self.total_files += 1
-                            try:
-                                head = requests.head(full_url)
-                                self.total_bytes += int(head.headers.get('content-length', 0))
-                            except:
-                                pass
-                            self.update_stats()
-                            
-                        self.download_file(full_url, url)
-            
-        except Exception as e:
-            self.update_status(f"Error scraping {url}: {str(e)}")
+        self.jobs.set_limits(**limits)
     
-    def download_file(self, file_url, base_url):
-        """Download a single file with pause/resume support."""
-        try:
-            relative_path = file_url[len(base_url):]
-            save_path = os.path.join(self.scrape_folder, relative_path)
-            
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            
-            self.update_status(f"Downloading {relative_path}...")
-            
-            with requests.get(file_url, stream=True) as r:
-                r.raise_for_status()
-                file_size = int(r.headers.get('content-length', 0))
-                
-                # Log download start
-                self.log_download(file_url, "STARTED", file_size)
-                
-                with open(save_path, 'wb') as f:
-                    downloaded = 0
-                    for chunk in r.iter_content(chunk_size=8192):
-                        # Check for pause/cancel
-                        if self.cancel_requested:
-                            self.log_download(file_url, "CANCELLED", downloaded)
-                            return
-                            
-                        self.pause_event.wait()  # Will block if paused
-                        
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            self.downloaded_bytes += len(chunk)
-                            progress = int((self.downloaded_bytes / self.total_bytes) * 100) if self.total_bytes > 0 else 0
-                            self.update_progress(progress)
-                
-            if not self.cancel_requested:
-                self.downloaded_files += 1
-                self.log_download(file_url, "COMPLETED", file_size)
-                self.update_stats()
-                
-        except Exception as e:
-            self.failed_files += 1
-            self.failed_downloads.append((file_url, base_url))
-            self.failed_label.config(text=f" | Failed: {self.failed_files}")
-            self.log_download(file_url, f"ERROR: {str(e)}", downloaded)
-            self.update_status(f"Error downloading {file_url}: {str(e)}")
-    
-    def update_stats(self):
-        """Update download statistics with speed and ETA."""
+    def update_stats(self, progress):
+        """Update download statistics with speed and ETA from an engine snapshot."""
         current_time = time.time()
         
         # Files and bytes progress
-        files_text = f"Files: {self.downloaded_files}/{self.total_files}"
-        bytes_text = f" | Bytes: {self._format_bytes(self.downloaded_bytes)}/{self._format_bytes(self.total_bytes)}"
+        # Totals keep growing until the crawl finishes
+        more = "+" if progress.crawling else ""
+        files_text = f"Files: {progress.downloaded_files}/{progress.total_files}{more}"
+        bytes_text = f" | Bytes: {self._format_bytes(progress.downloaded_bytes)}/{self._format_bytes(progress.total_bytes)}{more}"
         self.stats_label.config(text=files_text + bytes_text)
+        self.concurrency_label.config(text=f" | Parallel: {progress.concurrency}")
         
-        # Download speed calculation
+        # Download speed calculation, from bytes actually received so resumed and skipped files don't inflate it
         if self.last_update_time and current_time > self.last_update_time:
             time_diff = current_time - self.last_update_time
-            bytes_diff = self.downloaded_bytes - self.last_bytes
+            bytes_diff = progress.transferred_bytes - self.last_bytes
             download_speed = bytes_diff / time_diff if time_diff > 0 else 0
             self.speed_label.config(text=f" | Speed: {self._format_bytes(download_speed)}/s")
             
             # ETA calculation
             if download_speed > 0:
-                remaining_bytes = self.total_bytes - self.downloaded_bytes
+                remaining_bytes = progress.total_bytes - progress.downloaded_bytes
                 eta_seconds = remaining_bytes / download_speed
-                self.eta_label.config(text=f" | ETA: {self._format_time(eta_seconds)}")
+                self.eta_label.config(text=f" | ETA: {self._format_time(eta_seconds)}{more}")
             
             # Update tracking variables
             self.last_update_time = current_time
-            self.last_bytes = self.downloaded_bytes
+            self.last_bytes = progress.transferred_bytes
         
         # Elapsed time
         if self.start_time:
@@ -740,7 +924,7 @@ class FastDLDownloader:
             minutes = int((elapsed % 3600) // 60)
             seconds = int(elapsed % 60)
             self.timer_label.config(text=f"Elapsed time: {hours:02d}:{minutes:02d}:{seconds:02d}")
-
+    
     def _format_bytes(self, bytes):
         """Format bytes into human-readable string."""
         for unit in ['B', 'KB', 'MB', 'GB']:
@@ -756,93 +940,71 @@ class FastDLDownloader:
         minutes = (seconds % 3600) // 60
         seconds = seconds % 60
         return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-
-    def log_download(self, url, status, filesize):
-        """Log download activity to history file."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        size_mb = filesize / (1024 * 1024)
-        log_entry = f"[{timestamp}] {url} - {status} - {size_mb:.2f}MB\n"
-        
-        with open(self.history_file, "a") as f:
-            f.write(log_entry)
-        
-        # Also update status if error
-        if "ERROR" in status:
-            self.update_status(f"Error logged: {url}")
-
+    
     def update_status(self, text):
         """Update status label."""
-        self.root.after(0, lambda: self.status.config(text=text))
+        self.status.config(text=text)
     
     def update_progress(self, value):
         """Update progress bar."""
-        self.root.after(0, lambda: self.progress.config(value=value))
+        self.progress.config(value=value)
     
-    def _reset_ui(self):
-        """Reset UI to initial state after download completes."""
-        self.downloading = False
-        self.paused = False
-        self.download_btn.config(state=tk.NORMAL)
-        self.pause_btn.config(state=tk.DISABLED, text="Pause")
-        self.cancel_btn.config(state=tk.DISABLED)
-        
-        # Reset speed/ETA displays
+    def _reset_stats(self):
+        """Clear the speed and ETA displays of a job that isn't downloading."""
         self.speed_label.config(text=" | Speed: 0 KB/s")
+        self.concurrency_label.config(text=" | Parallel: -")
         self.eta_label.config(text=" | ETA: --:--:--")
-
+    
     def toggle_pause(self):
-        """Toggle pause/resume download state."""
-        self.paused = not self.paused
-        if self.paused:
-            self.pause_event.clear()  # Blocks threads
-            self.pause_btn.config(text="Resume")
+        """Pause the selected job, or resume or retry it."""
+        job = self.shown_job
+        if job is None:
+            return
+        if job.state in ("running", "queued"):
+            self.jobs.pause(job)
             self.status.config(text="Download paused")
             self.play_sound("information.wav")
         else:
-            self.pause_event.set()  # Allows threads to run
-            self.pause_btn.config(text="Pause")
+            self.jobs.resume(job)
             self.status.config(text="Resuming download...")
             self.last_update_time = time.time()  # Reset speed calculation
-            self.last_bytes = self.downloaded_bytes
+            progress = job.snapshot()
+            self.last_bytes = progress.transferred_bytes if progress else 0
     
     def cancel_download(self):
-        """Cancel the current download operation."""
-        self.cancel_requested = True
-        self.pause_event.set()  # Unblock any paused threads
+        """Cancel the selected job."""
+        if self.shown_job is None:
+            return
+        self.jobs.cancel(self.shown_job)
         self.play_sound("information.wav")
         self.status.config(text="Cancelling download...")
-        self.log_download("SYSTEM", "DOWNLOAD CANCELLED", self.downloaded_bytes)
+    
+    def remove_job(self):
+        """Take the selected job off the list; its folder is left alone."""
+        job = self.shown_job
+        if job is None:
+            return
+        if not self.jobs.remove(job):
+            messagebox.showinfo("Job Running", "Cancel the job before removing it from the queue")
+            return
+        self.job_phases.pop(job.id, None)
+        self.job_tree.delete(str(job.id))
+        self._show_selected_job()
     
     def play_sound(self, filename):
         """Play the specified sound file."""
-        try:
-            sound_path = os.path.join("resources", filename)
-            if os.path.exists(sound_path):
-                sound = pygame.mixer.Sound(sound_path)
-                sound.play()
-        except Exception:
-            pass
+        self.sounds.play(filename)
     
     def play_waiting_sound(self):
-        """Play the waiting sound at 25% volume."""
-        try:
-            sound_path = os.path.join("resources", "waiting.wav")
-            if os.path.exists(sound_path):
-                if self.waiting_sound:
-                    self.waiting_sound.stop()
-                self.waiting_sound = pygame.mixer.Sound(sound_path)
-                self.waiting_sound.set_volume(0.15)
-                self.waiting_sound.play(-1)  # Loop indefinitely
-        except Exception:
-            pass
+        """Play the waiting sound at 15% volume."""
+        self.sounds.stop("waiting.wav")
+        self.sounds.play("waiting.wav", volume=0.15, loops=-1)  # Loop indefinitely
+        self.waiting_sound_playing = True
     
     def stop_waiting_sound(self):
         """Stop the waiting sound."""
-        try:
-            if self.waiting_sound:
-                self.waiting_sound.stop()
-        except Exception:
-            pass
+        self.sounds.stop("waiting.wav")
+        self.waiting_sound_playing = False
     
     def play_hover_sound(self, event=None):
         """Play hover sound effect."""
@@ -850,29 +1012,60 @@ class FastDLDownloader:
     
     def on_close(self):
         """Handle window close event."""
+        if not self.running:
+            return  # Already closing
         self.stop_waiting_sound()  # Ensure sound stops when closing
         self.play_sound("close.wav")
-        try:
-            import pygame
-            start = time.time()
-            while pygame.mixer.get_busy() and time.time() - start < 1:
-                self.root.update()
-                time.sleep(0.05)
-        except Exception:
-            pass
         self.running = False
+        # Jobs can take a while to cancel, so stop them off the Tk thread and keep the window responsive
+        stopper = Thread(target=self._shut_down, daemon=True)
+        stopper.start()
+        self._finish_closing(stopper, time.time())
+    
+    def _shut_down(self):
+        """Stop the jobs and metrics reporters. Runs on a worker thread."""
+        if self.jobs:
+            self.jobs.stop()  # Running jobs are queued again and resume next time
+        for reporter in self.metrics_reporters:
+            reporter.close()
+    
+    def _finish_closing(self, stopper, started):
+        """Destroy the window once the jobs have stopped and the close sound has played (for up to a second)."""
+        if stopper.is_alive() or (self.sounds.busy() and time.time() - started < 1):
+            self.root.after(50, self._finish_closing, stopper, started)
+            return
         self.root.destroy()
 
 
-def main():
+def main(argv=None):
     """Main application entry point."""
-    splash = SplashScreen()
-    splash.show()
+    parser = argparse.ArgumentParser(prog="AeroPull")
+    parser.add_argument("--no-splash", action="store_true", help="skip the splash screen")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-file", metavar="FILE",
+                        help="append a JSON snapshot of the metrics to FILE every --metrics-interval seconds")
+    parser.add_argument("--metrics-interval", type=float, default=10, metavar="SECONDS",
+                        help="seconds between --metrics-file snapshots (default: 10)")
+    args = parser.parse_args(argv)
+    
+    # Decode sounds while the windows are being built
+    sounds = SoundCache()
+    sounds.preload()
     
     root = tk.Tk()
-    app = FastDLDownloader(root)
+    root.withdraw()  # Built behind the splash, shown when it closes
+    if args.no_splash:
+        app = FastDLDownloader(root, sounds)
+        app.show()
+    else:
+        splash = SplashScreen(root, sounds)
+        app = FastDLDownloader(root, sounds)
+        splash.on_close = app.show
+    app.start_metrics(args.metrics_port, args.metrics_file, args.metrics_interval)
     root.mainloop()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    multiprocessing.freeze_support()  # The .exe's decompression workers start through here
+    main()
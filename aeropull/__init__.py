@@ -0,0 +1,26 @@
+"""AeroPull download engine, usable without the Tk interface."""
+__version__ = "1.0"
+
+from .listing import ManifestEntry, ListingEntry, StreamingListingParser, parse_listing
+from .storage import DownloadJournal, MirrorState, Manifest, CrawlIndex, ObjectStore, HistoryLog
+from .verify import verify_folder
+from .net import (HTTPSessionPool, RateLimiter, ConcurrencyController, WorkerBudget, RetryPolicy, CircuitBreaker,
+                  MirrorSet)
+from .frontier import DownloadPriority, CrawlFrontier
+from .decompress import DecompressionStage
+from .metrics import Metrics, MetricsServer, SnapshotWriter
+from .async_engine import AsyncDownloadEngine
+from .engine import DownloadEngine, EngineListener, EngineProgress, new_scrape_folder
+from .jobs import Job, JobQueue
+
+__all__ = [
+    "ManifestEntry", "ListingEntry", "StreamingListingParser", "parse_listing",
+    "DownloadJournal", "MirrorState", "Manifest", "CrawlIndex", "ObjectStore", "HistoryLog", "verify_folder",
+    "HTTPSessionPool", "RateLimiter", "ConcurrencyController", "WorkerBudget", "RetryPolicy", "CircuitBreaker",
+    "MirrorSet",
+    "DownloadPriority", "CrawlFrontier",
+    "DecompressionStage", "AsyncDownloadEngine",
+    "Metrics", "MetricsServer", "SnapshotWriter",
+    "DownloadEngine", "EngineListener", "EngineProgress", "new_scrape_folder",
+    "Job", "JobQueue",
+]
@@ -0,0 +1,462 @@
+"""asyncio crawl-and-download engine, an alternative to the threaded worker pool."""
+import asyncio
+import importlib.util
+import os
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+from .frontier import CrawlFrontier
+from .listing import ListingReader
+from .net import RETRYABLE_ERRORS
+from .storage import PART_SUFFIX
+
+
+class AsyncDownloadEngine:
+    """Crawl, size and download with asyncio coroutines instead of OS threads.
+    
+    Drives the same counters, pause_event and cancel_requested flag of its
+    DownloadEngine as the threaded path, so listeners see identical events
+    whichever engine runs.
+    """
+    
+    def __init__(self, engine, concurrency=64):
+        self.engine = engine
+        self.concurrency = max(1, concurrency)
+    
+    @staticmethod
+    def available():
+        """Return True if the optional aiohttp dependency is installed."""
+        return importlib.util.find_spec("aiohttp") is not None
+    
+    def run(self, base_url, max_depth, file_types):
+        """Crawl the tree and download the files it finds, both at once."""
+        asyncio.run(self._with_session(self._crawl_and_download, base_url, max_depth, file_types))
+    
+    async def _with_session(self, coro, *args):
+        """Run a coroutine with a pooled aiohttp session."""
+        import aiohttp  # Imported on first use; it is slow to load and optional
+        
+        engine = self.engine
+        # Per-host limits come from the engine's ConcurrencyController, see _request
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=0)
+        timeout = aiohttp.ClientTimeout(sock_connect=10, sock_read=60)
+        headers = dict(engine.extra_headers, **{'User-Agent': engine.user_agent})
+        # Host and budget slots are freed from other threads too, so releases wake waiters through the loop
+        self.slots_freed = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        wake = lambda: loop.call_soon_threadsafe(self.slots_freed.set)
+        watched = [engine.concurrency] + ([engine.budget] if engine.budget else [])
+        for slots in watched:
+            slots.watch(wake)
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+                self.slots = asyncio.Semaphore(self.concurrency)
+                self.overload_errors = (asyncio.TimeoutError, aiohttp.ClientConnectionError)
+                self.retryable_errors = RETRYABLE_ERRORS + (asyncio.TimeoutError, aiohttp.ClientError)
+                await coro(session, *args)
+        finally:
+            for slots in watched:
+                slots.unwatch(wake)
+    
+    async def _in_executor(self, function, *args):
+        """Run a blocking call, such as hashing a file or writing the journal, off the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+    
+    async def _take_slot(self, try_take, cancellable=False):
+        """Await until try_take() succeeds, waking whenever a host or budget slot is released.
+        
+        With cancellable, gives up and returns False once the job is cancelled.
+        """
+        while not try_take():
+            if cancellable and self.engine.cancel_requested:
+                return False
+            self.slots_freed.clear()
+            if try_take():
+                break  # Freed between the two tries, before clear() could lose its wake-up
+            try:
+                # Also wakes now and then for cancel, which sets no event
+                await asyncio.wait_for(self.slots_freed.wait(), 0.5)
+            except asyncio.TimeoutError:
+                pass
+        return True
+    
+    async def _wait_if_paused(self):
+        """Yield to the event loop until the engine is unpaused."""
+        while not self.engine.pause_event.is_set():
+            await asyncio.sleep(0.1)
+    
+    async def _acquire_slot(self):
+        """Wait for a slot from the engine's budget; returns False without one if the job is cancelled."""
+        engine = self.engine
+        with engine.budget.queued(engine):
+            return await self._take_slot(lambda: engine.budget.try_acquire(engine), cancellable=True)
+    
+    async def _wait_while_paused(self):
+        """Hold a transfer while the engine is paused, lending its download slot to other jobs meanwhile."""
+        engine = self.engine
+        if engine.budget is None or engine.pause_event.is_set():
+            return await self._wait_if_paused()
+        engine.budget.release(engine)
+        await self._wait_if_paused()
+        if not await self._acquire_slot():
+            engine.budget.overdraw(engine)  # Cancelled; hold one just long enough to wind down
+    
+    async def _throttle(self, delay):
+        """Sleep for a limiter delay, waking early on cancel or when the limits change."""
+        engine = self.engine
+        deadline = time.monotonic() + delay
+        generation = engine.limiter.generation
+        while delay > 0 and not engine.cancel_requested and engine.limiter.generation == generation:
+            await asyncio.sleep(min(delay, 0.1))
+            delay = deadline - time.monotonic()
+    
+    async def _throttle_request(self, url):
+        """Wait for the engine's rate limiter before sending a request to url."""
+        await self._throttle(self.engine.limiter.request_delay(url))
+    
+    async def _throttle_bytes(self, url, nbytes):
+        """Wait for the engine's rate limiter after receiving nbytes from url."""
+        await self._throttle(self.engine.limiter.bytes_delay(url, nbytes))
+    
+    async def _sleep(self, delay):
+        """Sleep, waking early if the job is cancelled."""
+        engine = self.engine
+        deadline = time.monotonic() + delay
+        while delay > 0 and not engine.cancel_requested:
+            await asyncio.sleep(min(delay, 0.1))
+            delay = deadline - time.monotonic()
+    
+    async def _wait_for_host(self, url):
+        """Hold new work against a host whose circuit is open, until it may be probed again."""
+        engine = self.engine
+        delay = engine.breaker.delay(url)
+        engine._report_open_circuit(url, delay)
+        while delay > 0 and not engine.cancel_requested:
+            await self._sleep(min(delay, 1.0))
+            delay = engine.breaker.delay(url)
+    
+    async def _retry_wait(self, url, error, attempt):
+        """Wait out the backoff before retry number attempt; return False if error is final."""
+        delay = self.engine._retry_delay(url, error, attempt, self.retryable_errors)
+        if delay is None:
+            return False
+        await self._sleep(delay)
+        return not self.engine.cancel_requested
+    
+    async def _with_retries(self, url, fetch, *args):
+        """Await fetch(*args), retrying transient failures per the engine's retry policy."""
+        attempt = 0
+        while True:
+            try:
+                await self._wait_for_host(url)
+                return await fetch(*args)
+            except Exception as e:
+                attempt += 1
+                if not await self._retry_wait(url, e, attempt):
+                    raise
+    
+    @asynccontextmanager
+    async def _request(self, session, method, url, **kwargs):
+        """Send a request once url's host has a free slot, holding the slot until the body is read.
+        
+        Like HTTPSessionPool.request, feeds the time to the response headers,
+        the status and any timeouts back to the concurrency controller and
+        circuit breaker, and records them in the engine's metrics.
+        """
+        controller = self.engine.concurrency
+        breaker = self.engine.breaker
+        metrics = self.engine.metrics
+        await self._take_slot(lambda: controller.try_acquire(url))
+        try:
+            await self._throttle_request(url)
+            began = time.monotonic()
+            async with session.request(method, url, **kwargs) as response:
+                latency = time.monotonic() - began
+                metrics.observe('ttfb', latency)
+                metrics.add('requests', host=urlparse(url).netloc, status=response.status)
+                controller.observe(url, latency, response.status)
+                breaker.record_response(url, response.status, response.headers.get('retry-after'))
+                yield response
+        except self.overload_errors:
+            metrics.add('requests', host=urlparse(url).netloc, status="error")
+            controller.observe_failure(url)
+            breaker.record_failure(url)
+            raise
+        finally:
+            controller.release(url)
+    
+    async def _crawl_and_download(self, session, base_url, max_depth, file_types):
+        """Run the crawl and the download coroutines as one pipeline joined by a priority queue."""
+        downloads = asyncio.PriorityQueue()
+        workers = [asyncio.ensure_future(self._download_worker(session, downloads))
+                   for _ in range(self.concurrency)]
+        self.engine.crawling = True
+        try:
+            await self._crawl(session, base_url, max_depth, file_types, downloads)
+        finally:
+            self.engine._crawl_finished()
+        await downloads.join()
+        for worker in workers:
+            worker.cancel()  # All idle, waiting for files that won't come
+        await asyncio.gather(*workers, return_exceptions=True)
+    
+    async def _crawl(self, session, base_url, max_depth, file_types, downloads):
+        """List directories in the engine's crawl order, several at a time, queueing files as they turn up."""
+        engine = self.engine
+        base_url = base_url if base_url.endswith('/') else base_url + '/'
+        frontier = CrawlFrontier(engine.crawl_order)
+        frontier.push([base_url], 0)
+        busy = 0
+        changed = asyncio.Event()
+        
+        async def crawler():
+            nonlocal busy
+            while not engine.cancel_requested:
+                if not frontier:
+                    if not busy:
+                        return  # Nothing left to list, and nothing being listed that could add more
+                    changed.clear()
+                    await changed.wait()
+                    continue
+                current_url, current_depth = frontier.pop()
+                busy += 1
+                try:
+                    listing = await self._with_retries(current_url, self._fetch_listing, session, current_url)
+                    files, subdirs = engine._classify_listing(listing, current_url, base_url, file_types)
+                    for entry in await self._size_files(session, files):
+                        downloads.put_nowait((engine._record_discovered(entry), entry))
+                    if current_depth < max_depth:
+                        frontier.push(subdirs, current_depth + 1)
+                except Exception as e:
+                    engine._record_listing_failure(current_url, e)  # The rest of the tree still gets crawled
+                finally:
+                    busy -= 1
+                    changed.set()
+        
+        await asyncio.gather(*(crawler() for _ in range(self.concurrency)))
+    
+    async def _size_files(self, session, files):
+        """Fill in the sizes a listing didn't show, with concurrent HEAD requests."""
+        unsized = [entry for entry in files if entry.size is None]
+        if not unsized:
+            return files
+        sizes = dict(zip(
+            (entry.url for entry in unsized),
+            await asyncio.gather(*(self._head_size(session, entry.url) for entry in unsized))
+        ))
+        if self.engine.crawl_index:
+            self.engine.crawl_index.record_sizes(sizes)
+        return [entry._replace(size=sizes[entry.url]) if entry.size is None else entry for entry in files]
+    
+    async def _fetch_listing(self, session, url):
+        """Fetch and parse one directory listing, revalidating it against the crawl index."""
+        async with self.slots:
+            await self._wait_if_paused()
+            index = self.engine.crawl_index
+            headers = index.conditional_headers(url) if index else {}
+            metrics = self.engine.metrics
+            parsing = 0.0  # Time spent in the parser while the body streamed, which isn't fetching
+            fetching = metrics.start('listing_fetch')
+            try:
+                async with self._request(session, 'GET', url, headers=headers) as response:
+                    response.raise_for_status()
+                    reader = ListingReader(index, url, response.status, response.headers)
+                    async for chunk in response.content.iter_chunked(65536):
+                        began = time.monotonic()
+                        reader.feed(chunk)
+                        parsing += time.monotonic() - began
+                        await self._throttle_bytes(url, len(chunk))
+            finally:
+                metrics.finish('listing_fetch', fetching, excluding=parsing)
+            began = time.monotonic()
+            listing = reader.finish()
+            metrics.observe('listing_parse', parsing + time.monotonic() - began)
+            return listing
+    
+    async def _head_size(self, session, file_url):
+        """Return a file's size from a HEAD request, or 0 if it can't be determined."""
+        if self.engine.cancel_requested:
+            return 0
+        try:
+            return await self._with_retries(file_url, self._fetch_head_size, session, file_url)
+        except Exception:
+            return 0
+    
+    async def _fetch_head_size(self, session, file_url):
+        async with self.slots:
+            with self.engine.metrics.timed('head'):
+                async with self._request(session, 'HEAD', file_url, allow_redirects=True) as head:
+                    head.raise_for_status()
+                    return int(head.headers.get('content-length', 0))
+    
+    async def _download_worker(self, session, downloads):
+        """Download queued files, best priority first, until cancelled."""
+        while True:
+            _, entry = await downloads.get()
+            try:
+                if not self.engine.cancel_requested:
+                    await self._download_file(session, entry)
+            finally:
+                downloads.task_done()
+    
+    async def _download_file(self, session, entry):
+        """Download a single file within the engine's share of its job queue's budget, if it has one."""
+        engine = self.engine
+        await self._wait_if_paused()  # Don't open new connections while paused
+        budget = engine.budget
+        if budget is None:
+            with engine.metrics.timed('file'):
+                return await self._download_attempts(session, entry)
+        if not await self._acquire_slot():
+            return
+        try:
+            with engine.metrics.timed('file'):
+                await self._download_attempts(session, entry)
+        finally:
+            budget.release(engine)
+    
+    async def _download_attempts(self, session, entry):
+        """Download a single file, retrying transient failures per the engine's retry policy."""
+        engine = self.engine
+        started_at = time.time()
+        attempt = 0
+        resumed = False
+        avoid = set()  # Mirrors that failed this round
+        while True:
+            url = engine.mirrors.choose(entry.url, avoid)
+            try:
+                await self._wait_for_host(url)
+                with engine.mirrors.use(url):
+                    await self._fetch_file(session, entry, url, started_at, resumed)
+                break
+            except Exception as e:
+                # A retry resumes what earlier attempts wrote, counted once an attempt got that far
+                resumed = entry.relative_path in engine._counted_parts
+                if engine._fail_over(url, e, avoid):
+                    continue
+                attempt += 1
+                avoid.clear()  # Every mirror gets another go after the backoff
+                if await self._retry_wait(url, e, attempt):
+                    engine.retry_counts[entry.relative_path] = attempt
+                    continue
+                part_path = os.path.join(engine.scrape_folder, entry.relative_path) + PART_SUFFIX
+                downloaded = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+                engine._counted_parts.discard(entry.relative_path)
+                engine._record_failure(url, entry.relative_path, e, downloaded, started_at)
+                return
+        engine._counted_parts.discard(entry.relative_path)
+        # May wait for the decompression stage to catch up, so keep it off the event loop
+        await self._in_executor(engine._unpack, entry.relative_path)
+    
+    def _part_writer(self, relative_path, part_path, part, save_path, offset):
+        """Wrap an open .part file in the engine's hashing and unpacking writers; runs in the executor."""
+        engine = self.engine
+        return engine._unpacking(save_path, offset, engine._hashing(relative_path, part_path, part, offset))
+    
+    async def _fetch_file(self, session, entry, url, started_at, resumed=False):
+        """Make one attempt at a file from url (its chosen mirror), resuming its .part file with ranged requests.
+        
+        Raises on failure.
+        """
+        engine = self.engine
+        save_path = os.path.join(engine.scrape_folder, entry.relative_path)
+        part_path = save_path + PART_SUFFIX
+        conditional = {}
+        stored = None
+        local_path, local_size = engine._local_copy(save_path, entry.size)
+        if local_path:
+            if not engine.sync_mode:
+                engine._record_skipped(url, local_size)
+                return
+            if local_path == save_path and engine._mirror_unchanged(entry.relative_path, save_path, entry.size,
+                                                                    entry.mtime):
+                engine._record_skipped(url, entry.size, "UNCHANGED")
+                return
+            conditional = engine._conditional_headers(entry.relative_path, local_path)
+        elif engine.store:
+            stored = engine._stored_copy(url, entry.size)
+            conditional = engine._stored_conditional(stored)
+        
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        if not resumed:
+            engine.listener.on_file_started(entry.relative_path)
+        
+        # Cuts a segmented .part back to its finished leading segments
+        offset = downloaded = await self._in_executor(engine._resume_offset, entry.relative_path, part_path,
+                                                      not resumed)
+        engine._counted_parts.add(entry.relative_path)
+        file_size = 0
+        http_status = None
+        started = resumed
+        while True:
+            headers = engine._range_headers(entry.relative_path, offset, url=url) or conditional
+            async with self._request(session, 'GET', url, headers=headers) as r:
+                http_status = r.status
+                if r.status == 304:
+                    if not stored:
+                        engine._record_skipped(url, local_size, "UNCHANGED")
+                        return
+                    if await self._in_executor(engine._use_stored, url, entry.relative_path, save_path, *stored):
+                        return
+                    conditional, stored = {}, None  # The stored copy is gone; download it after all
+                    continue
+                if engine._range_complete(entry.relative_path, r.status, offset):
+                    file_size = offset
+                    break
+                r.raise_for_status()
+                if not offset and await self._in_executor(
+                        engine._use_stored_match, url, entry.relative_path, save_path, r.status, r.headers):
+                    return
+                # Writes the journal
+                start = await self._in_executor(engine._accept_range, url, entry.relative_path, r.status,
+                                                r.headers, offset)
+                if start != offset:
+                    engine._count_existing_bytes(start - downloaded)
+                    offset = downloaded = start
+                file_size = offset + int(r.headers.get('content-length', 0))
+                if not started:
+                    engine.log_download(url, "STARTED", file_size, http_status=http_status)
+                    started = True
+                
+                finished = True
+                body_began, body_start = engine.metrics.start('body'), downloaded
+                # Opening may hash what is already on disk, and writes may unpack; all of it stays off the loop
+                part = None
+                try:
+                    part = await self._in_executor(open, part_path, 'ab' if offset else 'wb')
+                    f = await self._in_executor(self._part_writer, entry.relative_path, part_path, part,
+                                                save_path, offset)
+                    async for chunk in r.content.iter_chunked(65536):
+                        if engine.cancel_requested:
+                            engine.log_download(url, "CANCELLED", downloaded)
+                            return
+                        
+                        wrote = time.monotonic()
+                        await self._in_executor(f.write, chunk)
+                        downloaded += len(chunk)
+                        engine._record_chunk(url, len(chunk), time.monotonic() - wrote)
+                        engine.concurrency.observe_bytes(url, len(chunk))
+                        await self._throttle_bytes(url, len(chunk))
+                        
+                        if not engine.pause_event.is_set():
+                            finished = False  # Release the connection while paused
+                            break
+                finally:
+                    if part:
+                        part.close()
+                    engine.mirrors.record_transfer(url, downloaded - body_start, time.monotonic() - body_began)
+                    engine.metrics.finish('body', body_began)
+            
+            if finished:
+                break
+            
+            await self._wait_while_paused()
+            offset = downloaded
+            if engine.cancel_requested:
+                engine.log_download(url, "CANCELLED", downloaded)
+                return
+        
+        # Renames the file, may hash it again and add it to the store, and writes the journal
+        await self._in_executor(engine._finish_part, entry.relative_path, part_path, save_path)
+        engine._record_completed(url, entry.relative_path, file_size, started_at, http_status)
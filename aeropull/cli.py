@@ -0,0 +1,486 @@
+"""Command line interface: python -m aeropull URL [options]."""
+import argparse
+import os
+import sys
+import time
+from threading import Thread, Lock
+
+from . import __version__
+from .engine import DownloadEngine, EngineListener, ENGINE_TYPES, new_scrape_folder
+from .frontier import SCHEDULES, CRAWL_ORDERS
+from .jobs import JobQueue
+from .metrics import MetricsServer, SnapshotWriter
+from .storage import DownloadJournal, HistoryLog, ObjectStore, CrawlIndex
+from .verify import verify_folder
+
+
+EXIT_CODES = {"complete": 0, "incomplete": 1, "error": 2, "cancelled": 130}
+
+
+def format_bytes(size):
+    """Format bytes to human readable format."""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+class ConsoleListener(EngineListener):
+    """Prints engine status lines to stderr, plus a progress line sampled by report()."""
+    
+    def __init__(self, quiet=False, verbose=False, stream=sys.stderr):
+        self.engine = None  # Set once the engine exists
+        self.quiet = quiet
+        self.verbose = verbose
+        self.stream = stream
+        self.interactive = stream.isatty()
+        self.interval = 1 if self.interactive else 5
+        self.output_lock = Lock()  # Status lines come from worker threads
+        self.progress_shown = False
+        self.last_time = None
+        self.last_bytes = 0
+    
+    def on_status(self, text):
+        if self.quiet and not text.startswith("Error"):
+            return
+        with self.output_lock:
+            self._end_progress_line()
+            print(text, file=self.stream, flush=True)
+    
+    def on_file_started(self, relative_path):
+        if self.verbose:
+            self.on_status(f"Downloading {relative_path}...")
+    
+    def on_finished(self, result):
+        with self.output_lock:
+            self._end_progress_line()
+    
+    def report(self):
+        """Print one progress line from a snapshot of the engine's counters."""
+        if self.quiet or self.engine is None:
+            return
+        progress = self.engine.snapshot()
+        now = time.time()
+        last_time, last_bytes = self.last_time, self.last_bytes
+        self.last_time, self.last_bytes = now, progress.transferred_bytes
+        if not progress.total_files or last_time is None:
+            return
+        
+        speed = (progress.transferred_bytes - last_bytes) / max(now - last_time, 0.001)
+        percent = progress.downloaded_bytes / progress.total_bytes * 100 if progress.total_bytes else 0
+        more = "+" if progress.crawling else ""  # Totals still growing
+        line = (f"{progress.downloaded_files}/{progress.total_files}{more} files, "
+                f"{format_bytes(progress.downloaded_bytes)}/{format_bytes(progress.total_bytes)}{more} "
+                f"({percent:.0f}%), {format_bytes(speed)}/s, {progress.concurrency} parallel, "
+                f"{progress.failed_files} failed")
+        with self.output_lock:
+            if self.interactive:
+                print("\r" + line.ljust(79), end="", file=self.stream, flush=True)
+                self.progress_shown = True
+            else:
+                print(line, file=self.stream, flush=True)
+    
+    def _end_progress_line(self):
+        if self.progress_shown:
+            print(file=self.stream)
+            self.progress_shown = False
+
+
+def parse_header(value):
+    """Parse a 'Name: value' header argument."""
+    name, sep, content = value.partition(":")
+    if not sep or not name.strip():
+        raise argparse.ArgumentTypeError(f"expected 'Name: value', got {value!r}")
+    return name.strip(), content.strip()
+
+
+def parse_rate(value):
+    """Parse a bytes-per-second limit like 500K or 2M; 0 means unlimited."""
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    text = value.strip().lower().rstrip('b')
+    try:
+        if text and text[-1] in units:
+            rate = float(text[:-1]) * units[text[-1]]
+        else:
+            rate = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a rate like 500K or 2M, got {value!r}")
+    return rate or None
+
+
+def parse_requests(value):
+    """Parse a requests-per-second limit; 0 means unlimited."""
+    try:
+        rate = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number, got {value!r}")
+    return rate or None
+
+
+# Command line options and control commands for each RateLimiter limit
+LIMIT_OPTIONS = {
+    'bytes_per_second': ('limit-rate', parse_rate),
+    'requests_per_second': ('limit-requests', parse_requests),
+    'host_bytes_per_second': ('host-limit-rate', parse_rate),
+    'host_requests_per_second': ('host-limit-requests', parse_requests),
+}
+
+
+def read_control_commands(engine, stream=sys.stdin):
+    """Apply commands typed while a job runs: pause, resume, cancel or limit NAME=VALUE."""
+    for line in stream:
+        command, _, rest = line.strip().partition(' ')
+        try:
+            if command == 'pause':
+                engine.pause()
+            elif command == 'resume':
+                engine.resume()
+            elif command == 'cancel':
+                engine.cancel()
+            elif command == 'limit':
+                changes = {}
+                for assignment in rest.split():
+                    name, _, value = assignment.partition('=')
+                    for limit, (option, parse) in LIMIT_OPTIONS.items():
+                        if name == option:
+                            changes[limit] = parse(value)
+                            break
+                    else:
+                        raise argparse.ArgumentTypeError(f"unknown limit {name!r}")
+                engine.set_limits(**changes)
+            elif command:
+                raise argparse.ArgumentTypeError(f"unknown command {command!r}")
+        except argparse.ArgumentTypeError as e:
+            print(f"aeropull: {e}", file=sys.stderr)
+
+
+def read_queue_commands(queue, stream=sys.stdin):
+    """Apply commands typed while a queue runs: pause, resume or cancel followed by a job number."""
+    actions = {'pause': queue.pause, 'resume': queue.resume, 'cancel': queue.cancel}
+    for line in stream:
+        command, _, rest = line.strip().partition(' ')
+        if not command:
+            continue
+        job = queue.get(int(rest)) if rest.strip().isdigit() else None
+        if command not in actions:
+            print(f"aeropull: unknown command {command!r}", file=sys.stderr)
+        elif job is None:
+            print(f"aeropull: no job {rest.strip()!r}", file=sys.stderr)
+        else:
+            actions[command](job)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="aeropull",
+        description="Download maps and other files from a FastDL server without the GUI."
+    )
+    parser.add_argument("url", nargs="?", help="FastDL base URL to crawl")
+    parser.add_argument("--verify", metavar="DIR",
+                        help="check a scrape folder against its manifest instead of downloading")
+    parser.add_argument("--quick", action="store_true",
+                        help="with --verify, compare sizes and crc32 only instead of sha256")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="add URL with these options to the job queue instead of downloading it now")
+    parser.add_argument("--run-queue", action="store_true",
+                        help="run the queued jobs side by side, sharing --workers download slots fairly")
+    parser.add_argument("--list-jobs", action="store_true", help="print the job queue and exit")
+    parser.add_argument("--jobs", default=JobQueue.FILENAME, metavar="FILE",
+                        help=f"job queue file (default: {JobQueue.FILENAME})")
+    parser.add_argument("--max-jobs", type=int, default=4, metavar="N",
+                        help="with --run-queue, jobs running at once (default: 4)")
+    parser.add_argument("-m", "--mirror", action="append", default=[], metavar="URL",
+                        help="another base URL serving the same files; each file comes from whichever "
+                             "mirror is fastest and fails over to the others (repeatable)")
+    parser.add_argument("--split-mirrors", action="store_true",
+                        help="spread the segments of large files over the mirrors")
+    parser.add_argument("-d", "--depth", type=int, default=0,
+                        help="how many directory levels to follow (default: 0)")
+    parser.add_argument("-t", "--types", default=".bsp,.bz2",
+                        help="comma-separated file extensions (default: .bsp,.bz2)")
+    parser.add_argument("-w", "--workers", type=int, default=8,
+                        help="parallel downloads (default: 8)")
+    parser.add_argument("--per-host", type=int, default=4, metavar="N",
+                        help="connections per host to start with; adapts up to --workers (default: 4)")
+    parser.add_argument("--fixed-concurrency", action="store_true",
+                        help="keep connections per host at --per-host instead of adapting to the server")
+    parser.add_argument("--segments", type=int, default=4, metavar="N",
+                        help="connections per large file, 1 to disable (default: 4)")
+    parser.add_argument("--segment-threshold", type=int, default=32, metavar="MB",
+                        help="files at least this big are downloaded in segments (default: 32)")
+    parser.add_argument("--retries", type=int, default=3, metavar="N",
+                        help="retries per request for timeouts, dropped connections and 5xx/429 (default: 3)")
+    parser.add_argument("--schedule", choices=SCHEDULES, default="discovery",
+                        help="which queued files download first: in the order found, smallest or "
+                             "largest (default: discovery)")
+    parser.add_argument("--prioritize", default="", metavar="PATTERNS",
+                        help="comma-separated extensions or directories to download before anything "
+                             "else, in order, e.g. .bsp,maps/")
+    parser.add_argument("--crawl-order", choices=CRAWL_ORDERS, default="dfs",
+                        help="list directories depth-first or breadth-first (default: dfs)")
+    parser.add_argument("--limit-rate", type=parse_rate, metavar="RATE",
+                        help="total download speed limit, e.g. 500K or 2M")
+    parser.add_argument("--limit-requests", type=parse_requests, metavar="N",
+                        help="total requests per second")
+    parser.add_argument("--host-limit-rate", type=parse_rate, metavar="RATE",
+                        help="download speed limit per host")
+    parser.add_argument("--host-limit-requests", type=parse_requests, metavar="N",
+                        help="requests per second per host")
+    parser.add_argument("--control", action="store_true",
+                        help="read 'pause', 'resume', 'cancel' and 'limit limit-rate=1M ...' "
+                             "commands from stdin while running; with --run-queue, 'pause 3' etc. "
+                             "for job 3")
+    parser.add_argument("--engine", choices=ENGINE_TYPES, default="threaded",
+                        help="download engine (default: threaded)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("-o", "--output", default=".", metavar="DIR",
+                        help="parent folder for the new SCRAPE_ folder (default: .)")
+    target.add_argument("--sync", metavar="DIR",
+                        help="update an existing mirror folder in place")
+    parser.add_argument("--resume", action="store_true",
+                        help="resume the newest unfinished scrape of URL under --output")
+    parser.add_argument("--prune", action="store_true",
+                        help="with --sync, delete local files that are gone upstream")
+    parser.add_argument("--decompress", action="store_true",
+                        help="unpack .bz2 files next to themselves as they finish, on all CPU cores")
+    parser.add_argument("--drop-bz2", action="store_true",
+                        help="with --decompress, delete each .bz2 once it is unpacked")
+    parser.add_argument("--decompress-queue", type=int, default=8, metavar="N",
+                        help="finished files that may wait to be unpacked before downloads pause "
+                             "(default: 8)")
+    parser.add_argument("--no-manifest", action="store_true",
+                        help="don't checksum files or write aeropull_manifest.json into the folder")
+    parser.add_argument("--store", metavar="DIR",
+                        help="keep one copy of each distinct file in this shared store and link "
+                             "scrape folders to it; files already stored aren't downloaded again")
+    parser.add_argument("--store-link", choices=ObjectStore.LINK_MODES, default="hardlink",
+                        help="how scrape folders share stored files (default: hardlink)")
+    parser.add_argument("--user-agent", metavar="UA", help="User-Agent header to send")
+    parser.add_argument("-H", "--header", action="append", type=parse_header, default=[],
+                        metavar="'NAME: VALUE'", help="extra request header (repeatable)")
+    parser.add_argument("--crawl-index", metavar="FILE",
+                        help=f"SQLite index of crawled listings, reused to skip unchanged ones "
+                             f"(default: {CrawlIndex.FILENAME} next to the scrape folders; 'none' turns it off)")
+    parser.add_argument("--history", default="download_history.log", metavar="FILE",
+                        help="download history log (default: download_history.log)")
+    parser.add_argument("--history-format", choices=HistoryLog.FORMATS, default="text",
+                        help="'jsonl' writes one JSON object per event (default: text)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics "
+                             "(and a JSON snapshot on /metrics.json)")
+    parser.add_argument("--metrics-file", metavar="FILE",
+                        help="append a JSON snapshot of the metrics to FILE every --metrics-interval seconds")
+    parser.add_argument("--metrics-interval", type=float, default=10, metavar="SECONDS",
+                        help="seconds between --metrics-file snapshots (default: 10)")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("-q", "--quiet", action="store_true",
+                        help="only print errors and the final result")
+    output.add_argument("-v", "--verbose", action="store_true",
+                        help="print a line for every file downloaded")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    return parser
+
+
+def verify(args):
+    """Check a folder against its manifest, printing each problem; returns the exit code."""
+    def report(relative_path, problem):
+        if problem:
+            print(f"{relative_path}: {problem}", file=sys.stderr)
+        elif args.verbose:
+            print(f"{relative_path}: OK", file=sys.stderr)
+    
+    try:
+        problems = verify_folder(args.verify, workers=args.workers, quick=args.quick, on_result=report)
+    except FileNotFoundError as e:
+        print(f"aeropull: {e}", file=sys.stderr)
+        return EXIT_CODES["error"]
+    print(f"Result: {len(problems)} problems" if problems else "Result: all files match", file=sys.stderr)
+    return EXIT_CODES["incomplete"] if problems else EXIT_CODES["complete"]
+
+
+def list_jobs(queue):
+    """Print one line per queued job."""
+    for job in queue.jobs:
+        print(f"{job.id:>4}  {job.state:<10}  {job.url}  ->  {job.output_dir}")
+
+
+def start_metrics(args, metrics):
+    """Start the metrics endpoint and snapshot file the command line asks for; returns them to close() afterwards.
+    
+    Raises OSError if the port can't be bound.
+    """
+    reporters = []
+    if args.metrics_port is not None:
+        reporters.append(MetricsServer(metrics, args.metrics_port).start())
+    if args.metrics_file:
+        reporters.append(SnapshotWriter(metrics, args.metrics_file, args.metrics_interval).start())
+    return reporters
+
+
+def stop_metrics(reporters):
+    for reporter in reporters:
+        reporter.close()
+
+
+def run_queue(args):
+    """Run every queued job side by side until the queue is done; returns the exit code."""
+    def changed(job):
+        if not args.quiet or job.state == "error":
+            print(f"Job {job.id} {job.state}: {job.url}", file=sys.stderr, flush=True)
+    
+    queue = JobQueue(args.jobs, workers=args.workers, max_running=args.max_jobs,
+                     history_file=args.history, history_format=args.history_format, on_change=changed)
+    if not any(job.state == "queued" for job in queue.jobs):
+        print("aeropull: no queued jobs", file=sys.stderr)
+        return EXIT_CODES["complete"]
+    try:
+        reporters = start_metrics(args, queue.metrics)
+    except OSError as e:
+        print(f"aeropull: can't serve metrics on port {args.metrics_port}: {e.strerror or e}", file=sys.stderr)
+        return EXIT_CODES["error"]
+    
+    interval = 1 if sys.stderr.isatty() else 5
+    try:
+        queue.start()
+        waiter = Thread(target=queue.wait, daemon=True)
+        waiter.start()
+        if args.control:
+            Thread(target=read_queue_commands, args=(queue,), daemon=True).start()
+        while waiter.is_alive():
+            waiter.join(interval)
+            running = [job for job in queue.jobs if job.state == "running"]
+            if running and waiter.is_alive() and not args.quiet:
+                done = sum(job.snapshot().downloaded_files for job in running)
+                total = sum(job.snapshot().total_files for job in running)
+                print(f"{len(running)} jobs running, {done}/{total} files, "
+                      f"{queue.budget.in_use}/{queue.budget.total} slots busy", file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        print("\nStopping; running jobs stay queued...", file=sys.stderr)
+        return EXIT_CODES["cancelled"]
+    finally:
+        queue.stop()
+        stop_metrics(reporters)
+    
+    list_jobs(queue)
+    failed = [job for job in queue.jobs if job.state in ("incomplete", "error")]
+    return EXIT_CODES["incomplete"] if failed else EXIT_CODES["complete"]
+
+
+def crawl_index_path(value):
+    """Return the crawl index path --crawl-index asks for: the default, None for 'none', or an absolute path."""
+    if value is None:
+        return CrawlIndex.FILENAME
+    return None if value.lower() == "none" else os.path.abspath(value)
+
+
+def engine_options(args, file_types):
+    """Return the DownloadEngine keyword arguments the command line asks for."""
+    return dict(
+        max_depth=args.depth,
+        file_types=file_types,
+        workers=args.workers,
+        per_host_connections=args.per_host,
+        adaptive_concurrency=not args.fixed_concurrency,
+        retries=max(0, args.retries),
+        schedule=args.schedule,
+        priorities=args.prioritize.split(','),
+        crawl_order=args.crawl_order,
+        mirrors=args.mirror,
+        split_mirrors=args.split_mirrors,
+        store=args.store,
+        store_link=args.store_link,
+        decompress=args.decompress,
+        keep_compressed=not args.drop_bz2,
+        decompress_queue=args.decompress_queue,
+        manifest=not args.no_manifest,
+        segments=args.segments,
+        segment_threshold=args.segment_threshold * 1024 * 1024,
+        engine_type=args.engine,
+        sync=bool(args.sync),
+        prune=args.prune,
+        user_agent=args.user_agent,
+        headers=dict(args.header),
+        history_file=args.history,
+        history_format=args.history_format,
+        crawl_index_path=crawl_index_path(args.crawl_index),
+        limits={limit: getattr(args, option.replace('-', '_')) for limit, (option, _) in LIMIT_OPTIONS.items()}
+    )
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    if args.verify:
+        return verify(args)
+    if args.list_jobs:
+        list_jobs(JobQueue(args.jobs))
+        return EXIT_CODES["complete"]
+    if args.run_queue:
+        return run_queue(args)
+    if not args.url:
+        parser.error("a URL is required unless --verify, --run-queue or --list-jobs is given")
+    if not args.url.startswith(('http://', 'https://')):
+        parser.error("URL must start with http:// or https://")
+    if args.prune and not args.sync:
+        parser.error("--prune requires --sync")
+    if args.drop_bz2 and not args.decompress:
+        parser.error("--drop-bz2 requires --decompress")
+    if not all(mirror.startswith(('http://', 'https://')) for mirror in args.mirror):
+        parser.error("mirror URLs must start with http:// or https://")
+    file_types = [ext.strip() for ext in args.types.split(',') if ext.strip()]
+    if not file_types:
+        parser.error("--types must name at least one extension")
+    
+    if args.enqueue:
+        queue = JobQueue(args.jobs)
+        output_dir = args.sync or (DownloadJournal.find_resumable(args.output, args.url) if args.resume else None)
+        job = queue.add(args.url, output_dir, parent=args.output, **engine_options(args, file_types))
+        print(f"Queued job {job.id}: {job.url} -> {job.output_dir}", file=sys.stderr)
+        return EXIT_CODES["complete"]
+    
+    if args.sync:
+        output_dir = args.sync
+    else:
+        output_dir = None
+        if args.resume:
+            output_dir = DownloadJournal.find_resumable(args.output, args.url)
+        output_dir = output_dir or new_scrape_folder(args.output)
+    
+    listener = ConsoleListener(quiet=args.quiet, verbose=args.verbose)
+    engine = DownloadEngine(args.url, output_dir, listener=listener, **engine_options(args, file_types))
+    listener.engine = engine
+    # Metrics first, so a taken port fails before the engine opens anything that would need closing
+    try:
+        reporters = start_metrics(args, engine.metrics)
+    except OSError as e:
+        print(f"aeropull: can't serve metrics on port {args.metrics_port}: {e.strerror or e}", file=sys.stderr)
+        return EXIT_CODES["error"]
+    try:
+        engine.open()
+    except Exception as e:
+        stop_metrics(reporters)
+        print(f"aeropull: {e}", file=sys.stderr)
+        return EXIT_CODES["error"]
+    if not args.quiet:
+        print(f"Saving to {os.path.abspath(output_dir)}", file=sys.stderr)
+    
+    # Run in a thread so Ctrl-C can cancel cleanly and keep .part files resumable
+    worker = Thread(target=engine.run, daemon=True)
+    worker.start()
+    if args.control:
+        Thread(target=read_control_commands, args=(engine,), daemon=True).start()
+    try:
+        while worker.is_alive():
+            worker.join(listener.interval)
+            if worker.is_alive():
+                listener.report()
+    except KeyboardInterrupt:
+        print("\nCancelling...", file=sys.stderr)
+        engine.cancel()
+        worker.join()
+    stop_metrics(reporters)
+    
+    print(f"Result: {engine.result}", file=sys.stderr)
+    return EXIT_CODES.get(engine.result, EXIT_CODES["error"])
@@ -0,0 +1,203 @@
+"""Post-download stage that unpacks .bz2 files as they finish, while streaming or on a process pool."""
+import bz2
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from threading import BoundedSemaphore, Lock
+
+
+SUFFIX = ".bz2"
+TEMP_SUFFIX = ".unpacking"
+
+
+def unpacked_path(path):
+    """Return where a .bz2 file unpacks to: the same path without the suffix."""
+    return path[:-len(SUFFIX)]
+
+
+def _install(path, temp_path, keep_original):
+    """Move an unpacked temp file into place with the original's mtime; return its size."""
+    target = unpacked_path(path)
+    stat = os.stat(path)
+    os.utime(temp_path, (stat.st_atime, stat.st_mtime))
+    os.replace(temp_path, target)
+    if not keep_original:
+        os.remove(path)
+    return os.path.getsize(target)
+
+
+def decompress_file(path, keep_original=True):
+    """Unpack a .bz2 file next to itself and return the unpacked size. Runs in a pool process."""
+    temp_path = path + TEMP_SUFFIX
+    try:
+        with bz2.open(path, 'rb') as source, open(temp_path, 'wb') as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return _install(path, temp_path, keep_original)
+
+
+class StreamingUnpacker:
+    """Passes writes through to a .bz2 download while unpacking them, so no second pass over it is needed.
+    
+    Only works for a download written in order from its first byte; size
+    counts the compressed bytes seen, so a resume can tell whether it may
+    carry on. Concatenated streams, as written by parallel bzip2 tools, are
+    unpacked one after the other.
+    """
+    
+    CHUNK = 1024 * 1024  # Most unpacked bytes held in memory at once
+    
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = path + TEMP_SUFFIX
+        self.output = open(self.temp_path, 'wb')
+        self.decompressor = bz2.BZ2Decompressor()
+        self.size = 0
+        self.streams = 0  # Complete streams unpacked
+        self.in_stream = False
+        self.failed = False
+        self.file = None
+    
+    def wrap(self, f):
+        """Write through to f from now on; returns self."""
+        self.file = f
+        return self
+    
+    def write(self, data):
+        written = self.file.write(data)
+        self.size += len(data)
+        if not self.failed:
+            try:
+                self._feed(data)
+            except (OSError, EOFError, ValueError):
+                self.failed = True  # Not something we can stream; the pool will try, and report it
+        return written
+    
+    def _feed(self, data):
+        while data or not self.decompressor.needs_input:
+            self.output.write(self.decompressor.decompress(data, self.CHUNK))
+            data = b''
+            self.in_stream = True
+            if self.decompressor.eof:
+                data = self.decompressor.unused_data  # The next stream, if any
+                self.decompressor = bz2.BZ2Decompressor()
+                self.in_stream = False
+                self.streams += 1
+    
+    def finish(self, keep_original):
+        """Install the unpacked file if every stream was complete; returns its size, or None if it wasn't."""
+        self.output.close()
+        if self.failed or self.in_stream or not self.streams:
+            self.discard()
+            return None
+        return _install(self.path, self.temp_path, keep_original)
+    
+    def discard(self):
+        """Drop what was unpacked so far."""
+        self.output.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class DecompressionStage:
+    """Unpacks finished .bz2 downloads next to themselves.
+    
+    Downloads written in order from their first byte are unpacked as they
+    stream. The rest, such as resumed or segmented files, go to a process
+    pool so bz2's CPU cost is spread over every core and never holds the GIL
+    against the downloaders. At most max_pending files wait for the pool;
+    beyond that submit() blocks the downloader that finished one.
+    on_done(path, size, error) is called as each file is unpacked.
+    """
+    
+    def __init__(self, keep_original=True, workers=None, max_pending=8, on_done=None):
+        self.keep_original = keep_original
+        self.workers = workers
+        self.slots = BoundedSemaphore(max(1, max_pending))
+        self.on_done = on_done or (lambda path, size, error: None)
+        self.lock = Lock()
+        self.streams = {}  # path -> StreamingUnpacker
+        self.pool = None  # Started when the first file needs it
+    
+    @staticmethod
+    def wants(path):
+        """Return True if path is a file this stage unpacks."""
+        return path.lower().endswith(SUFFIX)
+    
+    def unpacked(self, path):
+        """Return True if path's unpacked copy exists and was made from this version of it."""
+        target = unpacked_path(path)
+        return os.path.exists(target) and abs(os.path.getmtime(target) - os.path.getmtime(path)) < 1
+    
+    def stream(self, path, offset, f):
+        """Wrap f, a .bz2 download being written at offset, to unpack it as it streams if possible."""
+        with self.lock:
+            unpacker = self.streams.pop(path, None)
+            if unpacker and (offset == 0 or unpacker.size != offset or unpacker.failed):
+                unpacker.discard()
+                unpacker = None
+            if unpacker is None and offset == 0:
+                try:
+                    unpacker = StreamingUnpacker(path)
+                except OSError:
+                    return f
+            if unpacker is None:
+                return f  # Bytes it never saw are on disk; the pool will unpack the file
+            self.streams[path] = unpacker
+        return unpacker.wrap(f)
+    
+    def submit(self, path):
+        """Unpack a finished .bz2 file: install its streamed copy, or queue it for the pool."""
+        with self.lock:
+            unpacker = self.streams.pop(path, None)
+        if unpacker and unpacker.size != os.path.getsize(path):
+            unpacker.discard()
+        elif unpacker:
+            try:
+                size = unpacker.finish(self.keep_original)
+            except OSError as e:
+                self.on_done(path, None, e)
+                return
+            if size is not None:
+                self.on_done(path, size, None)
+                return
+        
+        self.slots.acquire()  # Backpressure: wait for the pool to catch up
+        try:
+            with self.lock:
+                if self.pool is None:
+                    self.pool = ProcessPoolExecutor(self.workers)
+                future = self.pool.submit(decompress_file, path, self.keep_original)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda done: self._finished(path, done))
+    
+    def _finished(self, path, future):
+        self.slots.release()
+        try:
+            size, error = future.result(), None
+        except Exception as e:
+            size, error = None, e
+        self.on_done(path, size, error)
+    
+    def discard(self, path):
+        """Forget a download that failed or was cancelled part way."""
+        with self.lock:
+            unpacker = self.streams.pop(path, None)
+        if unpacker:
+            unpacker.discard()
+    
+    def close(self, cancel=False):
+        """Wait for queued files to be unpacked, or drop the ones not started if cancel, then stop the pool."""
+        with self.lock:
+            unpackers = list(self.streams.values())
+            self.streams.clear()
+            pool, self.pool = self.pool, None
+        for unpacker in unpackers:
+            unpacker.discard()
+        if pool:
+            pool.shutdown(wait=True, cancel_futures=cancel)
@@ -0,0 +1,1431 @@
+"""Headless crawl-and-download engine.
+
+DownloadEngine holds everything a job needs (counters, pause/cancel state,
+the HTTP session, journal and indexes) and reports progress to an
+EngineListener, so it can be driven by the Tk UI, the command line or any
+other program without importing tkinter.
+"""
+import itertools
+import os
+import re
+import sqlite3
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.utils import formatdate
+from queue import Queue, PriorityQueue, Empty
+from threading import Thread, Event, Lock, BoundedSemaphore, local
+from urllib.parse import urlparse, urljoin, unquote
+
+from .async_engine import AsyncDownloadEngine
+from .decompress import DecompressionStage, unpacked_path
+from .frontier import DownloadPriority, CrawlFrontier
+from .listing import ManifestEntry, ListingReader
+from .metrics import Metrics
+from .net import (HTTPSessionPool, RateLimiter, ConcurrencyController, RetryPolicy, CircuitBreaker,
+                  MirrorSet, ChunkSizer, body_reader, http_date_to_epoch, RETRYABLE_ERRORS)
+from .storage import (PART_SUFFIX, METADATA_FILES, DownloadJournal, MirrorState, Manifest, CrawlIndex,
+                      HistoryLog, ObjectStore, HashingWriter)
+
+
+CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+ENGINE_TYPES = ("threaded", "asyncio")
+
+# A consistent copy of the engine's counters, taken by DownloadEngine.snapshot().
+# failed_files are files that failed after all their retries.
+# While crawling is True the totals are still growing as listings are read.
+EngineProgress = namedtuple('EngineProgress', [
+    'total_files', 'downloaded_files', 'failed_files',
+    'total_bytes', 'downloaded_bytes', 'transferred_bytes', 'phase', 'status', 'concurrency',
+    'crawling'
+])
+
+
+class RemoteFileChanged(IOError):
+    """A file changed upstream while it was partially downloaded; a retry starts it over."""
+
+
+def new_scrape_folder(parent):
+    """Return the path of a new timestamped SCRAPE folder under parent."""
+    now = datetime.now()
+    return os.path.join(parent, f"SCRAPE_{now.strftime('%d-%m_%H-%M')}")
+
+
+class DownloadWorkerPool:
+    """Fixed-size pool of worker threads that pull download jobs off a priority queue.
+    
+    Jobs with the lowest key run first, in submission order among equal
+    keys. Connections per host are left to the handler, which takes a slot
+    from the engine's ConcurrencyController for each attempt at a file.
+    """
+    
+    def __init__(self, handler, num_workers=8):
+        self.handler = handler
+        self.num_workers = max(1, num_workers)
+        self.jobs = PriorityQueue()
+        self._sequence = itertools.count()
+        self._threads = []
+    
+    def start(self):
+        """Start the worker threads."""
+        for i in range(self.num_workers):
+            worker = Thread(target=self._worker, name=f"AeroPull-worker-{i}", daemon=True)
+            worker.start()
+            self._threads.append(worker)
+    
+    def submit(self, file_url, *args, key=()):
+        """Queue a file for download."""
+        self.jobs.put((key, next(self._sequence), (file_url,) + args))
+    
+    def join(self):
+        """Wait for all queued jobs to finish, then stop the workers."""
+        self.jobs.join()
+        for _ in self._threads:
+            self.jobs.put(((), next(self._sequence), None))
+        for worker in self._threads:
+            worker.join()
+        self._threads = []
+    
+    def _worker(self):
+        """Process jobs until a stop sentinel is received."""
+        while True:
+            _, _, job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                self.handler(*job)
+            except Exception:
+                pass  # Handlers track their own failures
+            finally:
+                self.jobs.task_done()
+
+
+class EngineListener:
+    """Receives events from a DownloadEngine.
+    
+    Methods are called from the engine's worker threads; override the ones
+    you need. Progress is deliberately not an event: workers only bump
+    counters, and listeners sample DownloadEngine.snapshot() at whatever
+    rate suits them, so their overhead doesn't grow with download speed.
+    """
+    
+    def on_status(self, text):
+        """A human-readable status line changed."""
+    
+    def on_file_started(self, relative_path):
+        """A file transfer is starting; reported as a status line by default."""
+        self.on_status(f"Downloading {relative_path}...")
+    
+    def on_phase(self, phase):
+        """The job moved to a new phase: "counting" or "downloading"."""
+    
+    def on_finished(self, result):
+        """The job ended with "complete", "incomplete", "cancelled" or "error"."""
+
+
+class DownloadEngine:
+    """Crawls a FastDL tree and downloads every matching file into a folder."""
+    
+    def __init__(self, base_url, output_dir, max_depth=0, file_types=(".bsp", ".bz2"),
+                 workers=8, per_host_connections=4, engine_type="threaded",
+                 sync=False, prune=False, user_agent=None, headers=None,
+                 history_file="download_history.log", history_format="text",
+                 history_max_bytes=10 * 1024 * 1024, crawl_index_path=CrawlIndex.FILENAME,
+                 segments=4, segment_threshold=32 * 1024 * 1024, limits=None,
+                 adaptive_concurrency=True, retries=3, schedule="discovery", priorities=(),
+                 crawl_order="dfs", mirrors=(), split_mirrors=False, store=None, store_link="hardlink",
+                 decompress=False, keep_compressed=True, decompress_queue=8, manifest=True,
+                 budget=None, controller=None, limiter=None, history=None, metrics=None, listener=None):
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.scrape_folder = output_dir
+        self.max_depth = max_depth
+        self.file_types = [ext.strip().lower() for ext in file_types if ext.strip()]
+        self.listener = listener or EngineListener()
+        
+        # Download tracking
+        self.total_files = 0
+        self.downloaded_files = 0
+        self.failed_files = 0
+        self.total_bytes = 0
+        self.downloaded_bytes = 0  # Progress, including bytes already on disk
+        self.transferred_bytes = 0  # Bytes actually received during this run
+        self.start_time = None
+        self.stats_lock = Lock()  # Guards counters shared by worker threads
+        
+        # State flags
+        self.cancel_requested = False
+        self.paused = False
+        self.pause_event = Event()
+        self.pause_event.set()
+        self.phase = None
+        self.status_text = ""
+        self.result = None
+        
+        # History log
+        self.history_file = history_file
+        self.history_format = history_format
+        self.history_max_bytes = history_max_bytes
+        self.history = history  # A HistoryLog shared with other jobs, or opened from history_file
+        self._owns_history = history is None
+        
+        # Failed downloads tracking; every request is retried on the spot per the retry policy
+        self.failed_downloads = []
+        self.retry_policy = RetryPolicy(retries=retries)
+        self.breaker = CircuitBreaker()
+        self.retry_counts = {}  # relative_path -> retries it took
+        self._counted_parts = set()  # Files whose bytes on disk an attempt has counted; retries don't again
+        
+        # Other base URLs serving the same tree; files come from whichever is fastest
+        self.mirrors = MirrorSet([self.base_url, *mirrors], self.breaker)
+        self.split_mirrors = split_mirrors  # Spread a segmented file's pieces over several mirrors
+        
+        # Parallel downloads
+        self.max_workers = max(1, workers)
+        self.per_host_connections = max(1, per_host_connections)
+        self.engine_type = engine_type
+        self.download_pool = None
+        # Requests in flight per host start at per_host_connections and adapt between 1 and workers,
+        # unless a job queue shares one controller between its jobs
+        self.concurrency = controller or ConcurrencyController(
+            initial=self.per_host_connections,
+            maximum=max(self.max_workers, self.per_host_connections),
+            adaptive=adaptive_concurrency
+        )
+        # Download slots shared fairly with the other jobs of a JobQueue; None runs unbudgeted
+        self.budget = budget
+        
+        # Per-phase timings and counters, shared with the other jobs of a JobQueue
+        self.metrics = metrics or Metrics()
+        self.metrics.add_gauge_source('hosts', self.concurrency.gauges)
+        
+        # Segmented downloads: big files are fetched as byte ranges over several connections
+        self.max_segments = max(1, segments)
+        self.segment_threshold = segment_threshold
+        # Connections beyond each worker's own, shared by every segmented file
+        self.segment_slots = BoundedSemaphore(max(1, self.max_segments - 1))
+        self.journal = None
+        
+        # Crawl and download run as one pipeline: files queue for download as listings are read
+        self.crawl_manifest = []  # Every file found so far
+        self.crawling = False
+        self.download_priority = DownloadPriority(schedule, priorities)
+        self.crawl_order = crawl_order
+        
+        # Sync mode
+        self.sync_mode = sync
+        self.prune_deleted = prune
+        self.mirror_state = None
+        self.listing_failures = 0
+        self.mtime_resolution = 60  # HTML listings only show minutes, rounded down
+        
+        # Crawl index, shared by the scrape folders next to this one: a relative path is taken
+        # from the output folder's parent, and None turns the index off
+        self.crawl_index_path = crawl_index_path
+        self.crawl_index = None
+        
+        # Checksums, taken as files stream, for the folder's manifest and the shared store
+        self.write_manifest = manifest
+        self.manifest = None
+        self.store_path = store
+        self.store_link = store_link
+        self.store = None
+        self._hashers = {}  # relative_path -> HashingWriter of its .part file
+        
+        # Unpacking .bz2 files as they finish
+        self.decompress = decompress
+        self.keep_compressed = keep_compressed
+        self.decompress_queue = decompress_queue
+        self.decompressor = None
+        self.unpack_failures = 0
+        
+        # HTTP
+        self.user_agent = user_agent or HTTPSessionPool.DEFAULT_USER_AGENT
+        self.extra_headers = dict(headers or {})
+        self.http = None
+        # Bandwidth and request-rate limits, see RateLimiter.LIMITS, unless a job queue shares
+        # one limiter between its jobs and applies their limits to it
+        self.limiter = limiter or RateLimiter(**(limits or {}))
+        self._buffers = local()  # One reusable read buffer per worker thread
+        self._opened = False
+    
+    def open(self):
+        """Create the output folder and open the job's session, journal and indexes.
+        
+        Called by run() if needed; call it first to surface folder errors early.
+        """
+        if self._opened:
+            return
+        if self.engine_type == "asyncio" and not AsyncDownloadEngine.available():
+            raise RuntimeError("The asyncio engine requires the aiohttp package")
+        
+        os.makedirs(self.scrape_folder, exist_ok=True)
+        self.journal = DownloadJournal(self.scrape_folder, self.base_url)
+        self.mirror_state = MirrorState(self.scrape_folder)
+        if self.write_manifest:
+            self.manifest = Manifest(self.scrape_folder, self.base_url)
+        
+        if self.history is None and self.history_file:
+            self.history = HistoryLog(self.history_file, self.history_format, self.history_max_bytes)
+        
+        # One pooled session per job, sized so every worker can keep a connection alive
+        self.http = HTTPSessionPool(
+            pool_size=max(self.max_workers, self.per_host_connections) + self.max_segments - 1,
+            user_agent=self.user_agent,
+            headers=self.extra_headers,
+            limiter=self.limiter,
+            controller=self.concurrency,
+            breaker=self.breaker,
+            metrics=self.metrics,
+            throttle=self._throttle
+        )
+        
+        if self.crawl_index_path:
+            try:
+                parent = os.path.dirname(os.path.abspath(self.scrape_folder))
+                self.crawl_index = CrawlIndex(os.path.join(parent, self.crawl_index_path))
+            except sqlite3.Error:
+                self.crawl_index = None  # Crawl without the index rather than fail the job
+        
+        if self.store_path:
+            self.store = ObjectStore(self.store_path, self.store_link)
+        
+        if self.decompress:
+            self.decompressor = DecompressionStage(
+                self.keep_compressed, max_pending=self.decompress_queue, on_done=self._unpacked
+            )
+        
+        self.start_time = time.time()
+        self._opened = True
+    
+    def run(self):
+        """Crawl and download, with files queued as they are found. Blocks until the job ends and returns its result."""
+        try:
+            self.open()
+            self._set_phase("counting")  # Until the first file turns up
+            self.update_status(f"Crawling {self.base_url}")
+            if self.engine_type == "asyncio":
+                AsyncDownloadEngine(self, self.max_workers).run(self.base_url, self.max_depth, self.file_types)
+            else:
+                self.download_pool = self._create_download_pool()
+                try:
+                    self.scrape_and_download(self.base_url, self.max_depth, self.file_types)
+                finally:
+                    self.download_pool.join()
+            if self.decompressor:
+                if not self.cancel_requested:
+                    self.update_status("Unpacking the last .bz2 files...")
+                self.decompressor.close(cancel=self.cancel_requested)
+            if self.manifest and not self.cancel_requested:
+                self._complete_manifest()
+            # Final status update
+            if self.cancel_requested:
+                self.result = "cancelled"
+            elif self.failed_downloads or self.listing_failures or self.unpack_failures:
+                self.result = "incomplete"
+                self.update_status(f"Completed with {len(self.failed_downloads)} failed downloads, "
+                                   f"{self.listing_failures} unreadable listings and "
+                                   f"{self.unpack_failures} files that could not be unpacked")
+            else:
+                self.result = "complete"
+                self.journal.finish()
+                self.update_status("All files downloaded successfully!")
+        except Exception as e:
+            self.result = "error"
+            self.update_status(f"Error: {str(e)}")
+        finally:
+            self.close()
+            self.listener.on_finished(self.result)
+        return self.result
+    
+    def close(self):
+        """Save state and release the session and indexes."""
+        if self.mirror_state:
+            self.mirror_state.save()
+        if self.manifest:
+            self.manifest.save()
+        if self.crawl_index:
+            self.crawl_index.close()
+            self.crawl_index = None
+        if self.store:
+            self.store.close()
+            self.store = None
+        if self.decompressor:
+            self.decompressor.close(cancel=True)  # Already drained unless the job failed
+        self._log_connection_stats()
+        self.http = None
+        if self.history and self._owns_history:
+            self.history.close()
+    
+    def pause(self):
+        """Pause downloads; in-flight transfers release their connections."""
+        self.paused = True
+        self.pause_event.clear()  # Blocks threads
+    
+    def resume(self):
+        """Resume paused downloads with ranged requests."""
+        self.paused = False
+        self.pause_event.set()  # Allows threads to run
+    
+    def set_limits(self, **limits):
+        """Change bandwidth or request-rate limits, also while the job runs."""
+        self.limiter.set_limits(**limits)
+    
+    def cancel(self):
+        """Cancel the job; partial files are kept so it can be resumed."""
+        self.cancel_requested = True
+        self.pause_event.set()  # Unblock any paused threads
+        self.log_download("SYSTEM", "DOWNLOAD CANCELLED", self.downloaded_bytes)
+    
+    def _handle_orphans(self, max_depth, file_types):
+        """Report, and optionally delete, local files that are no longer listed upstream."""
+        if self.listing_failures:
+            self.log_download("SYSTEM", f"SYNC: skipped orphan check, {self.listing_failures} listings failed", 0)
+            return
+        
+        listed = {entry.relative_path for entry in self.crawl_manifest}
+        if self.decompressor:
+            listed |= {unpacked_path(path) for path in listed if DecompressionStage.wants(path)}
+        orphans = []
+        for folder, _, filenames in os.walk(self.scrape_folder):
+            for filename in filenames:
+                path = os.path.join(folder, filename)
+                relative_path = os.path.relpath(path, self.scrape_folder).replace(os.sep, '/')
+                ext = os.path.splitext(filename)[1].lower()
+                if (relative_path in METADATA_FILES or filename.endswith(PART_SUFFIX)
+                        or ext not in file_types or relative_path.count('/') > max_depth):
+                    continue  # Not something this crawl could have listed
+                if relative_path not in listed:
+                    orphans.append((relative_path, path))
+        
+        for relative_path, path in orphans:
+            if self.prune_deleted:
+                try:
+                    os.remove(path)
+                    self.mirror_state.remove(relative_path)
+                    if self.manifest:
+                        self.manifest.remove(relative_path)
+                    self.log_download(relative_path, "DELETED (gone upstream)", 0)
+                except OSError as e:
+                    self.log_download(relative_path, f"ERROR: could not delete: {str(e)}", 0)
+            else:
+                self.log_download(relative_path, "ORPHANED (gone upstream)", 0)
+        
+        if orphans:
+            action = "Deleted" if self.prune_deleted else "Found"
+            self.update_status(f"{action} {len(orphans)} local files that are gone upstream")
+    
+    def _log_connection_stats(self):
+        """Record how well connections were reused, then release them."""
+        if self.http is None:
+            return
+        sent, opened = self.http.connection_stats()
+        self.log_download("SYSTEM", f"CONNECTIONS: {sent} requests over {opened} connections", 0)
+        self.http.close()
+    
+    def _create_download_pool(self):
+        """Create and start a worker pool that feeds download_file."""
+        pool = DownloadWorkerPool(self.download_file, num_workers=self.max_workers)
+        pool.start()
+        return pool
+    
+    def crawl_listings(self, url, max_depth, file_types):
+        """Walk the directory listings in crawl_order and yield a ManifestEntry per matching file."""
+        base_url = url if url.endswith('/') else url + '/'
+        frontier = CrawlFrontier(self.crawl_order)
+        frontier.push([base_url], 0)
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as head_pool:
+            while frontier and not self.cancel_requested:
+                current_url, current_depth = frontier.pop()
+                try:
+                    listing = self._with_retries(current_url, self._fetch_listing, current_url)
+                except Exception as e:
+                    self._record_listing_failure(current_url, e)
+                    continue  # The rest of the tree still gets crawled
+                
+                files, subdirs = self._classify_listing(listing, current_url, base_url, file_types)
+                yield from self._size_files(files, head_pool)
+                if current_depth < max_depth:
+                    frontier.push(subdirs, current_depth + 1)
+    
+    def _size_files(self, files, head_pool):
+        """Fill in the sizes a listing didn't show, with concurrent HEAD requests."""
+        unsized = [entry for entry in files if entry.size is None]
+        if not unsized:
+            return files
+        sizes = dict(zip(
+            (entry.url for entry in unsized),
+            head_pool.map(self._head_size, (entry.url for entry in unsized))
+        ))
+        if self.crawl_index:
+            self.crawl_index.record_sizes(sizes)
+        return [
+            entry._replace(size=sizes[entry.url]) if entry.size is None else entry
+            for entry in files
+        ]
+    
+    def _fetch_listing(self, url):
+        """Fetch and parse one directory listing, revalidating it against the crawl index."""
+        headers = self.crawl_index.conditional_headers(url) if self.crawl_index else {}
+        parsing = 0.0  # Time spent in the parser while the body streamed, which isn't fetching
+        fetching = self.metrics.start('listing_fetch')
+        try:
+            with self.concurrency.slot(url), self.http.get(url, headers=headers, stream=True) as response:
+                response.raise_for_status()
+                reader = ListingReader(self.crawl_index, url, response.status_code, response.headers)
+                for chunk in response.iter_content(chunk_size=65536):
+                    began = time.monotonic()
+                    reader.feed(chunk)
+                    parsing += time.monotonic() - began
+                    self._throttle(self.limiter.bytes_delay(url, len(chunk)))
+        finally:
+            self.metrics.finish('listing_fetch', fetching, excluding=parsing)
+        began = time.monotonic()
+        listing = reader.finish()
+        self.metrics.observe('listing_parse', parsing + time.monotonic() - began)
+        return listing
+    
+    def _record_listing_failure(self, url, error):
+        """Account for a listing that couldn't be fetched; the job ends incomplete."""
+        with self.stats_lock:
+            self.listing_failures += 1
+        self.metrics.add('listing_failures')
+        self.log_download(url, f"ERROR: listing failed: {str(error)}", 0, http_status=RetryPolicy.status_of(error))
+    
+    def _classify_listing(self, listing, current_url, base_url, file_types):
+        """Split a parsed listing into matching files and subdirectory URLs."""
+        files = []
+        subdirs = []
+        for entry in listing:
+            href = entry.href
+            if href in ('../', './') or '?' in href:
+                continue
+            
+            full_url = urljoin(current_url, href)
+            if not full_url.startswith(base_url) or full_url == current_url:
+                continue  # Parent, sibling or external link
+            
+            if href.endswith('/'):
+                subdirs.append(full_url)
+            else:
+                ext = os.path.splitext(href)[1].lower()
+                if any(ext == file_ext for file_ext in file_types):
+                    relative_path = unquote(full_url[len(base_url):])
+                    if '..' in relative_path.split('/'):
+                        continue  # Never write outside the scrape folder
+                    files.append(ManifestEntry(full_url, relative_path, entry.size, entry.mtime))
+        return files, subdirs
+    
+    def _head_size(self, file_url):
+        """Return a file's size from a HEAD request, or 0 if it can't be determined."""
+        if self.cancel_requested:
+            return 0
+        try:
+            return self._with_retries(file_url, self._fetch_head_size, file_url)
+        except Exception:
+            return 0
+    
+    def _fetch_head_size(self, file_url):
+        with self.metrics.timed('head'), self.concurrency.slot(file_url):
+            head = self.http.head(file_url)
+        head.raise_for_status()
+        return int(head.headers.get('content-length', 0))
+    
+    def scrape_and_download(self, url, max_depth, file_types):
+        """Crawl the given URL and queue files on the download pool as they are found.
+        
+        Returns once the crawl is done; the pool keeps downloading what is queued.
+        """
+        self.crawling = True
+        try:
+            for entry in self.crawl_listings(url, max_depth, file_types):
+                key = self._record_discovered(entry)
+                self.download_pool.submit(entry.url, entry.relative_path, entry.size, entry.mtime, key=key)
+        except Exception as e:
+            self.update_status(f"Error scraping {url}: {str(e)}")
+        finally:
+            self._crawl_finished()
+    
+    def _record_discovered(self, entry):
+        """Count a file the crawl found towards the totals and return its download priority key."""
+        with self.stats_lock:
+            self.crawl_manifest.append(entry)
+            self.total_files += 1
+            self.total_bytes += entry.size or 0
+        if self.phase == "counting":
+            self._set_phase("downloading")
+        return self.download_priority.key(entry)
+    
+    def _crawl_finished(self):
+        """Settle the totals once every listing has been read, and sync orphans if asked."""
+        self.crawling = False
+        if self.cancel_requested:
+            return
+        if self.total_files:
+            self.update_status(f"Found {self.total_files} files, downloading...")
+        else:
+            self.update_status("No matching files found")
+        if self.sync_mode:
+            self._handle_orphans(self.max_depth, self.file_types)
+    
+    def download_file(self, file_url, relative_path, size=None, mtime=None):
+        """Download a single file, retrying transient failures per the retry policy.
+        
+        size and mtime come from the directory listing and let sync mode skip
+        files that are already up to date without sending a request.
+        """
+        if self.cancel_requested:
+            return
+        self.pause_event.wait()  # Don't open new connections while paused
+        if self.budget is None:
+            with self.metrics.timed('file'):
+                return self._download_file(file_url, relative_path, size, mtime)
+        if self.budget.acquire(self, abandon=lambda: self.cancel_requested):
+            try:
+                with self.metrics.timed('file'):
+                    self._download_file(file_url, relative_path, size, mtime)
+            finally:
+                self.budget.release(self)
+    
+    def _download_file(self, file_url, relative_path, size, mtime):
+        """download_file's attempts, once it may start."""
+        started_at = time.time()
+        attempt = 0
+        resumed = False
+        avoid = set()  # Mirrors that failed this round
+        while True:
+            url = self.mirrors.choose(file_url, avoid)
+            try:
+                self._wait_for_host(url)
+                with self.concurrency.slot(url), self.mirrors.use(url):
+                    self._fetch_file(url, relative_path, size, mtime, started_at, resumed)
+                break
+            except Exception as e:
+                # A retry resumes what earlier attempts wrote, counted once an attempt got that far
+                resumed = relative_path in self._counted_parts
+                if self._fail_over(url, e, avoid):
+                    continue
+                attempt += 1
+                avoid.clear()  # Every mirror gets another go after the backoff
+                if self._retry_wait(url, e, attempt):
+                    self.retry_counts[relative_path] = attempt
+                    continue
+                part_path = os.path.join(self.scrape_folder, relative_path) + PART_SUFFIX
+                downloaded = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+                self._counted_parts.discard(relative_path)
+                self._record_failure(url, relative_path, e, downloaded, started_at)
+                return
+        self._counted_parts.discard(relative_path)
+        self._unpack(relative_path)
+    
+    def _fetch_file(self, file_url, relative_path, size, mtime, started_at, resumed=False):
+        """Make one attempt at a file, resuming its .part file with a ranged request when possible.
+        
+        Raises on failure; download_file decides whether to try again.
+        """
+        save_path = os.path.join(self.scrape_folder, relative_path)
+        part_path = save_path + PART_SUFFIX
+        conditional = {}
+        stored = None
+        local_path, local_size = self._local_copy(save_path, size)
+        if local_path:
+            if not self.sync_mode:
+                self._record_skipped(file_url, local_size)
+                return
+            if local_path == save_path and self._mirror_unchanged(relative_path, save_path, size, mtime):
+                self._record_skipped(file_url, size, "UNCHANGED")
+                return
+            conditional = self._conditional_headers(relative_path, local_path)
+        elif self.store:
+            stored = self._stored_copy(file_url, size)
+            conditional = self._stored_conditional(stored)
+        
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        
+        if not resumed:
+            self.listener.on_file_started(relative_path)
+        
+        if not conditional and self._wants_segments(relative_path, size):
+            file_size = self._download_segmented(file_url, relative_path, part_path, resumed)
+            if self.cancel_requested:
+                return
+            if file_size is not None:
+                self._finish_part(relative_path, part_path, save_path)
+                self._record_completed(file_url, relative_path, file_size, started_at, 206)
+                return
+            # The server ignores Range; stream the file over one connection
+        
+        offset = downloaded = self._resume_offset(relative_path, part_path, count=not resumed)
+        self._counted_parts.add(relative_path)
+        file_size = 0
+        http_status = None
+        started = resumed
+        while True:
+            headers = self._range_headers(relative_path, offset, url=file_url) or conditional
+            with self.http.get(file_url, stream=True, headers=headers) as r:
+                http_status = r.status_code
+                if r.status_code == 304:
+                    if not stored:
+                        self._record_skipped(file_url, local_size, "UNCHANGED")
+                        return
+                    if self._use_stored(file_url, relative_path, save_path, *stored):
+                        return
+                    conditional, stored = {}, None  # The stored copy is gone; download it after all
+                    continue
+                if self._range_complete(relative_path, r.status_code, offset):
+                    file_size = offset
+                    break
+                r.raise_for_status()
+                if not offset and self._use_stored_match(file_url, relative_path, save_path, r.status_code, r.headers):
+                    return  # Closing drops the unread body
+                start = self._accept_range(file_url, relative_path, r.status_code, r.headers, offset)
+                if start != offset:
+                    # The server sent the whole file; discard what was on disk
+                    self._count_existing_bytes(start - downloaded)
+                    offset = downloaded = start
+                file_size = offset + int(r.headers.get('content-length', 0))
+                
+                # Log download start
+                if not started:
+                    self.log_download(file_url, "STARTED", file_size, http_status=http_status)
+                    started = True
+                
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    target = self._unpacking(save_path, offset, self._hashing(relative_path, part_path, f, offset))
+                    written, finished = self._stream_body(r, target)
+                downloaded += written
+                if self.cancel_requested:
+                    self.log_download(file_url, "CANCELLED", downloaded)
+                    return
+            
+            if finished:
+                break
+            
+            self._wait_while_paused()
+            offset = downloaded
+            if self.cancel_requested:
+                self.log_download(file_url, "CANCELLED", downloaded)
+                return
+        
+        self._finish_part(relative_path, part_path, save_path)
+        self._record_completed(file_url, relative_path, file_size, started_at, http_status)
+    
+    def _with_retries(self, url, fetch, *args):
+        """Call fetch(*args), retrying transient failures per the retry policy."""
+        attempt = 0
+        while True:
+            try:
+                self._wait_for_host(url)
+                return fetch(*args)
+            except Exception as e:
+                attempt += 1
+                if not self._retry_wait(url, e, attempt):
+                    raise
+    
+    def _fail_over(self, url, error, avoid):
+        """Note a failed attempt against url's mirror and return True if another mirror should take over.
+        
+        avoid collects the mirrors that failed since the last backoff;
+        switching to one not in it happens at once, without using a retry.
+        """
+        self.mirrors.record_failure(url)
+        avoid.add(self.mirrors.base_of(url))
+        if self.cancel_requested or not self.mirrors.untried(avoid):
+            return False
+        self.metrics.add('failovers', host=urlparse(url).netloc)
+        self.log_download(url, f"FAILOVER: {str(error)}", 0, http_status=self.retry_policy.status_of(error))
+        return True
+    
+    def _retry_wait(self, url, error, attempt):
+        """Wait out the backoff before retry number attempt; return False if error is final."""
+        delay = self._retry_delay(url, error, attempt)
+        if delay is None:
+            return False
+        self._sleep(delay)
+        return not self.cancel_requested
+    
+    def _retry_delay(self, url, error, attempt, errors=RETRYABLE_ERRORS):
+        """Return the backoff before retry number attempt and log it, or None if error is final.
+        
+        errors are the exception types worth retrying besides HTTP errors.
+        """
+        policy = self.retry_policy
+        if self.cancel_requested or attempt > policy.retries or not policy.retryable(error, errors):
+            return None
+        delay = policy.backoff(attempt, policy.retry_after(error))
+        self.metrics.add('retries', host=urlparse(url).netloc)
+        self.log_download(url, f"RETRY {attempt}/{policy.retries} in {delay:.1f}s: {str(error)}", 0,
+                          http_status=policy.status_of(error), retries=attempt)
+        return delay
+    
+    def _wait_for_host(self, url):
+        """Hold new work against a host whose circuit is open, until it may be probed again."""
+        delay = self.breaker.delay(url)
+        self._report_open_circuit(url, delay)
+        while delay > 0 and not self.cancel_requested:
+            self._sleep(min(delay, 1.0))
+            delay = self.breaker.delay(url)
+    
+    def _report_open_circuit(self, url, delay):
+        if delay > 1:
+            self.update_status(f"{urlparse(url).netloc} keeps failing, waiting {delay:.0f}s before trying it again")
+    
+    def _sleep(self, delay):
+        """Sleep, waking early if the job is cancelled."""
+        deadline = time.monotonic() + delay
+        while delay > 0 and not self.cancel_requested:
+            time.sleep(min(delay, 0.1))
+            delay = deadline - time.monotonic()
+    
+    def _stream_body(self, r, f, limit=None):
+        """Copy a response body to f through this thread's reusable buffer.
+        
+        Stops early, after at most one buffer, on pause or cancel. Returns
+        (bytes written, whether the body was fully read).
+        """
+        sizer = ChunkSizer()
+        readinto, body_done = body_reader(r)
+        written = 0
+        body_began = self.metrics.start('body')
+        try:
+            while limit is None or written < limit:
+                want = sizer.size if limit is None else min(sizer.size, limit - written)
+                # Keep reads small under a byte limit so no single read runs far ahead of it
+                cap = self.limiter.read_size()
+                if cap:
+                    want = min(want, cap)
+                buffer = self._read_buffer(want)
+                began = time.monotonic()
+                try:
+                    n = readinto(buffer[:want])
+                except (TimeoutError, ConnectionError):
+                    self.concurrency.observe_failure(r.url)
+                    self.breaker.record_failure(r.url)
+                    raise
+                if not n:
+                    # http.client reports a connection closed early as a normal EOF
+                    expected = r.headers.get('content-length')
+                    if expected and 'content-encoding' not in r.headers and written < int(expected):
+                        self.breaker.record_failure(r.url)
+                        raise ConnectionError(f"Connection closed after {written} of {expected} bytes")
+                    break
+                wrote = time.monotonic()
+                f.write(buffer[:n])
+                written += n
+                self._record_chunk(r.url, n, time.monotonic() - wrote)
+                self.concurrency.observe_bytes(r.url, n)
+                # Time spent throttled counts too, so buffers stay small under a tight limit
+                self._throttle(self.limiter.bytes_delay(r.url, n))
+                sizer.update(n, time.monotonic() - began)
+                
+                # Check for pause/cancel once per buffer
+                if self.cancel_requested or not self.pause_event.is_set():
+                    return written, False  # Release the connection while paused
+            body_done()
+            return written, True
+        finally:
+            self.mirrors.record_transfer(r.url, written, time.monotonic() - body_began)
+            self.metrics.finish('body', body_began)
+    
+    def _wait_while_paused(self):
+        """Block a transfer while the job is paused, lending its download slot to other jobs meanwhile."""
+        if self.pause_event.is_set():
+            return
+        if self.budget is None:
+            self.pause_event.wait()
+            return
+        self.budget.release(self)
+        self.pause_event.wait()
+        if not self.budget.acquire(self, abandon=lambda: self.cancel_requested):
+            self.budget.overdraw(self)  # Cancelled; hold one just long enough to wind down
+    
+    def _throttle(self, delay):
+        """Sleep for a limiter delay, waking early on cancel or when the limits change."""
+        deadline = time.monotonic() + delay
+        generation = self.limiter.generation
+        while delay > 0 and not self.cancel_requested and self.limiter.generation == generation:
+            time.sleep(min(delay, 0.1))
+            delay = deadline - time.monotonic()
+    
+    def _wants_segments(self, relative_path, size):
+        """Return True if a file should be fetched as byte ranges over several connections."""
+        entry = self.journal.get(relative_path)
+        if entry:
+            return bool(entry.get('segments'))  # Resume the way it was started
+        return self.max_segments > 1 and (size or 0) >= self.segment_threshold
+    
+    def _download_segmented(self, file_url, relative_path, part_path, resumed=False):
+        """Fetch a large file as byte ranges written straight into a preallocated .part file.
+        
+        Returns the file size once every segment is on disk, or None if the
+        server doesn't honour Range (or the file turned out to be small), in
+        which case the caller streams it instead. Each segment's progress is
+        journaled, so an interrupted download resumes every piece where it
+        stopped. resumed means an earlier attempt of this job already counted
+        the pieces on disk.
+        """
+        entry = self.journal.get(relative_path) or {}
+        segments = [list(segment) for segment in entry.get('segments', [])]
+        if segments and entry.get('size') and os.path.exists(part_path):
+            total = entry['size']
+            if not resumed:
+                self._count_existing_bytes(sum(done for _, _, done in segments))
+        else:
+            probe = self._probe_ranges(file_url)
+            if probe is None or probe[0] < self.segment_threshold:
+                return None
+            total, headers = probe
+            segment_size = -(-total // self.max_segments)
+            segments = [[start, min(start + segment_size, total) - 1, 0]
+                        for start in range(0, total, segment_size)]
+            with open(part_path, 'wb') as f:
+                try:
+                    os.posix_fallocate(f.fileno(), 0, total)
+                except (AttributeError, OSError):
+                    f.truncate(total)  # No fallocate here; a sparse file will do
+            self.journal.update(
+                relative_path,
+                url=file_url,
+                etag=headers.get('etag'),
+                last_modified=headers.get('last-modified'),
+                size=total,
+                segments=segments
+            )
+        self._counted_parts.add(relative_path)
+        
+        if not resumed:
+            self.log_download(file_url, "STARTED", total, http_status=206)
+        pending = Queue()
+        for index, (start, end, done) in enumerate(segments):
+            if start + done <= end:
+                pending.put(index)
+        errors = []
+        args = (file_url, relative_path, part_path, segments, pending, errors)
+        
+        # This worker takes segments too; helpers only run while extra connections are free
+        helpers = []
+        for _ in range(pending.qsize() - 1):
+            if not self.segment_slots.acquire(blocking=False):
+                break
+            if self.budget and not self.budget.try_acquire(self):
+                self.segment_slots.release()
+                break  # Other jobs are owed the free download slots
+            if not self.concurrency.try_acquire(file_url):
+                self.segment_slots.release()
+                if self.budget:
+                    self.budget.release(self)
+                break  # The host is at its concurrency limit
+            helper = Thread(target=self._segment_helper, args=args, daemon=True)
+            helper.start()
+            helpers.append(helper)
+        self._segment_runner(*args)
+        for helper in helpers:
+            helper.join()
+        
+        if errors:
+            if isinstance(errors[0], RemoteFileChanged):
+                self._count_existing_bytes(-sum(done for _, _, done in segments))  # Starting over
+            raise errors[0]
+        if self.cancel_requested:
+            self.log_download(file_url, "CANCELLED", sum(done for _, _, done in segments))
+            return None
+        return total
+    
+    def _probe_ranges(self, file_url):
+        """Ask for one byte to learn whether the server honours Range and how big the file is.
+        
+        Returns (size, response headers), or None if Range was ignored.
+        """
+        with self.http.get(file_url, stream=True, headers={'Range': 'bytes=0-0'}) as r:
+            if r.status_code == 416:
+                return None  # Empty file
+            r.raise_for_status()
+            match = CONTENT_RANGE_RE.match(r.headers.get('content-range', ''))
+            if r.status_code != 206 or not match or match.group(3) == '*':
+                return None  # Closing drops the unread body
+            r.content  # One byte; read it so the connection can be reused
+            return int(match.group(3)), r.headers
+    
+    def _segment_helper(self, *args):
+        """Run segments on an extra connection, then give the connection slots back."""
+        try:
+            self._segment_runner(*args)
+        finally:
+            self.concurrency.release(args[0])
+            self.segment_slots.release()
+            if self.budget:
+                self.budget.release(self)
+    
+    def _segment_runner(self, file_url, relative_path, part_path, segments, pending, errors):
+        """Take pending segments until none are left, one fails or the job is cancelled."""
+        with open(part_path, 'r+b') as f:
+            while not errors and not self.cancel_requested:
+                try:
+                    index = pending.get_nowait()
+                except Empty:
+                    return
+                try:
+                    self._fetch_segment(file_url, relative_path, f, segments[index])
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    f.flush()
+                    # Once the file has changed its journal entry is gone; don't bring it back
+                    if not any(isinstance(error, RemoteFileChanged) for error in errors):
+                        self.journal.update(relative_path, segments=[list(segment) for segment in segments])
+    
+    def _fetch_segment(self, file_url, relative_path, f, segment):
+        """Download one [start, end, done] segment, retrying it on its own when it fails.
+        
+        With split_mirrors each attempt goes to the best mirror at the time,
+        so a file's segments spread over the mirrors.
+        """
+        start, end, _ = segment
+        total = (self.journal.get(relative_path) or {}).get('size')
+        failures = 0
+        avoid = set()
+        while start + segment[2] <= end and not self.cancel_requested:
+            self._wait_while_paused()
+            url = self.mirrors.choose(file_url, avoid) if self.split_mirrors else file_url
+            position = start + segment[2]
+            try:
+                self._wait_for_host(url)
+                headers = self._range_headers(relative_path, position, end, url)
+                with self.mirrors.use(url), self.http.get(url, stream=True, headers=headers) as r:
+                    r.raise_for_status()
+                    match = CONTENT_RANGE_RE.match(r.headers.get('content-range', ''))
+                    if (r.status_code != 206 or not match or int(match.group(1)) != position
+                            or total and match.group(3) not in ('*', str(total))):
+                        # If-Range failed or the size differs: the file changed, so the pieces on disk are useless
+                        self.journal.remove(relative_path)
+                        raise RemoteFileChanged(f"{url} changed while it was being downloaded")
+                    f.seek(position)
+                    written, _ = self._stream_body(r, f, end - position + 1)
+                    segment[2] += written
+            except RemoteFileChanged:
+                raise  # The whole file starts over, not this segment
+            except Exception as e:  # Connection, timeout and short-read errors alike
+                if self.split_mirrors and self._fail_over(url, e, avoid):
+                    continue
+                failures += 1
+                avoid.clear()
+                if not self._retry_wait(url, e, failures):
+                    raise
+    
+    def _read_buffer(self, size):
+        """Return this thread's reusable read buffer, growing it to at least size bytes.
+        
+        Buffers only grow as far as the link is fast, so slow downloads keep
+        small ones.
+        """
+        buffer = getattr(self._buffers, 'view', None)
+        if buffer is None or len(buffer) < size:
+            buffer = self._buffers.view = memoryview(bytearray(size))
+        return buffer
+    
+    def _local_copy(self, save_path, size):
+        """Return the file on disk that stands for save_path, and the size to count it as, or (None, 0).
+        
+        That is save_path itself, or, when originals are dropped after
+        unpacking, the unpacked copy of a .bz2, counted as the listed size.
+        """
+        if os.path.exists(save_path):
+            return save_path, os.path.getsize(save_path)
+        if self.decompressor and not self.keep_compressed and DecompressionStage.wants(save_path):
+            target = unpacked_path(save_path)
+            if os.path.exists(target):
+                return target, size if size is not None else os.path.getsize(target)
+        return None, 0
+    
+    def _resume_offset(self, relative_path, part_path, count=True):
+        """Return how many bytes of a journaled .part file can be resumed.
+        
+        They are counted towards progress unless count is False, for retries
+        that resume bytes an earlier attempt already counted. A .part file
+        started in segments is preallocated to its full size, so only its
+        finished leading segments are kept; the rest is cut off and the
+        file continues over one connection.
+        """
+        entry = self.journal.get(relative_path)
+        if not os.path.exists(part_path) or entry is None:
+            return 0
+        offset = os.path.getsize(part_path)
+        if entry.get('segments'):
+            offset = 0
+            for start, end, done in sorted(entry['segments']):
+                if start != offset:
+                    break
+                offset = start + done
+                if start + done <= end:
+                    break  # This segment is unfinished; what follows it is holes
+            with open(part_path, 'r+b') as f:
+                f.truncate(offset)
+            self.journal.update(relative_path, segments=[])
+        if count:
+            self._count_existing_bytes(offset)
+        return offset
+    
+    def _range_headers(self, relative_path, offset, end=None, url=None):
+        """Build Range/If-Range headers to continue a partial file from offset (up to end).
+        
+        If-Range is left out when url is on another mirror than the one the
+        validators came from, since mirrors seldom share ETags; the size check
+        on the response still catches a different file.
+        """
+        if not offset and end is None:
+            return {}
+        headers = {'Range': f"bytes={offset}-{'' if end is None else end}"}
+        entry = self.journal.get(relative_path) or {}
+        if url and entry.get('url') and not self.mirrors.same_source(url, entry['url']):
+            return headers
+        etag = entry.get('etag')
+        if etag and not etag.startswith('W/'):
+            headers['If-Range'] = etag
+        elif entry.get('last_modified'):
+            headers['If-Range'] = entry['last_modified']
+        return headers
+    
+    def _range_complete(self, relative_path, status_code, offset):
+        """Return True if a 416 response means the .part file already holds everything."""
+        if status_code != 416 or not offset:
+            return False
+        entry = self.journal.get(relative_path) or {}
+        return entry.get('size') == offset
+    
+    def _accept_range(self, file_url, relative_path, status_code, headers, offset):
+        """Validate a response and return the offset its body starts at.
+        
+        Returns offset for a matching 206 response and 0 when the server sent
+        the whole file (Range ignored, or If-Range found the file changed).
+        """
+        start = 0
+        total = int(headers.get('content-length', 0))
+        if offset and status_code == 206:
+            match = CONTENT_RANGE_RE.match(headers.get('content-range', ''))
+            if not match or int(match.group(1)) != offset:
+                raise IOError(f"Server returned an unexpected byte range for {file_url}")
+            entry = self.journal.get(relative_path) or {}
+            if match.group(3) != '*':
+                total = int(match.group(3))
+                if entry.get('size') and entry['size'] != total:
+                    self.journal.remove(relative_path)
+                    self._count_existing_bytes(-offset)  # Starting over
+                    raise RemoteFileChanged(f"{file_url} changed size since it was partially downloaded")
+            start = offset
+        self.journal.update(
+            relative_path,
+            url=file_url,
+            etag=headers.get('etag'),
+            last_modified=headers.get('last-modified'),
+            size=total
+        )
+        return start
+    
+    def _finish_part(self, relative_path, part_path, save_path):
+        """Move a completed .part file into place and drop it from the journal.
+        
+        The file's mtime is set to the server's Last-Modified and its
+        validators are kept, so a later sync can tell whether it changed.
+        """
+        if not os.path.exists(part_path):
+            open(part_path, 'wb').close()  # Empty file
+        os.replace(part_path, save_path)
+        entry = self.journal.get(relative_path) or {}
+        remote_mtime = http_date_to_epoch(entry.get('last_modified'))
+        if remote_mtime is not None:
+            os.utime(save_path, (time.time(), remote_mtime))
+        if self.manifest or self.store:
+            self._record_checksums(relative_path, save_path, entry)
+        self.mirror_state.update(relative_path, entry.get('etag'), entry.get('last_modified'))
+        self.journal.remove(relative_path)
+    
+    def _hashing(self, relative_path, part_path, f, offset):
+        """Wrap a .part file opened at offset so its checksums keep up as it streams.
+        
+        Without a manifest or store f is returned as is.
+        """
+        if not self.manifest and not self.store:
+            return f
+        writer = self._hashers.get(relative_path)
+        if writer is None or writer.size != offset:
+            # Bytes this run hasn't hashed, such as a .part file left by an earlier run
+            writer = self._hashers[relative_path] = (
+                HashingWriter.from_file(part_path, offset) if offset else HashingWriter()
+            )
+        return writer.wrap(f)
+    
+    def _unpacking(self, save_path, offset, f):
+        """Wrap a .bz2 file's .part, opened at offset, so the decompression stage unpacks it as it streams."""
+        if not self.decompressor or not DecompressionStage.wants(save_path):
+            return f
+        return self.decompressor.stream(save_path, offset, f)
+    
+    def _unpack(self, relative_path):
+        """Hand a finished .bz2 file to the decompression stage, unless its unpacked copy is current."""
+        path = os.path.join(self.scrape_folder, relative_path)
+        if not self.decompressor or not DecompressionStage.wants(path):
+            return
+        if self.cancel_requested or not os.path.exists(path):
+            self.decompressor.discard(path)
+            return
+        if self.decompressor.unpacked(path):
+            # Fetched again although its unpacked copy is current, such as by a sync
+            self.decompressor.discard(path)
+            if not self.keep_compressed:
+                os.remove(path)
+            return
+        try:
+            self.decompressor.submit(path)
+        except Exception as e:  # The pool could not start, or broke
+            self._unpacked(path, None, e)
+    
+    def _unpacked(self, path, size, error):
+        """Log a file the decompression stage is done with. Called from its threads."""
+        relative_path = os.path.relpath(path, self.scrape_folder).replace(os.sep, '/')
+        if error:
+            with self.stats_lock:
+                self.unpack_failures += 1
+            self.log_download(relative_path, f"ERROR: could not unpack: {str(error)}", 0)
+            self.update_status(f"Error unpacking {relative_path}: {str(error)}")
+        else:
+            self.log_download(relative_path, "UNPACKED", size)
+            if self.manifest:
+                self._record_unpacked(relative_path, path)
+    
+    def _record_unpacked(self, relative_path, path):
+        """Add a .bz2's unpacked copy to the manifest, with the original's origin, and drop the original's entry if it is gone."""
+        original = self.manifest.get(relative_path)
+        try:
+            writer = HashingWriter.from_file(unpacked_path(path))
+        except OSError:
+            return  # Gone already; verify will say so
+        self.manifest.update(
+            unpacked_path(relative_path),
+            **writer.checksums(),
+            etag=original.get('etag'),
+            last_modified=original.get('last_modified'),
+            url=original.get('url')
+        )
+        if not self.keep_compressed:
+            self.manifest.remove(relative_path)
+    
+    def _record_checksums(self, relative_path, save_path, entry):
+        """Add a finished file to the manifest and the object store.
+        
+        Its checksums were taken as it streamed; segmented files, written out
+        of order, are hashed from disk instead.
+        """
+        writer = self._hashers.pop(relative_path, None)
+        if writer is None or writer.size != os.path.getsize(save_path):
+            writer = HashingWriter.from_file(save_path)
+        if self.manifest:
+            self.manifest.update(
+                relative_path,
+                **writer.checksums(),
+                etag=entry.get('etag'),
+                last_modified=entry.get('last_modified'),
+                url=entry.get('url')
+            )
+        if self.store and entry.get('url'):
+            try:
+                self.store.add(save_path, writer.digest.hexdigest(), entry['url'], entry.get('etag'),
+                               entry.get('last_modified'))
+            except (OSError, sqlite3.Error) as e:
+                self.update_status(f"Error adding {relative_path} to the store: {str(e)}")
+    
+    def _complete_manifest(self):
+        """Hash the listed files on disk that the manifest has no current entry for.
+        
+        Those are files this job found already in place, or linked from the
+        store, and unpacked copies standing in for dropped .bz2 files. Run in
+        parallel; hashing lets go of the GIL.
+        """
+        missing = []
+        for entry in self.crawl_manifest:
+            path, _ = self._local_copy(os.path.join(self.scrape_folder, entry.relative_path), entry.size)
+            if path is None or not os.path.isfile(path):
+                continue
+            relative_path = os.path.relpath(path, self.scrape_folder).replace(os.sep, '/')
+            if self.manifest.get(relative_path).get('size') != os.path.getsize(path):
+                missing.append((entry, relative_path, path))
+        if not missing:
+            return
+        self.update_status(f"Hashing {len(missing)} files for the manifest...")
+        
+        def checksum(path):
+            try:
+                return HashingWriter.from_file(path)
+            except OSError:
+                return None  # Gone or unreadable; verify will say so
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            writers = pool.map(checksum, (path for *_, path in missing))
+            for (entry, relative_path, path), writer in zip(missing, writers):
+                if writer is None:
+                    continue
+                validators = self.mirror_state.get(entry.relative_path)
+                self.manifest.update(
+                    relative_path,
+                    **writer.checksums(),
+                    etag=validators.get('etag'),
+                    last_modified=validators.get('last_modified'),
+                    url=entry.url
+                )
+    
+    def _stored_copy(self, file_url, size):
+        """Return the store's (digest, size, etag, last_modified) for file_url, unless the listing shows another size."""
+        stored = self.store.lookup(file_url)
+        if stored and size is not None and size != stored[1]:
+            return None
+        return stored
+    
+    def _stored_conditional(self, stored):
+        """Build If-None-Match/If-Modified-Since headers to revalidate a stored copy."""
+        headers = {}
+        if stored:
+            _, _, etag, last_modified = stored
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+    
+    def _use_stored_match(self, file_url, relative_path, save_path, status_code, headers):
+        """Link the stored object a full response's strong ETag and size point to, instead of reading its body.
+        
+        Returns True if the file was linked.
+        """
+        if not self.store or status_code != 200 or not headers.get('content-length'):
+            return False
+        size = int(headers['content-length'])
+        digest = self.store.find(headers.get('etag'), size)
+        return bool(digest) and self._use_stored(
+            file_url, relative_path, save_path, digest, size, headers.get('etag'), headers.get('last-modified')
+        )
+    
+    def _use_stored(self, file_url, relative_path, save_path, digest, size, etag, last_modified):
+        """Link a file in from the object store instead of downloading it. Returns False if that failed."""
+        if not self.store.materialize(digest, save_path):
+            return False
+        part_path = save_path + PART_SUFFIX
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        self._hashers.pop(relative_path, None)
+        remote_mtime = http_date_to_epoch(last_modified)
+        if remote_mtime is not None:
+            os.utime(save_path, (time.time(), remote_mtime))
+        self.mirror_state.update(relative_path, etag, last_modified)
+        self.journal.remove(relative_path)
+        self._record_skipped(file_url, size, "STORED")
+        return True
+    
+    def _mirror_unchanged(self, relative_path, save_path, size, mtime):
+        """Return True if a local file matches the size and modification time shown in the listing.
+        
+        The time compared is the Last-Modified the server sent when the file
+        was downloaded, or the local file's mtime if it wasn't recorded. An
+        HTML listing shows whole minutes, rounded down, so that time must
+        fall within the listed minute; a listing with seconds (JSON, XML)
+        must match to the second. Listing times are read as UTC, so servers
+        that list local time (Apache's default) never match and each file is
+        revalidated with a conditional request instead.
+        """
+        if size is None or mtime is None:
+            return False
+        stat = os.stat(save_path)
+        if stat.st_size != size:
+            return False
+        modified = http_date_to_epoch(self.mirror_state.get(relative_path).get('last_modified'))
+        if modified is None:
+            modified = stat.st_mtime
+        if mtime % self.mtime_resolution:
+            return abs(modified - mtime) < 1
+        return 0 <= modified - mtime < self.mtime_resolution
+    
+    def _conditional_headers(self, relative_path, save_path):
+        """Build If-None-Match/If-Modified-Since headers to revalidate a local file."""
+        headers = {}
+        validators = self.mirror_state.get(relative_path)
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        headers['If-Modified-Since'] = validators.get('last_modified') or formatdate(
+            os.path.getmtime(save_path), usegmt=True
+        )
+        return headers
+    
+    def _count_existing_bytes(self, size):
+        """Count bytes already on disk towards progress, but not towards transferred_bytes."""
+        with self.stats_lock:
+            self.downloaded_bytes += size
+    
+    def _record_skipped(self, file_url, size, status="SKIPPED"):
+        """Account for a file that is already on disk and doesn't need downloading."""
+        self._count_existing_bytes(size)
+        with self.stats_lock:
+            self.downloaded_files += 1
+        self.metrics.add('files', result="skipped")
+        self.log_download(file_url, status, size)
+    
+    def _record_chunk(self, url, size, write_time):
+        """Account for a chunk from url written to disk in write_time seconds; listeners pick it up on their next snapshot."""
+        with self.stats_lock:
+            self.downloaded_bytes += size
+            self.transferred_bytes += size
+        self.metrics.observe('disk_write', write_time)
+        self.metrics.add('bytes', size, host=urlparse(url).netloc)
+    
+    def _record_completed(self, file_url, relative_path, file_size, started_at, http_status):
+        """Account for a finished file."""
+        with self.stats_lock:
+            self.downloaded_files += 1
+        self.metrics.add('files', result="completed")
+        self.log_download(file_url, "COMPLETED", file_size, time.time() - started_at, http_status,
+                          self.retry_counts.get(relative_path, 0))
+    
+    def _record_failure(self, file_url, relative_path, error, downloaded, started_at=None, http_status=None):
+        """Account for a failed file so it can be retried later."""
+        if self.decompressor:
+            self.decompressor.discard(os.path.join(self.scrape_folder, relative_path))
+        with self.stats_lock:
+            self.failed_files += 1
+            self.failed_downloads.append((file_url, relative_path))
+        self.metrics.add('files', result="failed")
+        # requests and aiohttp both attach the response status to HTTP errors
+        response = getattr(error, 'response', None)
+        http_status = getattr(error, 'status', None) or getattr(response, 'status_code', None) or http_status
+        duration = time.time() - started_at if started_at else None
+        self.log_download(file_url, f"ERROR: {str(error)}", downloaded, duration, http_status,
+                          self.retry_counts.get(relative_path, 0))
+        self.update_status(f"Error downloading {file_url}: {str(error)}")
+    
+    def log_download(self, url, status, filesize, duration=None, http_status=None, retries=0):
+        """Queue a history entry; the HistoryLog writes it in the background."""
+        if self.history is None:
+            return
+        self.history.write(url, status, filesize, duration, http_status, retries)
+        
+        # Also update status if error
+        if "ERROR" in status:
+            self.update_status(f"Error logged: {url}")
+    
+    def update_status(self, text):
+        """Report a status line to the listener."""
+        self.status_text = text
+        self.listener.on_status(text)
+    
+    def _set_phase(self, phase):
+        """Enter a new phase and tell the listener."""
+        self.phase = phase
+        self.listener.on_phase(phase)
+    
+    def snapshot(self):
+        """Return the current counters as an EngineProgress; safe to call from any thread."""
+        with self.stats_lock:
+            return EngineProgress(
+                self.total_files, self.downloaded_files, self.failed_files,
+                self.total_bytes, self.downloaded_bytes, self.transferred_bytes,
+                self.phase, self.status_text,
+                # The controller may be shared with other jobs; count only the hosts this one downloads from
+                self.concurrency.level({urlparse(base).netloc for base in self.mirrors.base_urls}), self.crawling
+            )
@@ -0,0 +1,67 @@
+"""Crawl and download ordering: which directory to list next and which file to fetch next."""
+import itertools
+from collections import deque
+
+
+SCHEDULES = ("discovery", "smallest", "largest")
+CRAWL_ORDERS = ("dfs", "bfs")
+
+
+class DownloadPriority:
+    """Sort keys for files waiting to be downloaded; lower keys go first.
+    
+    schedule orders files by when they were found ("discovery"), smallest
+    first (quick file-count progress) or largest first (keeps the pipe
+    full). priorities is a list of patterns ranked before the schedule:
+    ".bsp" matches an extension, anything else a path prefix such as
+    "maps/". Files matching no pattern come after those that match one.
+    """
+    
+    def __init__(self, schedule="discovery", priorities=()):
+        if schedule not in SCHEDULES:
+            raise ValueError(f"Unknown schedule {schedule!r}, expected one of {', '.join(SCHEDULES)}")
+        self.schedule = schedule
+        self.priorities = [pattern.strip().lower() for pattern in priorities if pattern.strip()]
+        self.sequence = itertools.count()
+    
+    def rank(self, relative_path):
+        """Return the index of the first priority pattern relative_path matches."""
+        path = relative_path.lower()
+        for index, pattern in enumerate(self.priorities):
+            if path.endswith(pattern) if pattern.startswith('.') else path.startswith(pattern.lstrip('/')):
+                return index
+        return len(self.priorities)
+    
+    def key(self, entry):
+        """Return the sort key for a ManifestEntry; ties keep discovery order."""
+        size = entry.size or 0
+        order = {"discovery": 0, "smallest": size, "largest": -size}[self.schedule]
+        return (self.rank(entry.relative_path), order, next(self.sequence))
+
+
+class CrawlFrontier:
+    """Directories waiting to be listed, taken breadth-first or depth-first.
+    
+    Depth-first pops the most recently pushed directory, pushing each
+    listing's subdirectories so they come out in listing order.
+    """
+    
+    def __init__(self, order="dfs"):
+        if order not in CRAWL_ORDERS:
+            raise ValueError(f"Unknown crawl order {order!r}, expected one of {', '.join(CRAWL_ORDERS)}")
+        self.order = order
+        self.pending = deque()
+    
+    def __len__(self):
+        return len(self.pending)
+    
+    def push(self, urls, depth):
+        """Queue directory URLs found at depth."""
+        if self.order == "dfs":
+            self.pending.extend((url, depth) for url in reversed(urls))
+        else:
+            self.pending.extend((url, depth) for url in urls)
+    
+    def pop(self):
+        """Return the next (url, depth) to list."""
+        return self.pending.pop() if self.order == "dfs" else self.pending.popleft()
@@ -0,0 +1,301 @@
+"""Queue of download jobs that run side by side within one shared worker budget."""
+import json
+import os
+import time
+from threading import Thread, Lock, Condition
+
+from .engine import DownloadEngine, new_scrape_folder
+from .metrics import Metrics
+from .net import WorkerBudget, ConcurrencyController, RateLimiter
+from .storage import HistoryLog
+
+
+JOB_STATES = ("queued", "running", "paused", "complete", "incomplete", "cancelled", "error")
+FINISHED_STATES = ("complete", "incomplete", "cancelled", "error")
+
+
+class Job:
+    """One base URL to crawl into a folder, with its own DownloadEngine options.
+    
+    options are DownloadEngine keyword arguments such as max_depth,
+    file_types or mirrors, and must be JSON serializable so the queue can be
+    saved. engine is the job's DownloadEngine once it has been started.
+    """
+    
+    def __init__(self, job_id, url, output_dir, options=None, state="queued", added=None):
+        self.id = job_id
+        self.url = url
+        self.output_dir = output_dir
+        self.options = dict(options or {})
+        self.state = state
+        self.added = added or time.time()
+        self.engine = None
+    
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+    
+    def snapshot(self):
+        """Return the engine's EngineProgress, or None if the job hasn't started this session."""
+        return self.engine.snapshot() if self.engine else None
+    
+    def to_dict(self):
+        return {'id': self.id, 'url': self.url, 'output_dir': self.output_dir,
+                'options': self.options, 'state': self.state, 'added': self.added}
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['url'], data['output_dir'], data.get('options'),
+                   data.get('state', "queued"), data.get('added'))
+
+
+class JobQueue:
+    """Download jobs run side by side and saved to a JSON file between sessions.
+    
+    Up to max_running jobs run at once, oldest first. They share a
+    WorkerBudget of workers download slots, handed out fairly between them,
+    one ConcurrencyController and one RateLimiter, so jobs on the same host
+    share its connection and rate limits, one history log and one Metrics.
+    A job's limits, per_host_connections and adaptive_concurrency options
+    are applied to the shared ones when it starts, so the newest job's
+    values win. Each job pauses and cancels on its own; a
+    paused job gives up its running place and its slots to the others.
+    Jobs still running when the queue stops are queued again, and pick up
+    from their journals and .part files on the next start().
+    on_change(job) is called from the queue's threads whenever a job's
+    state changes.
+    """
+    
+    FILENAME = "aeropull_jobs.json"
+    
+    def __init__(self, path=FILENAME, workers=16, max_running=4, history_file="download_history.log",
+                 history_format="text", on_change=None):
+        self.path = path
+        self.budget = WorkerBudget(workers)
+        self.controller = ConcurrencyController(initial=4, maximum=workers)
+        self.limiter = RateLimiter()
+        self.metrics = Metrics()
+        self.metrics.add_gauge_source('queue', self._gauges)
+        self.max_running = max(1, max_running)
+        self.history_file = history_file
+        self.history_format = history_format
+        self.history = None
+        self.on_change = on_change or (lambda job: None)
+        self.jobs = []
+        self.lock = Lock()
+        self.idle = Condition(self.lock)  # Notified whenever a job finishes
+        self.started = False
+        self.stopping = False
+        self._threads = {}  # job id -> Thread running its engine
+        self._load()
+    
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for item in data.get('jobs', []):
+            try:
+                job = Job.from_dict(item)
+            except (KeyError, TypeError):
+                continue
+            if job.state == "running":
+                job.state = "queued"  # Interrupted last session; resumes where it stopped
+            self.jobs.append(job)
+    
+    def save(self):
+        """Atomically write the queue to disk."""
+        with self.lock:
+            data = {'jobs': [job.to_dict() for job in self.jobs]}
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(data, f, indent=1)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass  # The queue still runs; it just won't survive a restart
+    
+    def get(self, job_id):
+        """Return the job with job_id, or None."""
+        with self.lock:
+            return next((job for job in self.jobs if job.id == job_id), None)
+    
+    def add(self, url, output_dir=None, parent=".", **options):
+        """Queue a job and return it; without output_dir it gets a new SCRAPE folder under parent."""
+        with self.lock:
+            job = Job(
+                max((job.id for job in self.jobs), default=0) + 1,
+                url if url.endswith('/') else url + '/',
+                output_dir or self._new_folder(parent),
+                options
+            )
+            self.jobs.append(job)
+        self._changed(job)
+        return job
+    
+    def _new_folder(self, parent):
+        """Return a new SCRAPE folder path no other job or existing folder uses."""
+        folder = base = new_scrape_folder(parent)
+        taken = {os.path.abspath(job.output_dir) for job in self.jobs}
+        count = 2
+        while os.path.abspath(folder) in taken or os.path.exists(folder):
+            folder = f"{base}_{count}"
+            count += 1
+        return folder
+    
+    def remove(self, job):
+        """Drop a job that isn't running; returns False if it is."""
+        with self.lock:
+            if job.id in self._threads:
+                return False
+            self.jobs.remove(job)
+        self.save()
+        return True
+    
+    def pause(self, job):
+        """Pause a running job, or hold a queued one back."""
+        with self.lock:
+            if job.state == "running":
+                job.engine.pause()
+            elif job.state != "queued":
+                return
+            job.state = "paused"
+        self._changed(job)
+    
+    def resume(self, job):
+        """Resume a paused job, or queue a held, cancelled or incomplete one to run again."""
+        with self.lock:
+            if job.state == "paused" and job.id in self._threads:
+                job.engine.resume()
+                job.state = "running"
+            elif job.state in ("paused", "cancelled", "incomplete", "error"):
+                job.state = "queued"
+            else:
+                return
+        self._changed(job)
+    
+    def cancel(self, job):
+        """Cancel a job; a running one keeps its partial files so it can be resumed."""
+        with self.lock:
+            if job.id in self._threads:
+                job.engine.cancel()  # Its state follows when the engine returns
+                return
+            if job.finished:
+                return
+            job.state = "cancelled"
+        self._changed(job)
+    
+    def _gauges(self):
+        """Return the shared slots in use and the jobs in each state, as Metrics gauge tuples."""
+        with self.lock:
+            states = [job.state for job in self.jobs]
+        return ([('worker_slots', {}, self.budget.total), ('worker_slots_in_use', {}, self.budget.in_use)]
+                + [('jobs', {'state': state}, states.count(state)) for state in JOB_STATES])
+    
+    def set_workers(self, workers):
+        """Change the shared number of download slots, also while jobs run."""
+        self.budget.set_total(workers)
+    
+    def set_limits(self, **limits):
+        """Change the shared bandwidth or request-rate limits, also while jobs run."""
+        self.limiter.set_limits(**limits)
+    
+    def _share_options(self, options):
+        """Apply a starting job's limits and per-host concurrency to the ones every job shares."""
+        self.limiter.set_limits(**(options.get('limits') or {}))
+        self.controller.configure(initial=options.get('per_host_connections'),
+                                  adaptive=options.get('adaptive_concurrency'))
+    
+    def start(self):
+        """Start running queued jobs, and keep starting them as they are added."""
+        with self.lock:
+            self.started = True
+            self.stopping = False
+            if self.history is None and self.history_file:
+                self.history = HistoryLog(self.history_file, self.history_format)
+        self._schedule()
+    
+    def stop(self):
+        """Cancel the running jobs, queue them to run again next time and wait for them to stop."""
+        with self.lock:
+            self.started = False
+            self.stopping = True
+            threads = list(self._threads.values())
+            for job in self.jobs:
+                if job.id in self._threads:
+                    job.engine.cancel()
+        for thread in threads:
+            thread.join()
+        with self.lock:
+            self.stopping = False
+            history, self.history = self.history, None
+        if history:
+            history.close()
+        self.save()
+    
+    def wait(self):
+        """Block until no job is queued or running."""
+        with self.idle:
+            while self._threads or any(job.state == "queued" for job in self.jobs):
+                self.idle.wait()
+    
+    def _changed(self, job):
+        self.save()
+        self.on_change(job)
+        self._schedule()
+    
+    def _schedule(self):
+        """Start queued jobs while fewer than max_running are running."""
+        started = []
+        with self.lock:
+            if not self.started:
+                return
+            running = sum(1 for job in self.jobs if job.state == "running")
+            for job in self.jobs:
+                if running >= self.max_running:
+                    break
+                if job.state != "queued" or job.id in self._threads:
+                    continue
+                try:
+                    job.engine = DownloadEngine(
+                        job.url, job.output_dir,
+                        budget=self.budget,
+                        controller=self.controller,
+                        limiter=self.limiter,
+                        history=self.history,
+                        metrics=self.metrics,
+                        **job.options
+                    )
+                except (TypeError, ValueError):
+                    job.state = "error"  # Options this version doesn't understand
+                    started.append(job)
+                    continue
+                try:
+                    self._share_options(job.options)
+                except TypeError:
+                    job.state = "error"  # Limits this version doesn't understand
+                    started.append(job)
+                    continue
+                job.state = "running"
+                thread = Thread(target=self._run, args=(job,), name=f"AeroPull-job-{job.id}", daemon=True)
+                self._threads[job.id] = thread
+                thread.start()
+                started.append(job)
+                running += 1
+        for job in started:
+            self.save()
+            self.on_change(job)
+    
+    def _run(self, job):
+        """Run a job's engine and record how it ended."""
+        result = job.engine.run()
+        with self.lock:
+            if self.stopping and result == "cancelled":
+                job.state = "paused" if job.state == "paused" else "queued"  # Picked up again next time
+            else:
+                job.state = result
+        self._changed(job)
+        with self.lock:
+            del self._threads[job.id]
+            self.idle.notify_all()
@@ -0,0 +1,289 @@
+"""Directory listing parsers for Apache, nginx and lighttpd autoindex pages."""
+import calendar
+import hashlib
+import html
+import json
+import re
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import namedtuple
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from urllib.parse import quote
+
+
+# A file discovered while crawling: absolute URL, path relative to the base URL,
+# size in bytes and modification time (epoch seconds, or None if unknown)
+ManifestEntry = namedtuple('ManifestEntry', ['url', 'relative_path', 'size', 'mtime'])
+
+# One row of a directory listing; size and mtime are None when the listing doesn't show them
+ListingEntry = namedtuple('ListingEntry', ['href', 'size', 'mtime'])
+
+LISTING_DATE_RE = re.compile(
+    r'(\d{1,2}-[A-Za-z]{3}-\d{4} \d{2}:\d{2}(?::\d{2})?'   # nginx / Apache: 01-Jan-2024 12:00
+    r'|\d{4}-[A-Za-z]{3}-\d{1,2} \d{2}:\d{2}(?::\d{2})?'   # lighttpd: 2024-Jan-01 12:00:00
+    r'|\d{4}-\d{2}-\d{2} \d{2}:\d{2}(?::\d{2})?)'         # Apache ISO: 2024-01-01 12:00
+)
+LISTING_DATE_FORMATS = (
+    '%d-%b-%Y %H:%M', '%d-%b-%Y %H:%M:%S',
+    '%Y-%b-%d %H:%M', '%Y-%b-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S',
+)
+LISTING_SIZE_RE = re.compile(r'^(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?$', re.IGNORECASE)
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_listing_size(text):
+    """Parse an autoindex size column ("123456", "1.2K", "3M") into bytes."""
+    match = LISTING_SIZE_RE.match(text.strip())
+    if not match:
+        return None
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+@lru_cache(maxsize=4096)
+def parse_listing_mtime(text):
+    """Parse an autoindex date column into epoch seconds."""
+    for fmt in LISTING_DATE_FORMATS:
+        try:
+            return calendar.timegm(time.strptime(text, fmt))
+        except ValueError:
+            continue
+    return None
+
+
+def parse_listing_columns(text):
+    """Extract (size, mtime) from the text that follows a link in an autoindex row."""
+    mtime = None
+    match = LISTING_DATE_RE.search(text)
+    if match:
+        mtime = parse_listing_mtime(match.group(1))
+        text = text[:match.start()] + ' ' + text[match.end():]
+    size = None
+    for token in text.split():
+        size = parse_listing_size(token)
+        if size is not None:
+            break
+    return size, mtime
+
+
+def parse_json_listing(text):
+    """Parse an nginx ``autoindex_format json`` listing."""
+    entries = []
+    for item in json.loads(text):
+        name = item.get('name')
+        if not name:
+            continue
+        mtime = None
+        if item.get('mtime'):
+            try:
+                mtime = int(parsedate_to_datetime(item['mtime']).timestamp())
+            except (TypeError, ValueError):
+                pass
+        if item.get('type') == 'directory':
+            entries.append(ListingEntry(quote(name) + '/', None, mtime))
+        else:
+            entries.append(ListingEntry(quote(name), item.get('size'), mtime))
+    return entries
+
+
+def parse_xml_listing(text):
+    """Parse an nginx ``autoindex_format xml`` listing."""
+    entries = []
+    for node in ElementTree.fromstring(text):
+        name = (node.text or '').strip()
+        if not name:
+            continue
+        mtime = None
+        if node.get('mtime'):
+            try:
+                mtime = datetime.strptime(node.get('mtime'), '%Y-%m-%dT%H:%M:%SZ')
+                mtime = calendar.timegm(mtime.timetuple())
+            except ValueError:
+                pass
+        if node.tag == 'directory':
+            entries.append(ListingEntry(quote(name) + '/', None, mtime))
+        elif node.tag == 'file':
+            size = node.get('size')
+            entries.append(ListingEntry(quote(name), int(size) if size else None, mtime))
+    return entries
+
+
+def parse_html_listing(text):
+    """Parse an Apache, nginx or lighttpd HTML autoindex page."""
+    from bs4 import BeautifulSoup  # Only the fallback path needs it; keeps startup light
+    
+    entries = []
+    soup = BeautifulSoup(text, 'html.parser')
+    for link in soup.find_all('a'):
+        href = link.get('href')
+        if not href:
+            continue
+        if link.parent is not None and link.parent.name == 'td':
+            # Table layouts (Apache FancyIndexing, lighttpd): the remaining cells in the row
+            columns = ' '.join(cell.get_text(' ') for cell in link.parent.find_next_siblings('td'))
+        else:
+            # Preformatted layouts (nginx, plain Apache): the text up to the end of the line
+            following = link.next_sibling
+            columns = str(following).split('\n', 1)[0] if isinstance(following, str) else ''
+        size, mtime = parse_listing_columns(columns)
+        entries.append(ListingEntry(href, None if href.endswith('/') else size, mtime))
+    return entries
+
+
+def parse_listing(text, content_type=''):
+    """Parse a complete directory listing (str or bytes) into ListingEntry tuples."""
+    parser = StreamingListingParser(content_type)
+    parser.feed(text.encode('utf-8') if isinstance(text, str) else text)
+    return parser.close()
+
+
+class StreamingListingParser:
+    """Incremental directory listing parser that works on raw response bytes.
+    
+    HTML autoindex pages are scanned line by line with byte regexes as chunks
+    arrive, without decoding the whole body or building a DOM. JSON and XML
+    listings are buffered and parsed at the end. Pages the scanner can't make
+    sense of fall back to BeautifulSoup.
+    """
+    
+    ANCHOR_RE = re.compile(
+        rb'<a\s[^>]*?href\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))[^>]*>.*?</a\s*>',
+        re.IGNORECASE | re.DOTALL
+    )
+    ANCHOR_OPEN_RE = re.compile(rb'<a\s', re.IGNORECASE)
+    TAG_RE = re.compile(rb'<[^>]*>')
+    
+    def __init__(self, content_type=''):
+        self.content_type = (content_type or '').lower()
+        self.format = None  # "html", "json" or "xml", detected from the first bytes
+        self.entries = []
+        self._pending = b''
+        self._chunks = []  # Whole body, kept for JSON/XML and the BeautifulSoup fallback
+    
+    def feed(self, data):
+        """Consume the next chunk of the response body."""
+        if not data:
+            return
+        self._chunks.append(data)
+        if self.format is None:
+            self._detect_format(data)
+        if self.format != "html":
+            return
+        
+        buffer = self._pending + data
+        cut = buffer.rfind(b'\n') + 1
+        if not cut:
+            self._pending = buffer
+            return
+        # Don't split an anchor whose closing tag hasn't arrived yet
+        last_open = None
+        for last_open in self.ANCHOR_OPEN_RE.finditer(buffer, 0, cut):
+            pass
+        if last_open and buffer.find(b'</a', last_open.end(), cut) == -1 and buffer.find(b'</A', last_open.end(), cut) == -1:
+            cut = buffer.rfind(b'\n', 0, last_open.start()) + 1
+        self._parse_lines(buffer[:cut])
+        self._pending = buffer[cut:]
+    
+    def close(self):
+        """Finish parsing and return every ListingEntry found."""
+        body = None
+        try:
+            if self.format == "json":
+                return parse_json_listing(b''.join(self._chunks).decode('utf-8', 'replace'))
+            if self.format == "xml":
+                return parse_xml_listing(b''.join(self._chunks))
+        except (ValueError, ElementTree.ParseError, AttributeError):
+            body = b''.join(self._chunks)
+            self._parse_lines(body)  # Fall back to treating it as HTML
+        else:
+            self._parse_lines(self._pending)
+            self._pending = b''
+        
+        if not self.entries:
+            # Odd markup the byte scanner couldn't handle; let BeautifulSoup try
+            body = body if body is not None else b''.join(self._chunks)
+            if self.ANCHOR_OPEN_RE.search(body):
+                return parse_html_listing(body.decode('utf-8', 'replace'))
+        return self.entries
+    
+    def _detect_format(self, data):
+        """Pick a format from the content type or the first bytes of the body."""
+        head = data.lstrip()[:64]
+        if 'json' in self.content_type or head.startswith(b'['):
+            self.format = "json"
+        elif 'xml' in self.content_type or head.startswith(b'<?xml') or head.startswith(b'<list'):
+            self.format = "xml"
+        elif head:
+            self.format = "html"
+    
+    def _parse_lines(self, region):
+        """Extract (href, size, mtime) from every anchor in a run of complete lines."""
+        matches = list(self.ANCHOR_RE.finditer(region))
+        for i, match in enumerate(matches):
+            href = match.group(1) or match.group(2) or match.group(3) or b''
+            # A row's columns run to the end of its line or the next link on it
+            end = region.find(b'\n', match.end())
+            if end == -1:
+                end = len(region)
+            if i + 1 < len(matches) and matches[i + 1].start() < end:
+                following = matches[i + 1]
+                if (following.group(1) or following.group(2) or following.group(3)) == href:
+                    continue  # Icon link followed by the name link for the same entry
+                end = following.start()
+            href = html.unescape(href.decode('utf-8', 'replace'))
+            if not href:
+                continue
+            columns = html.unescape(self.TAG_RE.sub(b' ', region[match.end():end]).decode('latin-1'))
+            size, mtime = parse_listing_columns(columns.replace('\xa0', ' '))
+            self.entries.append(ListingEntry(href, None if href.endswith('/') else size, mtime))
+
+
+class ListingReader:
+    """Digest and parse one listing response as it streams in, consulting the crawl index.
+    
+    A 304, or a body whose digest matches the indexed one, returns the stored
+    entries. When a digest is on record the body is buffered until it can be
+    compared, so an unchanged listing is never parsed.
+    """
+    
+    def __init__(self, index, url, status_code, headers):
+        self.index = index
+        self.url = url
+        self.status_code = status_code
+        self.etag = headers.get('etag')
+        self.last_modified = headers.get('last-modified')
+        self.parser = StreamingListingParser(headers.get('content-type'))
+        self.digest = hashlib.sha1()
+        stored = index.validators(url) if index else None
+        self.stored_digest = stored[2] if stored else None
+        self._buffered = []
+    
+    def feed(self, chunk):
+        """Consume the next chunk of the response body."""
+        self.digest.update(chunk)
+        if self.stored_digest:
+            self._buffered.append(chunk)
+        else:
+            self.parser.feed(chunk)
+    
+    def finish(self):
+        """Return the listing's ListingEntry rows."""
+        index = self.index
+        if index and self.status_code == 304:
+            index.touch(self.url, self.etag, self.last_modified)
+            return index.entries(self.url)
+        
+        digest = self.digest.hexdigest()
+        if self.stored_digest:
+            if self.stored_digest == digest:
+                index.touch(self.url, self.etag, self.last_modified)
+                return index.entries(self.url)
+            for chunk in self._buffered:
+                self.parser.feed(chunk)
+        
+        listing = self.parser.close()
+        if index:
+            index.store(self.url, self.etag, self.last_modified, digest, listing)
+        return listing
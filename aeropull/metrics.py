@@ -0,0 +1,292 @@
+"""Counters and per-phase latency histograms, served in Prometheus text format or written as JSON snapshots."""
+import http.server
+import json
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Thread, Lock, Event
+
+
+# Phases timed by the engines; see Metrics
+PHASES = ("listing_fetch", "listing_parse", "head", "ttfb", "body", "disk_write", "file")
+
+# Help text for the counters the engines keep, as exposed to Prometheus
+COUNTERS = {
+    'bytes': "Response body bytes received, per host.",
+    'requests': "Requests that got a response, per host and status; status \"error\" for network errors.",
+    'retries': "Requests retried after a transient failure, per host.",
+    'failovers': "Files moved to another mirror after a failure, per host that failed.",
+    'files': "Files finished, by result: completed, skipped or failed.",
+    'listing_failures': "Directory listings that could not be read.",
+}
+
+
+class Histogram:
+    """Counts of observations per bucket, like a Prometheus histogram.
+    
+    BUCKETS are upper bounds in seconds, from a fast disk write to a slow
+    map on a slow server; observations above the last one land in +Inf.
+    """
+    
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+    
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+    
+    def quantile(self, q):
+        """Estimate the q quantile by interpolating within its bucket, or None with no observations."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]  # Somewhere past the last bound
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Metrics:
+    """Thread-safe counters, gauges and per-phase histograms for one or more jobs.
+    
+    Phases are timed with timed() or start()/finish(), which also keep an
+    in-flight gauge for the phase, or recorded with observe(). Counters take
+    labels such as host. Gauge sources are callables polled on export that
+    return (name, labels, value) tuples, for state other objects already
+    keep, such as requests in flight per host.
+    """
+    
+    def __init__(self):
+        self.lock = Lock()
+        self.started = time.time()
+        self.histograms = {phase: Histogram() for phase in PHASES}
+        self.in_flight = {}  # phase -> runs started and not yet finished, for phases timed with start()
+        self.counters = {}  # (name, sorted label items) -> value
+        self.gauge_sources = {}  # name -> callable
+    
+    def observe(self, phase, seconds):
+        """Record how long one run of a phase took."""
+        with self.lock:
+            self.histograms[phase].observe(seconds)
+    
+    def start(self, phase):
+        """Count a phase as in flight and return the time to pass to finish()."""
+        with self.lock:
+            self.in_flight[phase] = self.in_flight.get(phase, 0) + 1
+        return time.monotonic()
+    
+    def finish(self, phase, began, excluding=0.0):
+        """Record a phase started with start() as done, less excluding seconds spent on something else."""
+        elapsed = time.monotonic() - began - excluding
+        with self.lock:
+            self.in_flight[phase] -= 1
+            self.histograms[phase].observe(elapsed)
+    
+    @contextmanager
+    def timed(self, phase):
+        """Time a with block as one run of phase."""
+        began = self.start(phase)
+        try:
+            yield
+        finally:
+            self.finish(phase, began)
+    
+    def add(self, name, amount=1, **labels):
+        """Add to a counter, e.g. add("bytes", 65536, host="example.com")."""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+    
+    def add_gauge_source(self, name, source):
+        """Poll source() for (name, labels, value) tuples on every export; replaces an earlier source of that name."""
+        with self.lock:
+            self.gauge_sources[name] = source
+    
+    def _gauges(self):
+        with self.lock:
+            sources = list(self.gauge_sources.values())
+        gauges = [('in_flight', {'phase': phase}, count) for phase, count in self._in_flight()]
+        for source in sources:
+            try:
+                gauges.extend(source())
+            except Exception:
+                pass  # A gauge that can't be read is left out, not the whole export
+        return gauges
+    
+    def _in_flight(self):
+        with self.lock:
+            return list(self.in_flight.items())
+    
+    def prometheus(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            histograms = {phase: (list(h.counts), h.count, h.sum) for phase, h in self.histograms.items()}
+            counters = sorted(self.counters.items())
+        
+        lines.append("# HELP aeropull_phase_seconds Time taken by each phase of crawling and downloading.")
+        lines.append("# TYPE aeropull_phase_seconds histogram")
+        for phase, (counts, count, total) in histograms.items():
+            cumulative = 0
+            for bound, bucket_count in zip(Histogram.BUCKETS + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f'aeropull_phase_seconds_bucket{{phase="{phase}",le="{le}"}} {cumulative}')
+            lines.append(f'aeropull_phase_seconds_sum{{phase="{phase}"}} {total}')
+            lines.append(f'aeropull_phase_seconds_count{{phase="{phase}"}} {count}')
+        
+        described = set()
+        for (name, labels), value in counters:
+            if name not in described:
+                described.add(name)
+                if name in COUNTERS:
+                    lines.append(f"# HELP aeropull_{name}_total {COUNTERS[name]}")
+                lines.append(f"# TYPE aeropull_{name}_total counter")
+            lines.append(f"aeropull_{name}_total{_labels(dict(labels))} {value}")
+        
+        described = set()
+        for name, labels, value in self._gauges():
+            if name not in described:
+                described.add(name)
+                lines.append(f"# TYPE aeropull_{name} gauge")
+            lines.append(f"aeropull_{name}{_labels(labels)} {value}")
+        
+        lines.append("# TYPE aeropull_uptime_seconds gauge")
+        lines.append(f"aeropull_uptime_seconds {time.time() - self.started:.3f}")
+        return "\n".join(lines) + "\n"
+    
+    def snapshot(self):
+        """Return every metric as a JSON-serializable dict, with p50/p95/p99 estimates per phase."""
+        with self.lock:
+            phases = {
+                phase: {
+                    'count': h.count,
+                    'sum': round(h.sum, 6),
+                    'mean': round(h.sum / h.count, 6) if h.count else None,
+                    'p50': h.quantile(0.5),
+                    'p95': h.quantile(0.95),
+                    'p99': h.quantile(0.99),
+                    'in_flight': self.in_flight.get(phase),
+                }
+                for phase, h in self.histograms.items()
+            }
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, {})[",".join(f"{k}={v}" for k, v in labels)] = value
+        gauges = {}
+        for name, labels, value in self._gauges():
+            gauges.setdefault(name, {})[",".join(f"{k}={v}" for k, v in sorted(labels.items()))] = value
+        return {
+            'time': time.time(),
+            'uptime': round(time.time() - self.started, 3),
+            'phases': phases,
+            'counters': counters,
+            'gauges': gauges,
+        }
+
+
+def _labels(labels):
+    """Format labels for the Prometheus text format, escaping their values."""
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+class MetricsServer:
+    """Local HTTP endpoint serving /metrics in Prometheus text format and /metrics.json as a snapshot.
+    
+    Binds to localhost by default; the metrics name the servers being
+    downloaded from, so only expose it further on purpose.
+    """
+    
+    def __init__(self, metrics, port=9464, host="127.0.0.1"):
+        self.metrics = metrics
+        
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(handler):
+                path = handler.path.split('?')[0]
+                if path in ("/", "/metrics"):
+                    body = metrics.prometheus().encode()
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(metrics.snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    handler.send_error(404)
+                    return
+                handler.send_response(200)
+                handler.send_header("Content-Type", content_type)
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+            
+            def log_message(handler, *args):
+                pass  # Scrapes every few seconds would drown the console
+        
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = Thread(target=self.server.serve_forever, name="AeroPull-metrics", daemon=True)
+    
+    def start(self):
+        """Start serving in the background; returns self."""
+        self._thread.start()
+        return self
+    
+    def close(self):
+        """Stop serving and release the port."""
+        if self._thread.is_alive():
+            self.server.shutdown()
+        self.server.server_close()
+
+
+class SnapshotWriter:
+    """Appends a JSON snapshot of the metrics to a file every interval seconds, one per line.
+    
+    A long pull leaves a time series behind that can be graphed afterwards;
+    close() writes a final snapshot.
+    """
+    
+    def __init__(self, metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = max(0.1, interval)
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="AeroPull-snapshots", daemon=True)
+    
+    def start(self):
+        """Start writing in the background; returns self."""
+        self._thread.start()
+        return self
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+    
+    def write(self):
+        """Append one snapshot now."""
+        try:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(self.metrics.snapshot()) + "\n")
+        except OSError:
+            pass  # Metrics are best effort; never fail a download over them
+    
+    def close(self):
+        """Stop the writer and append a final snapshot."""
+        if self._thread.is_alive():
+            self._stop.set()
+            self._thread.join()
+        self.write()
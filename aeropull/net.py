@@ -0,0 +1,819 @@
+"""Pooled HTTP session, rate limits, adaptive concurrency, retry policy and mirror selection shared by the engines."""
+import random
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from http.client import IncompleteRead
+from threading import Lock, Condition
+from urllib.parse import urlparse
+
+
+def http_date_to_epoch(value):
+    """Parse an HTTP date header into epoch seconds, or None."""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(value):
+    """Parse a Retry-After header (seconds or an HTTP date) into seconds from now, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    epoch = http_date_to_epoch(value)
+    return None if epoch is None else max(0.0, epoch - time.time())
+
+
+# Statuses that say "try again later" rather than "this will never work"
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+# Errors worth retrying besides HTTP errors: network errors and timeouts (requests' own are OSErrors),
+# and bodies cut short, which http.client reports as IncompleteRead
+RETRYABLE_ERRORS = (OSError, IncompleteRead)
+
+
+class RetryPolicy:
+    """When and how long to wait before retrying a failed request.
+    
+    Backoff is exponential with full jitter, so workers that failed together
+    don't retry together, unless the server sent Retry-After. HTTP errors
+    are retried for RETRY_STATUSES only; other errors when they are one of
+    the given exception types (network errors, timeouts, short reads).
+    """
+    
+    def __init__(self, retries=3, base_delay=1.0, max_delay=60.0):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+    
+    def retryable(self, error, errors=RETRYABLE_ERRORS):
+        """Return True if a request that failed with error is worth sending again."""
+        status = self.status_of(error)
+        if status is not None:
+            return status in RETRY_STATUSES
+        return isinstance(error, errors)
+    
+    def backoff(self, attempt, retry_after=None):
+        """Return the seconds to wait before retry number attempt (1 for the first retry)."""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay * 5)  # The server knows best, within reason
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+    
+    @staticmethod
+    def status_of(error):
+        """Return the HTTP status a requests or aiohttp error carries, or None."""
+        response = getattr(error, 'response', None)
+        return getattr(error, 'status', None) or getattr(response, 'status_code', None)
+    
+    @staticmethod
+    def retry_after(error):
+        """Return the Retry-After delay an HTTP error carries, in seconds, or None."""
+        headers = getattr(error, 'headers', None) or getattr(getattr(error, 'response', None), 'headers', None)
+        return retry_after_seconds(headers.get('retry-after')) if headers else None
+
+
+class HostUnavailable(Exception):
+    """The circuit breaker gave up on a host; work against it fails without being sent."""
+
+
+class HostCircuit:
+    """Failure state of one host's circuit."""
+    
+    def __init__(self, cooldown):
+        self.failures = 0  # Consecutive failures
+        self.failing_since = None
+        self.open_until = 0.0
+        self.cooldown = cooldown
+        self.probe_started = None  # When the half-open circuit let its one probe through
+
+
+class CircuitBreaker:
+    """Stops new work against a host that keeps failing, instead of burning every job's retries.
+    
+    After threshold consecutive failures a host's circuit opens for
+    cooldown seconds, doubling up to max_cooldown each time it reopens.
+    When it expires one probe request goes through; success closes the
+    circuit, failure reopens it. Retry-After on a 429/503 holds the host
+    for that long even if the circuit is closed. A host that has failed
+    for give_up seconds without a single success is given up on.
+    """
+    
+    PROBE_TIMEOUT = 60.0  # Let another probe through if one never reported back
+    
+    def __init__(self, threshold=5, cooldown=5.0, max_cooldown=120.0, give_up=600.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.give_up = give_up
+        self.lock = Lock()
+        self.hosts = {}  # host -> HostCircuit
+    
+    def _host(self, url):
+        host = urlparse(url).netloc
+        circuit = self.hosts.get(host)
+        if circuit is None:
+            circuit = self.hosts[host] = HostCircuit(self.base_cooldown)
+        return circuit
+    
+    def delay(self, url):
+        """Return the seconds to wait before starting new work against url's host (0 to go ahead).
+        
+        Raises HostUnavailable once the host has been given up on.
+        """
+        with self.lock:
+            circuit = self._host(url)
+            now = time.monotonic()
+            if (circuit.failures >= self.threshold and circuit.failing_since is not None
+                    and now - circuit.failing_since > self.give_up):
+                raise HostUnavailable(f"{urlparse(url).netloc} has failed for over "
+                                      f"{self.give_up / 60:.0f} minutes; giving up on it")
+            if circuit.open_until > now:
+                return circuit.open_until - now
+            if circuit.failures >= self.threshold:
+                # Half-open: one probe at a time
+                if circuit.probe_started is not None and now - circuit.probe_started < self.PROBE_TIMEOUT:
+                    return 0.5
+                circuit.probe_started = now
+            return 0.0
+    
+    def is_open(self, url):
+        """Return True if url's host is refusing new work right now."""
+        with self.lock:
+            return self._host(url).open_until > time.monotonic()
+    
+    def record_success(self, url):
+        """The host answered; close its circuit."""
+        with self.lock:
+            circuit = self._host(url)
+            circuit.failures = 0
+            circuit.failing_since = None
+            circuit.cooldown = self.base_cooldown
+            circuit.probe_started = None
+    
+    def record_failure(self, url, retry_after=None):
+        """The host failed a request; open its circuit once failures pile up."""
+        with self.lock:
+            circuit = self._host(url)
+            now = time.monotonic()
+            circuit.failures += 1
+            if circuit.failing_since is None:
+                circuit.failing_since = now
+            circuit.probe_started = None
+            if retry_after:
+                circuit.open_until = max(circuit.open_until, now + min(retry_after, self.max_cooldown * 5))
+            if circuit.failures >= self.threshold and circuit.open_until <= now:
+                circuit.open_until = now + circuit.cooldown
+                circuit.cooldown = min(circuit.cooldown * 2, self.max_cooldown)
+    
+    def record_response(self, url, status, retry_after=None):
+        """Record a response by status: RETRY_STATUSES count as failures, anything else as success.
+        
+        retry_after is the raw Retry-After header, if any.
+        """
+        if status in RETRY_STATUSES:
+            self.record_failure(url, retry_after_seconds(retry_after))
+        else:
+            self.record_success(url)
+
+
+class MirrorStats:
+    """Recent throughput, failures and running downloads of one mirror."""
+    
+    def __init__(self):
+        self.bytes = 0.0
+        self.seconds = 0.0
+        self.failures = 0  # Since the last good transfer
+        self.active = 0
+    
+    def rate(self):
+        """Return the measured bytes per second, or None before the first transfer."""
+        return self.bytes / self.seconds if self.seconds else None
+
+
+class MirrorSet:
+    """Base URLs serving the same files; each download goes to whichever looks fastest right now.
+    
+    The first base URL is the one listings are crawled from. A mirror's
+    speed is the byte-weighted rate of its recent transfers, halved for
+    every failure since its last good one and shared among the downloads
+    already running against it. Mirrors not measured yet are tried first,
+    so each gets measured early on, and mirrors whose circuit is open are
+    passed over while another is available.
+    """
+    
+    DECAY = 0.8  # Weight older transfers keep each time a new one is recorded
+    
+    def __init__(self, base_urls, breaker=None):
+        self.base_urls = [url if url.endswith('/') else url + '/' for url in base_urls]
+        self.breaker = breaker
+        self.lock = Lock()
+        self.stats = {base: MirrorStats() for base in self.base_urls}
+    
+    def __len__(self):
+        return len(self.base_urls)
+    
+    def base_of(self, url):
+        """Return the mirror base URL url lives under, or None."""
+        for base in self.base_urls:
+            if url.startswith(base):
+                return base
+        return None
+    
+    def same_source(self, url, other):
+        """Return True if both URLs are served by the same mirror."""
+        base = self.base_of(url)
+        if base is None:
+            return urlparse(url).netloc == urlparse(other).netloc
+        return base == self.base_of(other)
+    
+    def untried(self, avoid):
+        """Return True if some mirror isn't in avoid."""
+        return any(base not in avoid for base in self.base_urls)
+    
+    def choose(self, url, avoid=()):
+        """Return url moved onto the best mirror, passing over the base URLs in avoid if possible."""
+        base = self.base_of(url)
+        if base is None or len(self.base_urls) == 1:
+            return url
+        candidates = [b for b in self.base_urls if b not in avoid] or self.base_urls
+        if self.breaker:
+            candidates = [b for b in candidates if not self.breaker.is_open(b)] or candidates
+        with self.lock:
+            best = max(candidates, key=self._rank)
+        return best + url[len(base):]
+    
+    def _rank(self, base):
+        stats = self.stats[base]
+        rate = stats.rate()
+        if rate is None:
+            rate = 0.0 if stats.failures else float('inf')
+        # Fewer running downloads breaks ties between unmeasured mirrors
+        return rate * 0.5 ** stats.failures / (1 + stats.active), -stats.active
+    
+    @contextmanager
+    def use(self, url):
+        """Count a download against url's mirror while the block runs."""
+        stats = self.stats.get(self.base_of(url))
+        if stats is None:
+            yield
+            return
+        with self.lock:
+            stats.active += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                stats.active -= 1
+    
+    def record_transfer(self, url, nbytes, seconds):
+        """Fold a finished (or interrupted) transfer of nbytes into its mirror's speed."""
+        stats = self.stats.get(self.base_of(url))
+        if stats is None or nbytes <= 0:
+            return
+        with self.lock:
+            stats.bytes = stats.bytes * self.DECAY + nbytes
+            stats.seconds = stats.seconds * self.DECAY + max(seconds, 0.001)
+            stats.failures = 0
+    
+    def record_failure(self, url):
+        """Count a failed request against url's mirror."""
+        stats = self.stats.get(self.base_of(url))
+        if stats is not None:
+            with self.lock:
+                stats.failures += 1
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of blocking.
+    
+    reserve(n) takes n tokens, going into debt if there aren't enough, and
+    returns how long the caller should wait before using them. Holds at
+    most one second of tokens. A rate of None means unlimited.
+    """
+    
+    def __init__(self, rate=None):
+        self.lock = Lock()
+        self.rate = None
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+    
+    def set_rate(self, rate):
+        """Change the rate; takes effect for the next reservation."""
+        with self.lock:
+            self._refill()
+            self.rate = rate if rate and rate > 0 else None
+            self.capacity = max(self.rate or 0, 1.0)
+            self.tokens = max(min(self.tokens, self.capacity), -self.capacity)
+    
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def reserve(self, amount):
+        """Take amount tokens and return the seconds to wait before using them."""
+        with self.lock:
+            if not self.rate:
+                return 0.0
+            self._refill()
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class RateLimiter:
+    """Global and per-host limits on bytes per second and requests per second.
+    
+    One limiter is shared by every request an engine makes: listings, HEADs
+    and downloads alike. Limits are None for unlimited and can be changed
+    with set_limits while a job runs; generation counts those changes so
+    callers sleeping on an old delay can wake up and ask again.
+    """
+    
+    LIMITS = ('bytes_per_second', 'requests_per_second',
+              'host_bytes_per_second', 'host_requests_per_second')
+    
+    def __init__(self, **limits):
+        self.lock = Lock()
+        self.limits = dict.fromkeys(self.LIMITS)
+        self.global_bytes = TokenBucket()
+        self.global_requests = TokenBucket()
+        self.hosts = {}  # host -> (bytes bucket, requests bucket)
+        self.generation = 0
+        self.set_limits(**limits)
+    
+    def set_limits(self, **limits):
+        """Change some or all limits; keys not given keep their current value."""
+        unknown = set(limits) - set(self.LIMITS)
+        if unknown:
+            raise TypeError(f"Unknown limits: {', '.join(sorted(unknown))}")
+        with self.lock:
+            self.limits.update(limits)
+            self.global_bytes.set_rate(self.limits['bytes_per_second'])
+            self.global_requests.set_rate(self.limits['requests_per_second'])
+            for host_bytes, host_requests in self.hosts.values():
+                host_bytes.set_rate(self.limits['host_bytes_per_second'])
+                host_requests.set_rate(self.limits['host_requests_per_second'])
+            self.generation += 1
+    
+    def read_size(self):
+        """Largest read that fits in a tenth of a second at the tightest byte limit, or None."""
+        rates = [self.limits['bytes_per_second'], self.limits['host_bytes_per_second']]
+        rates = [rate for rate in rates if rate]
+        if not rates:
+            return None
+        return max(int(min(rates) / 10), 4096)
+    
+    def _host_buckets(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            buckets = self.hosts.get(host)
+            if buckets is None:
+                buckets = self.hosts[host] = (
+                    TokenBucket(self.limits['host_bytes_per_second']),
+                    TokenBucket(self.limits['host_requests_per_second'])
+                )
+            return buckets
+    
+    def request_delay(self, url):
+        """Reserve one request to url's host and return the seconds to wait before sending it."""
+        if not any(self.limits.values()):
+            return 0.0
+        return max(self.global_requests.reserve(1), self._host_buckets(url)[1].reserve(1))
+    
+    def bytes_delay(self, url, nbytes):
+        """Account for nbytes received from url's host and return the seconds to wait."""
+        if not any(self.limits.values()):
+            return 0.0
+        return max(self.global_bytes.reserve(nbytes), self._host_buckets(url)[0].reserve(nbytes))
+
+
+class SlotWatchers:
+    """Lets waiters that can't block on a Condition, such as coroutines, hear when slots may have freed."""
+    
+    def watch(self, callback):
+        """Call callback() whenever a slot may have freed up; it must not block."""
+        with self.condition:
+            self.watchers.append(callback)
+    
+    def unwatch(self, callback):
+        with self.condition:
+            self.watchers.remove(callback)
+    
+    def _notify(self):
+        self.condition.notify_all()
+        for callback in self.watchers:
+            callback()
+
+
+class HostConcurrency:
+    """In-flight requests to one host, and what the controller has learned about it."""
+    
+    def __init__(self, limit):
+        self.limit = float(limit)
+        self.in_flight = 0
+        self.backed_off = 0.0  # When the limit was last cut
+        self.latency = None  # Mean time to first byte over the last sample
+        self.base_latency = None  # What the host answers in when it isn't busy
+        self.throughput = 0.0  # Body bytes per second over the last sample
+        self.plateau = False  # The last increase bought no throughput; hold for a sample
+        self.sample_started = time.monotonic()
+        self.sample_limit = self.limit
+        self.sample_latency = 0.0
+        self.sample_responses = 0
+        self.sample_bytes = 0
+    
+    @property
+    def slots(self):
+        return max(1, int(self.limit))
+
+
+class ConcurrencyController(SlotWatchers):
+    """Adapts how many requests may be in flight to each host, AIMD style.
+    
+    Each response a host sends while its slots are all busy grows its limit
+    by 1/limit, so about one slot per round of requests. A 429 or 503, a
+    timeout or a dropped connection halves it. Once per SAMPLE_INTERVAL the
+    sample's latency and throughput are compared with the previous one:
+    latency still climbing well above the host's unloaded latency without
+    throughput to show for it trims the limit, and an increase that bought
+    no throughput holds growth for a sample. With adaptive=False the limit
+    stays at initial, like a plain per-host semaphore.
+    """
+    
+    OVERLOAD_STATUSES = (429, 503)
+    BACKOFF = 0.5  # Multiplier on overload errors
+    CONGESTION_BACKOFF = 0.75  # Multiplier when latency climbs
+    LATENCY_FACTOR = 2.0  # Sample latency over base latency that counts as congestion
+    SAMPLE_INTERVAL = 1.0  # Seconds of traffic per sample
+    
+    def __init__(self, initial=4, minimum=1, maximum=16, adaptive=True):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.initial = min(max(initial, self.minimum), self.maximum)
+        self.adaptive = adaptive
+        self.condition = Condition()
+        self.watchers = []  # See SlotWatchers
+        self.hosts = {}  # host -> HostConcurrency
+    
+    def configure(self, initial=None, adaptive=None):
+        """Change the starting limit for new hosts and whether limits adapt; None keeps the current value.
+        
+        Without adapting, every host's limit is set back to initial.
+        """
+        with self.condition:
+            if initial is not None:
+                self.initial = min(max(initial, self.minimum), self.maximum)
+            if adaptive is not None:
+                self.adaptive = adaptive
+            if not self.adaptive:
+                for state in self.hosts.values():
+                    state.limit = self.initial
+            self._notify()
+    
+    def _host(self, url):
+        host = urlparse(url).netloc
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostConcurrency(self.initial)
+        return state
+    
+    def acquire(self, url):
+        """Block until a request to url's host may start."""
+        with self.condition:
+            state = self._host(url)
+            while state.in_flight >= state.slots:
+                self.condition.wait()
+            state.in_flight += 1
+    
+    def try_acquire(self, url):
+        """Start a request to url's host if a slot is free; return whether one was taken."""
+        with self.condition:
+            state = self._host(url)
+            if state.in_flight >= state.slots:
+                return False
+            state.in_flight += 1
+            return True
+    
+    def release(self, url):
+        """Give back a slot taken with acquire or try_acquire."""
+        with self.condition:
+            self._host(url).in_flight -= 1
+            self._notify()
+    
+    @contextmanager
+    def slot(self, url):
+        """Hold a slot for url's host for the duration of a with block."""
+        self.acquire(url)
+        try:
+            yield
+        finally:
+            self.release(url)
+    
+    def observe(self, url, latency, status):
+        """Feed back a response: its time to first byte and HTTP status."""
+        if not self.adaptive:
+            return
+        with self.condition:
+            state = self._host(url)
+            if status in self.OVERLOAD_STATUSES:
+                self._decrease(state, self.BACKOFF)
+                return
+            state.sample_latency += latency
+            state.sample_responses += 1
+            if state.in_flight >= state.slots and not state.plateau:
+                # Only grow while the limit is what holds requests back
+                state.limit = min(self.maximum, state.limit + 1 / state.limit)
+                self._notify()
+            self._end_sample(state)
+    
+    def observe_failure(self, url):
+        """Feed back a timeout or dropped connection."""
+        if self.adaptive:
+            with self.condition:
+                self._decrease(self._host(url), self.BACKOFF)
+    
+    def observe_bytes(self, url, nbytes):
+        """Feed back body bytes received, for the throughput samples."""
+        if not self.adaptive:
+            return
+        with self.condition:
+            state = self._host(url)
+            state.sample_bytes += nbytes
+            self._end_sample(state)
+    
+    def _end_sample(self, state):
+        # Compare the sample that just ended with the one before, then start a new one
+        now = time.monotonic()
+        elapsed = now - state.sample_started
+        if elapsed < self.SAMPLE_INTERVAL:
+            return
+        throughput = state.sample_bytes / elapsed
+        gained = throughput > state.throughput * 1.05
+        if state.sample_responses:
+            latency = state.sample_latency / state.sample_responses
+            if state.base_latency is None or latency < state.base_latency:
+                state.base_latency = latency
+            else:
+                # Drift up, so a host that got slower for good isn't seen as congested forever
+                state.base_latency += (latency - state.base_latency) * 0.1
+            rising = state.latency is not None and latency > state.latency * 1.1
+            if rising and not gained and latency > state.base_latency * self.LATENCY_FACTOR + 0.005:
+                self._decrease(state, self.CONGESTION_BACKOFF)
+            state.latency = latency
+        state.plateau = state.slots > int(state.sample_limit) and not gained
+        state.throughput = throughput
+        state.sample_started, state.sample_limit = now, state.limit
+        state.sample_latency, state.sample_responses, state.sample_bytes = 0.0, 0, 0
+    
+    def _decrease(self, state, factor):
+        # At most one cut per couple of round trips, so one burst of errors counts once
+        now = time.monotonic()
+        if now - state.backed_off < max(0.1, 2 * (state.latency or 0)):
+            return
+        state.backed_off = now
+        state.limit = max(float(self.minimum), state.limit * factor)
+    
+    def level(self, hosts=None):
+        """Return the current limit summed over hosts, or over every host seen so far if None.
+        
+        Hosts not seen yet are left out; with none seen, this is the starting limit.
+        """
+        with self.condition:
+            states = [state for host, state in self.hosts.items() if hosts is None or host in hosts]
+            if not states:
+                return self.initial
+            return sum(state.slots for state in states)
+    
+    def gauges(self):
+        """Return requests in flight and the current limit per host, as Metrics gauge tuples."""
+        with self.condition:
+            states = list(self.hosts.items())
+        return ([('host_in_flight', {'host': host}, state.in_flight) for host, state in states]
+                + [('host_limit', {'host': host}, state.slots) for host, state in states])
+
+
+class WorkerBudget(SlotWatchers):
+    """Download slots shared by several jobs and handed out fairly between them.
+    
+    Each owner (a job's DownloadEngine) takes a slot per file it transfers.
+    When slots run short, a free one goes to the waiting owner holding the
+    fewest, so a job with thousands of queued files can't starve one with a
+    handful. A transfer that pauses gives its slot back until it resumes.
+    """
+    
+    def __init__(self, total=16):
+        self.total = max(1, total)
+        self.condition = Condition()
+        self.watchers = []  # See SlotWatchers
+        self.held = {}  # owner -> slots taken
+        self.waiting = {}  # owner -> callers waiting for a slot
+    
+    @property
+    def in_use(self):
+        with self.condition:
+            return sum(self.held.values())
+    
+    def _grantable(self, owner):
+        if sum(self.held.values()) >= self.total:
+            return False
+        mine = self.held.get(owner, 0)
+        return all(self.held.get(other, 0) >= mine for other in self.waiting if other is not owner)
+    
+    def _take(self, owner):
+        self.held[owner] = self.held.get(owner, 0) + 1
+    
+    def _enqueue(self, owner):
+        self.waiting[owner] = self.waiting.get(owner, 0) + 1
+    
+    def _dequeue(self, owner):
+        self.waiting[owner] -= 1
+        if not self.waiting[owner]:
+            del self.waiting[owner]
+        self._notify()  # Fair shares changed
+    
+    def acquire(self, owner, abandon=None):
+        """Block until owner may take a slot and return True, or False once abandon() is true."""
+        with self.condition:
+            self._enqueue(owner)
+            try:
+                while not self._grantable(owner):
+                    if abandon and abandon():
+                        return False
+                    self.condition.wait(0.5 if abandon else None)
+                self._take(owner)
+                return True
+            finally:
+                self._dequeue(owner)
+    
+    def try_acquire(self, owner):
+        """Take a slot if owner's fair share allows one right now; return whether one was taken."""
+        with self.condition:
+            if not self._grantable(owner):
+                return False
+            self._take(owner)
+            return True
+    
+    def overdraw(self, owner):
+        """Take a slot past the budget, for a cancelled transfer that must hold one to wind down."""
+        with self.condition:
+            self._take(owner)
+    
+    @contextmanager
+    def queued(self, owner):
+        """Count owner as waiting while it retries try_acquire, as coroutines must."""
+        with self.condition:
+            self._enqueue(owner)
+        try:
+            yield
+        finally:
+            with self.condition:
+                self._dequeue(owner)
+    
+    def release(self, owner):
+        """Give back a slot taken with acquire, try_acquire or overdraw."""
+        with self.condition:
+            self.held[owner] -= 1
+            if not self.held[owner]:
+                del self.held[owner]
+            self._notify()
+    
+    def set_total(self, total):
+        """Change the number of slots, also while jobs run."""
+        with self.condition:
+            self.total = max(1, total)
+            self._notify()
+
+
+class ChunkSizer:
+    """Picks how much of the read buffer to fill next from the measured throughput.
+    
+    Aims for each read to take about TARGET seconds, between MIN_SIZE and
+    MAX_SIZE: small reads keep pause/cancel responsive on slow links, large
+    ones keep per-read interpreter overhead negligible on fast ones.
+    """
+    
+    MIN_SIZE = 64 * 1024
+    MAX_SIZE = 4 * 1024 * 1024
+    TARGET = 0.1  # seconds per read
+    
+    def __init__(self):
+        self.size = self.MIN_SIZE
+    
+    def update(self, nbytes, elapsed):
+        """Record a read of nbytes that took elapsed seconds."""
+        if nbytes < self.size:
+            return  # Short read at the end of the body; says nothing about speed
+        wanted = nbytes / max(elapsed, 1e-6) * self.TARGET
+        size = self.MIN_SIZE
+        while size * 2 <= wanted and size < self.MAX_SIZE:
+            size *= 2
+        self.size = size
+
+
+def body_reader(response):
+    """Return (readinto, done) for streaming a requests response into a caller's buffer.
+    
+    Uncompressed bodies are read straight from http.client into the buffer,
+    without the intermediate bytes objects iter_content allocates. done()
+    must be called once the body is exhausted so the keep-alive connection
+    goes back to the pool.
+    """
+    raw = response.raw
+    fp = getattr(raw, '_fp', None)
+    encoding = response.headers.get('content-encoding', 'identity').lower()
+    if encoding in ('', 'identity') and hasattr(fp, 'readinto'):
+        return fp.readinto, raw.release_conn
+    raw.decode_content = True
+    return raw.readinto, lambda: None  # urllib3 decodes, and releases the connection itself
+
+
+class HTTPSessionPool:
+    """Shared keep-alive HTTP session used by every request AeroPull makes."""
+    
+    DEFAULT_USER_AGENT = "AeroPull/1.0"
+    
+    def __init__(self, pool_size=8, max_hosts=10, user_agent=None, headers=None, timeout=(10, 60),
+                 limiter=None, controller=None, breaker=None, metrics=None, throttle=time.sleep):
+        import requests  # Deferred so importing aeropull stays fast
+        
+        self.timeout = timeout
+        self.limiter = limiter
+        self.throttle = throttle  # Waits out a limiter delay; engines pass one that wakes on cancel
+        self.controller = controller
+        self.breaker = breaker
+        self.metrics = metrics
+        self.overload_errors = (requests.Timeout, requests.ConnectionError)
+        self.session = requests.Session()
+        self.adapter = requests.adapters.HTTPAdapter(
+            pool_connections=max_hosts,
+            pool_maxsize=pool_size
+        )
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.session.headers['User-Agent'] = user_agent or self.DEFAULT_USER_AGENT
+        if headers:
+            self.session.headers.update(headers)
+    
+    def request(self, method, url, **kwargs):
+        """Send a request over a pooled connection, waiting first if the limiter says so.
+        
+        The time to the response headers, the status and network errors are
+        fed back to the concurrency controller and circuit breaker, and
+        recorded in metrics, if given.
+        """
+        if self.limiter:
+            delay = self.limiter.request_delay(url)
+            if delay:
+                self.throttle(delay)
+        kwargs.setdefault('timeout', self.timeout)
+        began = time.monotonic()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except self.overload_errors:
+            if self.metrics:
+                self.metrics.add('requests', host=urlparse(url).netloc, status="error")
+            if self.controller:
+                self.controller.observe_failure(url)
+            if self.breaker:
+                self.breaker.record_failure(url)
+            raise
+        latency = time.monotonic() - began
+        if self.metrics:
+            self.metrics.observe('ttfb', latency)
+            self.metrics.add('requests', host=urlparse(url).netloc, status=response.status_code)
+        if self.controller:
+            self.controller.observe(url, latency, response.status_code)
+        if self.breaker:
+            self.breaker.record_response(url, response.status_code, response.headers.get('retry-after'))
+        return response
+    
+    def get(self, url, **kwargs):
+        """Send a GET request."""
+        return self.request('GET', url, **kwargs)
+    
+    def head(self, url, **kwargs):
+        """Send a HEAD request."""
+        kwargs.setdefault('allow_redirects', True)
+        return self.request('HEAD', url, **kwargs)
+    
+    def connection_stats(self):
+        """Return (requests, connections opened) summed over every host pool."""
+        total_requests = 0
+        total_connections = 0
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is not None:
+                total_requests += pool.num_requests
+                total_connections += pool.num_connections
+        return total_requests, total_connections
+    
+    def close(self):
+        """Close every pooled connection."""
+        self.session.close()
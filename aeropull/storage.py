@@ -0,0 +1,604 @@
+"""On-disk state: the resume journal, mirror validators, the manifest, the crawl index, the object store and the history log."""
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import time
+import zlib
+from datetime import datetime
+from queue import Queue, Empty
+from threading import Thread, Lock
+from urllib.parse import urljoin
+
+from .listing import ListingEntry
+
+
+PART_SUFFIX = ".part"
+
+
+class DownloadJournal:
+    """Persisted record of partially downloaded files and their validators.
+    
+    Lives in the scrape folder next to the .part files so an interrupted
+    scrape can be resumed after a cancel, crash or restart.
+    """
+    
+    FILENAME = "aeropull_journal.json"
+    
+    def __init__(self, folder, base_url):
+        self.path = os.path.join(folder, self.FILENAME)
+        self.base_url = base_url
+        self.entries = {}
+        self._lock = Lock()
+        self._load()
+    
+    @classmethod
+    def find_resumable(cls, parent, base_url):
+        """Return the newest unfinished scrape folder of base_url under parent, if any."""
+        candidates = []
+        try:
+            names = os.listdir(parent)
+        except OSError:
+            return None
+        for name in names:
+            path = os.path.join(parent, name, cls.FILENAME)
+            if not name.startswith("SCRAPE_") or not os.path.isfile(path):
+                continue
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get('base_url') == base_url:
+                candidates.append((os.path.getmtime(path), os.path.join(parent, name)))
+        return max(candidates)[1] if candidates else None
+    
+    def _load(self):
+        """Load the journal if it belongs to the same base URL."""
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        if data.get('base_url') == self.base_url:
+            self.entries = data.get('files', {})
+        self._save()
+    
+    def _save(self):
+        """Atomically write the journal to disk."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'base_url': self.base_url, 'files': self.entries}, f)
+        os.replace(temp_path, self.path)
+    
+    def get(self, relative_path):
+        """Return the recorded validators for a partial file, or None."""
+        with self._lock:
+            return self.entries.get(relative_path)
+    
+    def update(self, relative_path, **fields):
+        """Record validators for a partial file."""
+        with self._lock:
+            self.entries.setdefault(relative_path, {}).update(fields)
+            self._save()
+    
+    def remove(self, relative_path):
+        """Forget a file once it has been completed."""
+        with self._lock:
+            if self.entries.pop(relative_path, None) is not None:
+                self._save()
+    
+    def finish(self):
+        """Delete the journal once the whole scrape has completed."""
+        with self._lock:
+            self.entries = {}
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class MirrorState:
+    """Per-folder record of the validators each downloaded file was served with.
+    
+    Sync mode sends these back as If-None-Match so unchanged files cost a 304
+    instead of a full transfer.
+    """
+    
+    FILENAME = "aeropull_mirror.json"
+    
+    def __init__(self, folder):
+        self.path = os.path.join(folder, self.FILENAME)
+        self.files = {}
+        self._lock = Lock()
+        self._dirty = False
+        try:
+            with open(self.path, 'r') as f:
+                self.files = json.load(f).get('files', {})
+        except (OSError, ValueError):
+            pass
+    
+    def get(self, relative_path):
+        """Return the recorded validators for a file, or an empty dict."""
+        with self._lock:
+            return dict(self.files.get(relative_path, {}))
+    
+    def update(self, relative_path, etag=None, last_modified=None):
+        """Record the validators a file was downloaded with."""
+        with self._lock:
+            self.files[relative_path] = {'etag': etag, 'last_modified': last_modified}
+            self._dirty = True
+    
+    def remove(self, relative_path):
+        """Forget a file that was deleted locally."""
+        with self._lock:
+            if self.files.pop(relative_path, None) is not None:
+                self._dirty = True
+    
+    def save(self):
+        """Atomically write the state to disk if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'files': self.files}, f)
+            os.replace(temp_path, self.path)
+            self._dirty = False
+
+
+class Manifest:
+    """Size, checksums and origin of every file in a scrape folder, for verifying it later.
+    
+    Entries hold size, sha256, crc32 (8 hex digits), etag, last_modified and
+    url. Saved at the end of every job; files a job didn't download keep the
+    entry an earlier job wrote.
+    """
+    
+    FILENAME = "aeropull_manifest.json"
+    
+    def __init__(self, folder, base_url=None):
+        self.path = os.path.join(folder, self.FILENAME)
+        self.base_url = base_url
+        self.files = {}
+        self._lock = Lock()
+        self._dirty = False
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.files = data.get('files', {})
+            self.base_url = base_url or data.get('base_url')
+        except (OSError, ValueError):
+            pass
+    
+    def get(self, relative_path):
+        """Return a file's entry, or an empty dict."""
+        with self._lock:
+            return dict(self.files.get(relative_path, {}))
+    
+    def update(self, relative_path, **fields):
+        """Record a file's entry, replacing any earlier one."""
+        with self._lock:
+            self.files[relative_path] = fields
+            self._dirty = True
+    
+    def remove(self, relative_path):
+        """Forget a file that is no longer in the folder."""
+        with self._lock:
+            if self.files.pop(relative_path, None) is not None:
+                self._dirty = True
+    
+    def save(self):
+        """Atomically write the manifest to disk if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'base_url': self.base_url, 'created': time.time(), 'files': self.files}, f, indent=1)
+            os.replace(temp_path, self.path)
+            self._dirty = False
+
+
+# Bookkeeping files AeroPull keeps inside a scrape folder
+METADATA_FILES = (DownloadJournal.FILENAME, MirrorState.FILENAME, Manifest.FILENAME)
+
+
+class CrawlIndex:
+    """On-disk SQLite index of every directory listing AeroPull has crawled.
+    
+    Each listing keeps the ETag/Last-Modified it was served with and a digest
+    of its body, so a re-crawl can revalidate it with a conditional GET and
+    reuse the stored entries instead of parsing it again. The entries table
+    doubles as a queryable inventory of the remote server.
+    """
+    
+    FILENAME = "crawl_index.sqlite"
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS listings (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            digest TEXT,
+            crawled_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS entries (
+            listing_url TEXT NOT NULL,
+            href TEXT NOT NULL,
+            url TEXT NOT NULL,
+            is_dir INTEGER NOT NULL,
+            size INTEGER,
+            mtime REAL,
+            PRIMARY KEY (listing_url, href)
+        );
+        CREATE INDEX IF NOT EXISTS entries_url ON entries (url);
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(self.SCHEMA)
+        self.db.commit()
+    
+    def validators(self, url):
+        """Return (etag, last_modified, digest) for a stored listing, or None."""
+        with self._lock:
+            return self.db.execute(
+                "SELECT etag, last_modified, digest FROM listings WHERE url = ?", (url,)
+            ).fetchone()
+    
+    def conditional_headers(self, url):
+        """Build If-None-Match/If-Modified-Since headers for a stored listing."""
+        stored = self.validators(url)
+        headers = {}
+        if stored:
+            etag, last_modified, _ = stored
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+    
+    def entries(self, url):
+        """Return the stored ListingEntry rows of a listing."""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT href, size, mtime FROM entries WHERE listing_url = ? ORDER BY rowid", (url,)
+            ).fetchall()
+        return [ListingEntry(href, size, mtime) for href, size, mtime in rows]
+    
+    def store(self, url, etag, last_modified, digest, listing):
+        """Replace a listing and its entries."""
+        rows = [
+            (url, entry.href, urljoin(url, entry.href), entry.href.endswith('/'), entry.size, entry.mtime)
+            for entry in listing
+        ]
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO listings (url, etag, last_modified, digest, crawled_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, digest, time.time())
+            )
+            self.db.execute("DELETE FROM entries WHERE listing_url = ?", (url,))
+            self.db.executemany(
+                "INSERT OR REPLACE INTO entries (listing_url, href, url, is_dir, size, mtime) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+    
+    def touch(self, url, etag=None, last_modified=None):
+        """Mark a listing as revalidated now, refreshing its validators if given."""
+        with self._lock, self.db:
+            self.db.execute(
+                "UPDATE listings SET crawled_at = ?, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                (time.time(), etag, last_modified, url)
+            )
+    
+    def record_sizes(self, sizes):
+        """Store sizes found by HEAD requests, keyed by file URL."""
+        with self._lock, self.db:
+            self.db.executemany(
+                "UPDATE entries SET size = ? WHERE url = ? AND size IS NULL",
+                [(size, url) for url, size in sizes.items()]
+            )
+    
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self.db.close()
+
+
+class HashingWriter:
+    """Passes writes through to a file while checksumming them, so a download is hashed as it streams.
+    
+    Keeps a sha256 digest (unless sha256 is False) and a crc32. size counts
+    the bytes hashed so far, which must be the file's length for the
+    checksums to describe it.
+    """
+    
+    BLOCK = 8 * 1024 * 1024  # Bytes hashed per call when reading a file back
+    
+    def __init__(self, sha256=True):
+        self.digest = hashlib.sha256() if sha256 else None
+        self.crc32 = 0
+        self.size = 0
+        self.file = None
+    
+    @classmethod
+    def from_file(cls, path, length=None, sha256=True):
+        """Checksum the first length bytes of a file (all of it if None) through a memory map.
+        
+        hashlib and zlib let go of the GIL on big buffers, so several
+        threads can do this at once on every core.
+        """
+        writer = cls(sha256)
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size if length is None else length
+            if size:
+                with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                    for start in range(0, size, cls.BLOCK):
+                        writer.update(view[start:start + cls.BLOCK])
+        return writer
+    
+    def wrap(self, f):
+        """Write through to f from now on; returns self."""
+        self.file = f
+        return self
+    
+    def update(self, data):
+        """Checksum data without writing it anywhere."""
+        if self.digest:
+            self.digest.update(data)
+        self.crc32 = zlib.crc32(data, self.crc32)
+        self.size += len(data)
+    
+    def write(self, data):
+        self.update(data)
+        return self.file.write(data)
+    
+    def checksums(self):
+        """Return the manifest fields for what was hashed: size, sha256 and crc32."""
+        return {
+            'size': self.size,
+            'sha256': self.digest.hexdigest() if self.digest else None,
+            'crc32': f"{self.crc32:08x}",
+        }
+
+
+class ObjectStore:
+    """Content-addressed store of downloaded files, shared by every scrape folder.
+    
+    Each distinct file is kept once under objects/, named by its sha256, and
+    scrape folders get hardlinks (or reflinks) to it. An SQLite index
+    remembers which URL and validators each object was downloaded with, so
+    a later scrape can revalidate with a conditional GET and link the
+    stored copy on a 304, and a response whose strong ETag and size match a
+    stored object can be linked without reading its body. The store should
+    live on the same filesystem as the scrape folders; elsewhere files are
+    copied instead of linked.
+    """
+    
+    LINK_MODES = ("hardlink", "reflink")
+    FICLONE = 0x40049409  # Linux ioctl that makes dst share src's blocks copy-on-write
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sources (
+            url TEXT PRIMARY KEY,
+            digest TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            stored_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS sources_etag ON sources (etag, size);
+    """
+    
+    def __init__(self, path, link="hardlink"):
+        if link not in self.LINK_MODES:
+            raise ValueError(f"Unknown link mode {link!r}, expected one of {', '.join(self.LINK_MODES)}")
+        self.path = path
+        self.link = link
+        os.makedirs(os.path.join(path, "objects"), exist_ok=True)
+        self._lock = Lock()
+        self.db = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False)
+        self.db.executescript(self.SCHEMA)
+        self.db.commit()
+    
+    def object_path(self, digest):
+        return os.path.join(self.path, "objects", digest[:2], digest)
+    
+    def lookup(self, url):
+        """Return (digest, size, etag, last_modified) of the object last stored from url, or None."""
+        with self._lock:
+            row = self.db.execute(
+                "SELECT digest, size, etag, last_modified FROM sources WHERE url = ?", (url,)
+            ).fetchone()
+        return row if row and os.path.exists(self.object_path(row[0])) else None
+    
+    def find(self, etag, size):
+        """Return the digest of a stored object served with this strong ETag and size, or None."""
+        if not etag or etag.startswith('W/') or size is None:
+            return None
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT digest FROM sources WHERE etag = ? AND size = ?", (etag, size)
+            ).fetchall()
+        for (digest,) in rows:
+            if os.path.exists(self.object_path(digest)):
+                return digest
+        return None
+    
+    def add(self, path, digest, url, etag=None, last_modified=None):
+        """Put a finished file in the store, or replace it with a link to the identical object already there."""
+        object_path = self.object_path(digest)
+        if os.path.exists(object_path):
+            self._place(object_path, path)  # Deduplicate
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            self._place(path, object_path)
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO sources (url, digest, size, etag, last_modified, stored_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, digest, os.path.getsize(object_path), etag, last_modified, time.time())
+            )
+    
+    def materialize(self, digest, path):
+        """Link a stored object to path. Returns False if it is gone or can't be linked."""
+        object_path = self.object_path(digest)
+        if not os.path.exists(object_path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            self._place(object_path, path)
+        except OSError:
+            return False
+        return True
+    
+    def _place(self, src, dst):
+        """Make dst a link to src (a copy if linking fails), replacing dst atomically."""
+        temp_path = dst + ".link"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        try:
+            if self.link == "reflink":
+                self._reflink(src, temp_path)
+            else:
+                os.link(src, temp_path)
+        except OSError:
+            shutil.copy2(src, temp_path)  # Another filesystem, or no reflink support
+        os.replace(temp_path, dst)
+    
+    def _reflink(self, src, dst):
+        try:
+            import fcntl
+        except ImportError:
+            raise OSError("Reflinks are not supported on this platform")  # The caller copies instead
+        with open(src, 'rb') as source, open(dst, 'wb') as target:
+            try:
+                fcntl.ioctl(target.fileno(), self.FICLONE, source.fileno())
+            except OSError:
+                target.close()
+                os.remove(dst)
+                raise
+    
+    def close(self):
+        """Close the index."""
+        with self._lock:
+            self.db.close()
+
+
+class HistoryLog:
+    """Download history written in batches by a background thread.
+    
+    Callers only queue entries; the writer thread appends them once a
+    second or every flush_entries entries, whichever comes first, and
+    rotates the file to .1, .2, ... when it grows past max_bytes.
+    The "text" format is the classic one-line-per-event log, "jsonl"
+    writes one JSON object per line for analysis with other tools.
+    """
+    
+    FORMATS = ("text", "jsonl")
+    
+    def __init__(self, path, fmt="text", max_bytes=10 * 1024 * 1024, backups=3,
+                 flush_interval=1.0, flush_entries=256):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown history format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.flush_entries = flush_entries
+        self._queue = Queue()
+        self._write_lock = Lock()
+        self._closed = False
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def write(self, url, status, size, duration=None, http_status=None, retries=0):
+        """Queue one history entry; cheap enough to call on every file event."""
+        entry = (time.time(), url, status, size, duration, http_status, retries)
+        if self._closed:
+            self._flush([entry])  # Late events, e.g. a cancel after the job ended
+        else:
+            self._queue.put(entry)
+    
+    def close(self):
+        """Flush everything queued and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+    
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.time(), 0)
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except Empty:
+                entry = False  # Interval elapsed
+            
+            if entry:
+                batch.append(entry)
+                if deadline is None:
+                    deadline = time.time() + self.flush_interval
+            if batch and (entry is None or entry is False or len(batch) >= self.flush_entries):
+                self._flush(batch)
+                batch = []
+                deadline = None
+            if entry is None:
+                return
+    
+    def _flush(self, batch):
+        """Append a batch of entries, rotating first if the file is too big."""
+        lines = [self._format(entry) for entry in batch]
+        with self._write_lock:
+            try:
+                self._rotate_if_needed()
+                is_new = not os.path.exists(self.path)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    if is_new and self.fmt == "text":
+                        f.write("AeroPull Download History\n")
+                        f.write("="*40 + "\n")
+                    f.writelines(lines)
+            except OSError:
+                pass  # History is best effort; never fail a download over it
+    
+    def _rotate_if_needed(self):
+        if not self.max_bytes or not os.path.exists(self.path):
+            return
+        if os.path.getsize(self.path) < self.max_bytes:
+            return
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+    
+    def _format(self, entry):
+        timestamp, url, status, size, duration, http_status, retries = entry
+        when = datetime.fromtimestamp(timestamp)
+        if self.fmt == "jsonl":
+            return json.dumps({
+                'time': when.isoformat(timespec='milliseconds'),
+                'url': url,
+                'status': status,
+                'bytes': size,
+                'duration': round(duration, 3) if duration is not None else None,
+                'http_status': http_status,
+                'retries': retries
+            }) + "\n"
+        size_mb = size / (1024 * 1024)
+        return f"[{when.strftime('%Y-%m-%d %H:%M:%S')}] {url} - {status} - {size_mb:.2f}MB\n"
@@ -0,0 +1,43 @@
+"""Check a scrape folder against the manifest its downloads wrote."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .storage import Manifest, HashingWriter
+
+
+def verify_folder(folder, workers=None, quick=False, on_result=None):
+    """Check every file in a folder's manifest and return a list of (relative_path, problem).
+    
+    Files are read through memory maps on a thread pool; hashing lets go of
+    the GIL, so the threads use every core. quick compares size and crc32
+    only, skipping the slower sha256. on_result(relative_path, problem) is
+    called as each file is checked, with problem None for a good file.
+    Raises FileNotFoundError if the folder has no manifest.
+    """
+    manifest = Manifest(folder)
+    if not os.path.exists(manifest.path):
+        raise FileNotFoundError(f"No {Manifest.FILENAME} in {folder}")
+    
+    def check(item):
+        relative_path, expected = item
+        path = os.path.join(folder, relative_path)
+        try:
+            if os.path.getsize(path) != expected.get('size'):
+                return f"size is {os.path.getsize(path)}, expected {expected.get('size')}"
+            checksums = HashingWriter.from_file(path, sha256=not quick).checksums()
+        except OSError as e:
+            return "missing" if not os.path.exists(path) else f"unreadable: {e.strerror or e}"
+        for name in ('crc32',) if quick else ('sha256', 'crc32'):
+            if expected.get(name) and checksums[name] != expected[name]:
+                return f"{name} mismatch"
+        return None
+    
+    problems = []
+    items = sorted(manifest.files.items())
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for (relative_path, _), problem in zip(items, pool.map(check, items)):
+            if problem:
+                problems.append((relative_path, problem))
+            if on_result:
+                on_result(relative_path, problem)
+    return problems
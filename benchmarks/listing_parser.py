@@ -0,0 +1,72 @@
+"""Benchmark the streaming listing parser against the BeautifulSoup parser.
+
+Usage: python benchmarks/listing_parser.py [entries]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from aeropull.listing import StreamingListingParser, parse_html_listing
+
+
+def make_nginx_listing(entries):
+    """Build an nginx-style autoindex page with the given number of files."""
+    rows = [
+        f'<a href="map_{i:06d}.bsp.bz2">map_{i:06d}.bsp.bz2</a>{" " * 30}18-Oct-2026 14:40{" " * 12}{i * 37}\n'
+        for i in range(entries)
+    ]
+    return ('<html><head><title>Index of /maps/</title></head><body><h1>Index of /maps/</h1><hr><pre>'
+            '<a href="../">../</a>\n' + ''.join(rows) + '</pre><hr></body></html>').encode()
+
+
+def make_apache_listing(entries):
+    """Build an Apache FancyIndexing table page with the given number of files."""
+    rows = [
+        f'<tr><td valign="top"><img src="/icons/unknown.gif" alt="[   ]"></td>'
+        f'<td><a href="map_{i:06d}.bsp.bz2">map_{i:06d}.bsp.bz2</a></td>'
+        f'<td align="right">2026-10-18 14:40  </td><td align="right">{i % 900}K</td><td>&nbsp;</td></tr>\n'
+        for i in range(entries)
+    ]
+    return ('<html><body><table>\n' + ''.join(rows) + '</table></body></html>').encode()
+
+
+def time_it(func, body, repeat=3):
+    """Return the best wall time of func(body) over several runs, and its result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(body)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def parse_streaming(body, chunk_size=65536):
+    """Feed the body to the streaming parser in network-sized chunks."""
+    parser = StreamingListingParser('text/html')
+    for i in range(0, len(body), chunk_size):
+        parser.feed(body[i:i + chunk_size])
+    return parser.close()
+
+
+def parse_soup(body):
+    """Decode the body and parse it the way AeroPull used to."""
+    return parse_html_listing(body.decode('utf-8'))
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    for name, builder in (("nginx", make_nginx_listing), ("apache", make_apache_listing)):
+        body = builder(entries)
+        soup_time, soup_result = time_it(parse_soup, body)
+        stream_time, stream_result = time_it(parse_streaming, body)
+        assert [e.href for e in soup_result] == [e.href for e in stream_result], "parsers disagree"
+        print(f"{name:7s} {entries} entries, {len(body) / 1024:.0f} KB: "
+              f"BeautifulSoup {soup_time * 1000:.0f} ms, streaming {stream_time * 1000:.0f} ms "
+              f"({soup_time / stream_time:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Fixtures shared by the tests: a fake clock and a local FastDL server."""
+import email.utils
+import http.server
+import io
+import os
+import re
+import time
+from threading import Thread
+
+import pytest
+
+from aeropull import net
+
+
+class Clock:
+    """Stands in for the time module in aeropull.net, so timing code runs without waiting."""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self):
+        return self.now
+    
+    def time(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Run aeropull.net on a Clock."""
+    clock = Clock()
+    monkeypatch.setattr(net, 'time', clock)
+    return clock
+
+
+RANGE_RE = re.compile(r'bytes=(\d+)-(\d*)$')
+
+
+class FastDLHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves a folder the way nginx serves a FastDL tree: autoindex pages, ETags and byte ranges."""
+    
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, *args):
+        pass
+    
+    def list_directory(self, path):
+        lines = ['<html><body><h1>Index</h1><hr><pre><a href="../">../</a>']
+        for name in sorted(os.listdir(path)):
+            full = os.path.join(path, name)
+            st = os.stat(full)
+            date = time.strftime('%d-%b-%Y %H:%M', time.gmtime(st.st_mtime))
+            if os.path.isdir(full):
+                lines.append(f'<a href="{name}/">{name}/</a>{" " * 20}{date}       -')
+            else:
+                lines.append(f'<a href="{name}">{name}</a>{" " * 20}{date}  {st.st_size}')
+        lines.append('</pre><hr></body></html>')
+        body = "\n".join(lines).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', "text/html")
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.remaining = len(body)
+        return io.BytesIO(body)
+    
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            return super().send_head()
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+        st = os.stat(path)
+        etag = '"%x-%x"' % (int(st.st_mtime), st.st_size)
+        last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', "0")
+            self.end_headers()
+            return None
+        
+        start, end = 0, st.st_size - 1
+        match = RANGE_RE.match(self.headers.get('Range', ''))
+        if match and self.headers.get('If-Range') in (None, etag, last_modified):
+            start = int(match.group(1))
+            if start >= st.st_size:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{st.st_size}")
+                self.send_header('Content-Length', "0")
+                self.end_headers()
+                return None
+            if match.group(2):
+                end = min(int(match.group(2)), end)
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{st.st_size}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.send_header('Accept-Ranges', "bytes")
+        self.end_headers()
+        f = open(path, 'rb')
+        f.seek(start)
+        self.remaining = end - start + 1
+        return f
+    
+    def copyfile(self, source, outputfile):
+        while self.remaining > 0:
+            data = source.read(min(65536, self.remaining))
+            if not data:
+                break
+            outputfile.write(data)
+            self.remaining -= len(data)
+
+
+class FastDLServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def handle_error(self, request, client_address):
+        pass  # Clients hang up mid-body on cancel; that's expected
+
+
+@pytest.fixture
+def fastdl(tmp_path):
+    """Serve tmp_path/"server" over HTTP; yields (folder, url of its maps/ directory)."""
+    root = tmp_path / "server"
+    (root / "maps").mkdir(parents=True)
+    
+    def handler(*args, **kwargs):
+        return FastDLHandler(*args, directory=str(root), **kwargs)
+    
+    server = FastDLServer(('127.0.0.1', 0), handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield root / "maps", f"http://127.0.0.1:{server.server_address[1]}/maps/"
+    server.shutdown()
+    server.server_close()
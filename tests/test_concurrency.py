@@ -0,0 +1,112 @@
+"""Adaptive per-host concurrency."""
+from aeropull.engine import DownloadEngine
+from aeropull.net import ConcurrencyController
+
+
+A = "http://a.example.com/maps/de_dust2.bsp"
+B = "http://b.example.com/maps/de_dust2.bsp"
+
+
+def fill(controller, url):
+    """Take every free slot for url's host and return how many there were."""
+    taken = 0
+    while controller.try_acquire(url):
+        taken += 1
+    return taken
+
+
+def test_each_host_gets_its_own_slots(clock):
+    controller = ConcurrencyController(initial=3)
+    assert fill(controller, A) == 3
+    assert fill(controller, B) == 3
+    controller.release(A)
+    assert fill(controller, A) == 1
+
+
+def test_release_wakes_watchers(clock):
+    controller = ConcurrencyController(initial=1)
+    woken = []
+    controller.watch(lambda: woken.append(True))
+    controller.try_acquire(A)
+    controller.release(A)
+    assert woken == [True]
+
+
+def test_limit_grows_only_while_it_holds_requests_back(clock):
+    controller = ConcurrencyController(initial=2, maximum=3)
+    controller.try_acquire(A)
+    controller.observe(A, 0.01, 200)
+    assert controller.level() == 2  # A slot was still free
+    
+    fill(controller, A)
+    for _ in range(10):
+        controller.observe(A, 0.01, 200)
+    assert controller.level() == 3  # Capped at maximum
+
+
+def test_overload_halves_the_limit_once_per_burst(clock):
+    controller = ConcurrencyController(initial=8)
+    controller.observe(A, 0.01, 503)
+    controller.observe(A, 0.01, 429)
+    assert controller.level() == 4
+    
+    clock.now += 1
+    controller.observe_failure(A)
+    assert controller.level() == 2
+    for _ in range(5):
+        clock.now += 1
+        controller.observe(A, 0.01, 503)
+    assert controller.level() == 1  # Never below minimum
+
+
+def test_rising_latency_without_throughput_trims_the_limit(clock):
+    controller = ConcurrencyController(initial=4)
+    controller.observe(A, 0.01, 200)
+    clock.now += 1
+    controller.observe(A, 0.01, 200)  # First sample sets the unloaded latency
+    assert controller.level() == 4
+    
+    clock.now += 1
+    controller.observe(A, 0.05, 200)
+    assert controller.level() == 3
+
+
+def test_fixed_limit_ignores_feedback(clock):
+    controller = ConcurrencyController(initial=2, adaptive=False)
+    fill(controller, A)
+    controller.observe(A, 0.01, 200)
+    controller.observe(A, 0.01, 503)
+    controller.observe_failure(A)
+    assert controller.level() == 2
+
+
+def test_gauges_report_each_host(clock):
+    controller = ConcurrencyController(initial=2)
+    controller.try_acquire(A)
+    assert sorted(controller.gauges()) == [
+        ('host_in_flight', {'host': "a.example.com"}, 1),
+        ('host_limit', {'host': "a.example.com"}, 2),
+    ]
+
+
+def test_level_counts_only_the_hosts_asked_about(clock):
+    controller = ConcurrencyController(initial=2, maximum=8)
+    assert controller.level({"a.example.com"}) == 2  # Nothing seen yet
+    for _ in range(3):
+        fill(controller, B)
+        controller.observe(B, 0.01, 200)
+        controller.release(B)
+    fill(controller, A)
+    assert controller.level({"a.example.com"}) == 2
+    assert controller.level() == 2 + controller.level({"b.example.com"}) > 4
+
+
+def test_a_job_reports_only_its_own_hosts(tmp_path, clock):
+    shared = ConcurrencyController(initial=2)
+    fill(shared, B)  # Another job's downloads
+    engine = DownloadEngine("http://a.example.com/maps/", str(tmp_path), controller=shared,
+                            history_file=None, crawl_index_path=None)
+    assert engine.snapshot().concurrency == 2
+    fill(shared, A)
+    assert engine.snapshot().concurrency == 2
+    assert shared.level() == 4
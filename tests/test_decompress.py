@@ -0,0 +1,137 @@
+"""Unpacking .bz2 downloads."""
+import bz2
+import hashlib
+import os
+
+import pytest
+
+from aeropull.decompress import TEMP_SUFFIX, DecompressionStage, StreamingUnpacker
+from aeropull.engine import DownloadEngine
+from aeropull.storage import Manifest
+from aeropull.verify import verify_folder
+
+
+MAP = b"VBSP" + bytes(range(256)) * 64
+
+
+@pytest.mark.parametrize("engine_type", ["threaded", "asyncio"])
+def test_dropped_originals_are_not_downloaded_again(fastdl, tmp_path, engine_type):
+    served, url = fastdl
+    (served / "de_x.bsp.bz2").write_bytes(bz2.compress(MAP))
+    folder = tmp_path / "SCRAPE_maps"
+    
+    for run, sync in enumerate((False, False, True)):
+        engine = DownloadEngine(url, str(folder), engine_type=engine_type, sync=sync, decompress=True,
+                                keep_compressed=False, history_file=None, crawl_index_path=None)
+        assert engine.run() == "complete"
+        assert (folder / "de_x.bsp").read_bytes() == MAP
+        assert not (folder / "de_x.bsp.bz2").exists()
+        if run:
+            assert engine.transferred_bytes == 0  # The unpacked copy stands in for the .bz2
+
+
+@pytest.mark.parametrize("keep_compressed", [True, False])
+def test_unpacked_files_are_in_the_manifest(fastdl, tmp_path, keep_compressed):
+    served, url = fastdl
+    (served / "de_x.bsp.bz2").write_bytes(bz2.compress(MAP))
+    folder = tmp_path / "SCRAPE_maps"
+    engine = DownloadEngine(url, str(folder), decompress=True, keep_compressed=keep_compressed,
+                            history_file=None, crawl_index_path=None)
+    assert engine.run() == "complete"
+    
+    manifest = Manifest(str(folder))
+    assert manifest.get("de_x.bsp")['size'] == len(MAP)
+    assert manifest.get("de_x.bsp")['sha256'] == hashlib.sha256(MAP).hexdigest()
+    assert bool(manifest.get("de_x.bsp.bz2")) == keep_compressed
+    assert verify_folder(str(folder)) == []
+    
+    (folder / "de_x.bsp").write_bytes(b"VBSP damaged")
+    assert [path for path, _ in verify_folder(str(folder))] == ["de_x.bsp"]
+
+
+def download(stage, path, data, offset=0, chunk=1000):
+    """Write data to path at offset the way the engines do, through stage.stream."""
+    with open(path, 'r+b' if offset else 'wb') as f:
+        f.seek(offset)
+        target = stage.stream(path, offset, f)
+        for i in range(0, len(data), chunk):
+            target.write(data[i:i + chunk])
+
+
+def test_streaming_unpacker_handles_concatenated_streams(tmp_path):
+    path = str(tmp_path / "de_x.bsp.bz2")
+    data = bz2.compress(MAP[:5000]) + bz2.compress(MAP[5000:])  # As pbzip2 writes them
+    with open(path, 'wb') as f:
+        unpacker = StreamingUnpacker(path).wrap(f)
+        for i in range(0, len(data), 100):
+            unpacker.write(data[i:i + 100])
+    
+    assert unpacker.streams == 2
+    assert unpacker.finish(keep_original=True) == len(MAP)
+    assert (tmp_path / "de_x.bsp").read_bytes() == MAP
+    assert os.path.getmtime(tmp_path / "de_x.bsp") == os.path.getmtime(path)
+    assert not os.path.exists(path + TEMP_SUFFIX)
+
+
+@pytest.mark.parametrize("data", [bz2.compress(MAP)[:-20], b"not bzip2 at all"])
+def test_streaming_unpacker_refuses_what_it_cant_finish(tmp_path, data):
+    path = str(tmp_path / "de_x.bsp.bz2")
+    with open(path, 'wb') as f:
+        unpacker = StreamingUnpacker(path).wrap(f)
+        unpacker.write(data)
+    
+    assert unpacker.finish(keep_original=True) is None
+    assert not (tmp_path / "de_x.bsp").exists()
+    assert not os.path.exists(path + TEMP_SUFFIX)
+
+
+def test_stage_unpacks_streamed_downloads_without_the_pool(tmp_path):
+    done = []
+    stage = DecompressionStage(keep_original=False, on_done=lambda *args: done.append(args))
+    path = str(tmp_path / "de_x.bsp.bz2")
+    download(stage, path, bz2.compress(MAP))
+    stage.submit(path)
+    
+    assert done == [(path, len(MAP), None)]
+    assert stage.pool is None
+    assert (tmp_path / "de_x.bsp").read_bytes() == MAP
+    assert not os.path.exists(path)
+    stage.close()
+
+
+def test_stage_sends_resumed_and_broken_downloads_to_the_pool(tmp_path):
+    done = []
+    stage = DecompressionStage(workers=1, on_done=lambda *args: done.append(args))
+    data = bz2.compress(MAP)
+    resumed = str(tmp_path / "de_x.bsp.bz2")
+    with open(resumed, 'wb') as f:
+        f.write(data[:3000])  # An earlier run's part
+    download(stage, resumed, data[3000:], offset=3000)
+    broken = str(tmp_path / "de_y.bsp.bz2")
+    download(stage, broken, b"not bzip2 at all")
+    
+    stage.submit(resumed)
+    stage.submit(broken)
+    stage.close()
+    
+    assert stage.unpacked(resumed)
+    assert (tmp_path / "de_x.bsp").read_bytes() == MAP
+    results = {path: (size, error) for path, size, error in done}
+    assert results[resumed] == (len(MAP), None)
+    assert results[broken][0] is None and isinstance(results[broken][1], OSError)
+    assert not (tmp_path / "de_y.bsp").exists()
+    assert os.path.exists(broken)  # Left for the user to look at
+
+
+def test_stage_restarts_streaming_when_a_download_starts_over(tmp_path):
+    done = []
+    stage = DecompressionStage(on_done=lambda *args: done.append(args))
+    path = str(tmp_path / "de_x.bsp.bz2")
+    data = bz2.compress(MAP)
+    download(stage, path, data[:2000])  # Cut off, then downloaded again from the start
+    download(stage, path, data)
+    stage.submit(path)
+    
+    assert done == [(path, len(MAP), None)]
+    assert stage.pool is None
+    stage.close()
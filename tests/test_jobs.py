@@ -0,0 +1,69 @@
+"""The job queue and what it keeps between sessions."""
+import json
+import os
+
+from aeropull.jobs import JobQueue
+
+
+URL = "http://127.0.0.1:1/maps/"  # Nothing listens here, so started jobs end quickly
+
+
+def make_queue(tmp_path, **kwargs):
+    return JobQueue(str(tmp_path / JobQueue.FILENAME), history_file=None, **kwargs)
+
+
+def test_jobs_survive_a_restart(tmp_path):
+    queue = make_queue(tmp_path)
+    first = queue.add(URL, parent=str(tmp_path), max_depth=2, file_types=[".bsp"], limits={'bytes_per_second': 1000})
+    second = queue.add("http://127.0.0.1:1/sound", str(tmp_path / "sounds"))
+    queue.pause(second)
+    
+    reloaded = make_queue(tmp_path)
+    assert [job.to_dict() for job in reloaded.jobs] == [first.to_dict(), second.to_dict()]
+    assert reloaded.get(2).url == "http://127.0.0.1:1/sound/"
+    assert reloaded.get(2).state == "paused"
+    assert reloaded.get(1).options == {'max_depth': 2, 'file_types': [".bsp"], 'limits': {'bytes_per_second': 1000}}
+    assert not os.path.exists(queue.path + ".tmp")
+
+
+def test_interrupted_jobs_are_queued_again(tmp_path):
+    job = {'id': 1, 'url': URL, 'output_dir': str(tmp_path / "SCRAPE_a"), 'options': {}, 'state': "running"}
+    with open(tmp_path / JobQueue.FILENAME, 'w') as f:
+        json.dump({'jobs': [job, {'id': 2}]}, f)  # The second one is missing fields and dropped
+    
+    queue = make_queue(tmp_path)
+    assert [(job.id, job.state) for job in queue.jobs] == [(1, "queued")]
+
+
+def test_unreadable_queue_starts_empty(tmp_path):
+    (tmp_path / JobQueue.FILENAME).write_text("{not json")
+    assert make_queue(tmp_path).jobs == []
+
+
+def test_new_jobs_get_their_own_folders(tmp_path):
+    queue = make_queue(tmp_path)
+    folders = {queue.add(URL, parent=str(tmp_path)).output_dir for _ in range(3)}
+    assert len(folders) == 3
+
+
+def test_remove_forgets_a_job(tmp_path):
+    queue = make_queue(tmp_path)
+    job = queue.add(URL, parent=str(tmp_path))
+    assert queue.remove(job)
+    assert make_queue(tmp_path).jobs == []
+
+
+def test_jobs_share_limits_and_per_host_options(tmp_path):
+    queue = make_queue(tmp_path, workers=8)
+    job = queue.add(URL, parent=str(tmp_path), retries=0, history_file=None, per_host_connections=2,
+                    adaptive_concurrency=False, limits={'host_requests_per_second': 5})
+    bad = queue.add(URL, parent=str(tmp_path), history_file=None, limits={'bogus': 1})
+    queue.start()
+    queue.wait()
+    queue.stop()
+    
+    assert job.engine.limiter is queue.limiter
+    assert job.engine.concurrency is queue.controller
+    assert queue.limiter.limits['host_requests_per_second'] == 5
+    assert (queue.controller.initial, queue.controller.adaptive) == (2, False)
+    assert bad.state == "error"
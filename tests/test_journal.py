@@ -0,0 +1,102 @@
+"""Resuming partial files from the download journal."""
+import os
+
+import pytest
+
+from aeropull.engine import DownloadEngine, RemoteFileChanged
+from aeropull.storage import DownloadJournal
+
+
+BASE_URL = "http://fastdl.example.com/maps/"
+
+
+def make_engine(folder):
+    engine = DownloadEngine(BASE_URL, str(folder), history_file=None, crawl_index_path=None)
+    engine.journal = DownloadJournal(str(folder), BASE_URL)
+    return engine
+
+
+def test_journal_survives_a_restart(tmp_path):
+    journal = DownloadJournal(str(tmp_path), BASE_URL)
+    journal.update("de_dust2.bsp", url=BASE_URL + "de_dust2.bsp", etag='"abc"', size=1000)
+    journal.update("de_dust2.bsp", last_modified="Sat, 17 Oct 2026 12:00:00 GMT")
+    
+    reloaded = DownloadJournal(str(tmp_path), BASE_URL)
+    assert reloaded.get("de_dust2.bsp") == {
+        'url': BASE_URL + "de_dust2.bsp",
+        'etag': '"abc"',
+        'size': 1000,
+        'last_modified': "Sat, 17 Oct 2026 12:00:00 GMT",
+    }
+
+
+def test_journal_of_another_url_is_ignored(tmp_path):
+    DownloadJournal(str(tmp_path), BASE_URL).update("de_dust2.bsp", size=1000)
+    assert DownloadJournal(str(tmp_path), "http://other.example.com/maps/").get("de_dust2.bsp") is None
+
+
+def test_finish_removes_the_journal(tmp_path):
+    journal = DownloadJournal(str(tmp_path), BASE_URL)
+    journal.update("de_dust2.bsp", size=1000)
+    journal.finish()
+    assert not os.path.exists(os.path.join(str(tmp_path), DownloadJournal.FILENAME))
+
+
+def test_find_resumable_picks_the_newest_folder_of_the_url(tmp_path):
+    for name, url, mtime in [("SCRAPE_old", BASE_URL, 1000), ("SCRAPE_new", BASE_URL, 2000),
+                             ("SCRAPE_other", "http://other.example.com/", 3000), ("notes", BASE_URL, 4000)]:
+        folder = tmp_path / name
+        folder.mkdir()
+        DownloadJournal(str(folder), url)
+        os.utime(folder / DownloadJournal.FILENAME, (mtime, mtime))
+    
+    assert DownloadJournal.find_resumable(str(tmp_path), BASE_URL) == str(tmp_path / "SCRAPE_new")
+    assert DownloadJournal.find_resumable(str(tmp_path), "http://unknown.example.com/") is None
+
+
+def test_resume_offset_counts_journaled_part_files_only(tmp_path):
+    engine = make_engine(tmp_path)
+    part = tmp_path / "de_dust2.bsp.part"
+    part.write_bytes(b"x" * 300)
+    assert engine._resume_offset("de_dust2.bsp", str(part)) == 0  # Not journaled, so not trusted
+    
+    engine.journal.update("de_dust2.bsp", size=1000)
+    assert engine._resume_offset("de_dust2.bsp", str(part)) == 300
+    assert engine.downloaded_bytes == 300
+    assert engine._resume_offset("de_dust2.bsp", str(part), count=False) == 300
+    assert engine.downloaded_bytes == 300
+
+
+def test_range_headers_prefer_a_strong_etag(tmp_path):
+    engine = make_engine(tmp_path)
+    assert engine._range_headers("de_dust2.bsp", 0) == {}
+    
+    engine.journal.update("de_dust2.bsp", etag='W/"weak"', last_modified="Sat, 17 Oct 2026 12:00:00 GMT")
+    assert engine._range_headers("de_dust2.bsp", 300) == {
+        'Range': "bytes=300-", 'If-Range': "Sat, 17 Oct 2026 12:00:00 GMT"}
+    
+    engine.journal.update("de_dust2.bsp", etag='"strong"')
+    assert engine._range_headers("de_dust2.bsp", 300, 599) == {'Range': "bytes=300-599", 'If-Range': '"strong"'}
+
+
+def test_accept_range_resumes_a_matching_206(tmp_path):
+    engine = make_engine(tmp_path)
+    engine.journal.update("de_dust2.bsp", size=1000)
+    headers = {'content-range': "bytes 300-999/1000", 'content-length': "700", 'etag': '"abc"'}
+    assert engine._accept_range(BASE_URL + "de_dust2.bsp", "de_dust2.bsp", 206, headers, 300) == 300
+    assert engine.journal.get("de_dust2.bsp")['etag'] == '"abc"'
+    
+    # A full response means the server ignored the range or the file changed
+    assert engine._accept_range(BASE_URL + "de_dust2.bsp", "de_dust2.bsp", 200,
+                                {'content-length': "1000"}, 300) == 0
+
+
+def test_accept_range_starts_over_when_the_size_changed(tmp_path):
+    engine = make_engine(tmp_path)
+    engine.journal.update("de_dust2.bsp", size=1000)
+    engine._count_existing_bytes(300)
+    with pytest.raises(RemoteFileChanged):
+        engine._accept_range(BASE_URL + "de_dust2.bsp", "de_dust2.bsp", 206,
+                             {'content-range': "bytes 300-1199/1200"}, 300)
+    assert engine.journal.get("de_dust2.bsp") is None
+    assert engine.downloaded_bytes == 0
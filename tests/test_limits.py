@@ -0,0 +1,62 @@
+"""Bandwidth and request-rate limits."""
+import pytest
+
+from aeropull.net import RateLimiter
+
+
+A = "http://a.example.com/maps/de_dust2.bsp"
+B = "http://b.example.com/maps/de_dust2.bsp"
+
+
+def test_unlimited_never_waits(clock):
+    limiter = RateLimiter()
+    assert limiter.request_delay(A) == 0
+    assert limiter.bytes_delay(A, 10 ** 9) == 0
+    assert limiter.read_size() is None
+
+
+def test_requests_are_spaced_at_the_global_rate(clock):
+    limiter = RateLimiter(requests_per_second=2)
+    assert [limiter.request_delay(url) for url in (A, B, A)] == [0.5, 1.0, 1.5]
+    clock.now += 1.5
+    assert limiter.request_delay(A) == 0.5
+
+
+def test_host_limits_apply_per_host(clock):
+    limiter = RateLimiter(host_bytes_per_second=1000)
+    assert limiter.bytes_delay(A, 500) == 0.5
+    assert limiter.bytes_delay(A, 500) == 1.0
+    assert limiter.bytes_delay(B, 500) == 0.5
+
+
+def test_the_tightest_limit_wins(clock):
+    limiter = RateLimiter(bytes_per_second=1000, host_bytes_per_second=4000)
+    assert limiter.bytes_delay(A, 2000) == 2.0
+    limiter.set_limits(bytes_per_second=None)
+    assert limiter.bytes_delay(B, 2000) == 0.5
+
+
+def test_idle_time_banks_at_most_a_second(clock):
+    limiter = RateLimiter(bytes_per_second=1000)
+    clock.now += 60
+    assert limiter.bytes_delay(A, 1000) == 0
+    assert limiter.bytes_delay(A, 1000) == 1.0
+
+
+def test_set_limits_reaches_hosts_already_seen(clock):
+    limiter = RateLimiter(host_requests_per_second=1)
+    limiter.request_delay(A)
+    generation = limiter.generation
+    limiter.set_limits(host_requests_per_second=100)
+    assert limiter.generation == generation + 1
+    assert limiter.request_delay(A) == pytest.approx(0.02)
+
+
+def test_unknown_limits_are_rejected():
+    with pytest.raises(TypeError):
+        RateLimiter(requests=5)
+
+
+def test_read_size_fits_a_tenth_of_a_second(clock):
+    assert RateLimiter(bytes_per_second=1_000_000, host_bytes_per_second=500_000).read_size() == 50_000
+    assert RateLimiter(bytes_per_second=1000).read_size() == 4096
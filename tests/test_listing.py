@@ -0,0 +1,75 @@
+"""The streaming listing parser against real autoindex pages."""
+import calendar
+import os
+
+import pytest
+
+from aeropull.listing import ListingEntry, StreamingListingParser, parse_html_listing
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def utc(*fields):
+    return calendar.timegm(fields + (0,))
+
+
+FILES = [
+    ListingEntry('sub/', None, utc(2026, 10, 17, 9, 12)),
+    ListingEntry('cp_%C3%A9t%C3%A9.bsp', 524288, utc(2026, 10, 16, 23, 59)),
+    ListingEntry('de_dust2.bsp.bz2', 1048576, utc(2026, 10, 17, 12, 34)),
+]
+
+EXPECTED = {
+    'nginx_autoindex.html': [ListingEntry('../', None, None)] + FILES + [
+        ListingEntry('surf_a%26b.bsp', 2048, utc(2025, 1, 1, 0, 0)),
+        ListingEntry('zm_a_very_long_map_name_that_nginx_cuts_short_v2.bsp', 73400320, utc(2026, 3, 5, 7, 5)),
+    ],
+    'apache_autoindex.html': [
+        ListingEntry('?C=N;O=D', None, None),  # Column sort links; the crawler skips them
+        ListingEntry('?C=M;O=A', None, None),
+        ListingEntry('?C=S;O=A', None, None),
+        ListingEntry('?C=D;O=A', None, None),
+        ListingEntry('/', None, None),
+    ] + FILES + [
+        ListingEntry('surf_a&b.bsp', 2048, utc(2025, 1, 1, 0, 0)),
+        ListingEntry('zm_a_very_long_map_name_that_apache_cuts_short_v2.bsp', 73400320, utc(2026, 3, 5, 7, 5)),
+    ],
+}
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def parse(body, chunk_size, content_type='text/html'):
+    parser = StreamingListingParser(content_type)
+    for i in range(0, len(body), chunk_size):
+        parser.feed(body[i:i + chunk_size])
+    return parser.close()
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 65536])
+def test_streaming_parser_reads_autoindex_pages(name, chunk_size):
+    assert parse(read_fixture(name), chunk_size) == EXPECTED[name]
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+def test_streaming_parser_agrees_with_beautifulsoup(name):
+    body = read_fixture(name)
+    assert parse(body, 65536) == parse_html_listing(body.decode('utf-8'))
+
+
+def test_format_is_detected_without_a_content_type():
+    body = (b'[{"name": "de_dust2.bsp.bz2", "type": "file", "mtime": "Sat, 17 Oct 2026 12:34:56 GMT", '
+            b'"size": 1048576}, {"name": "sub", "type": "directory", "mtime": "Sat, 17 Oct 2026 09:12:00 GMT"}]')
+    assert parse(body, 10, content_type='') == [
+        ListingEntry('de_dust2.bsp.bz2', 1048576, calendar.timegm((2026, 10, 17, 12, 34, 56))),
+        ListingEntry('sub/', None, calendar.timegm((2026, 10, 17, 9, 12, 0))),
+    ]
+
+
+def test_empty_listing():
+    assert parse(b'<html><body><h1>Index of /maps/</h1><hr><pre></pre></body></html>', 16) == []
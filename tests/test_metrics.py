@@ -0,0 +1,72 @@
+"""Phase histograms and their exports."""
+import json
+
+import pytest
+
+from aeropull import metrics as metrics_module
+from aeropull.metrics import Histogram, Metrics
+
+
+def test_quantile_without_observations():
+    assert Histogram().quantile(0.5) is None
+
+
+def test_quantile_interpolates_within_its_bucket():
+    histogram = Histogram(buckets=(1.0, 2.0, 4.0))
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+    assert histogram.quantile(0.25) == pytest.approx(1.0)
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(0.75) == pytest.approx(2.0)
+    assert histogram.quantile(1.0) == pytest.approx(4.0)
+
+
+def test_bounds_are_inclusive_like_prometheus_le():
+    histogram = Histogram(buckets=(1.0, 2.0))
+    histogram.observe(1.0)
+    assert histogram.counts == [1, 0, 0]
+
+
+def test_quantile_past_the_last_bucket_reports_the_last_bound():
+    histogram = Histogram(buckets=(1.0, 2.0))
+    histogram.observe(0.5)
+    histogram.observe(100.0)
+    assert histogram.quantile(0.99) == 2.0
+    assert (histogram.count, histogram.sum) == (2, 100.5)
+
+
+def test_prometheus_export():
+    metrics = Metrics()
+    metrics.observe('head', 0.003)
+    metrics.add('bytes', 65536, host="example.com")
+    metrics.add_gauge_source('hosts', lambda: [('host_in_flight', {'host': 'a"b'}, 2)])
+    text = metrics.prometheus()
+    assert 'aeropull_phase_seconds_bucket{phase="head",le="0.005"} 1' in text
+    assert 'aeropull_phase_seconds_bucket{phase="head",le="+Inf"} 1' in text
+    assert 'aeropull_phase_seconds_count{phase="head"} 1' in text
+    assert 'aeropull_bytes_total{host="example.com"} 65536' in text
+    assert 'aeropull_host_in_flight{host="a\\"b"} 2' in text
+
+
+def test_snapshot_is_json():
+    metrics = Metrics()
+    with metrics.timed('file'):
+        pass
+    metrics.add('files', result="completed")
+    metrics.add_gauge_source('broken', lambda: 1 / 0)  # Left out, not fatal
+    snapshot = json.loads(json.dumps(metrics.snapshot()))
+    assert snapshot['phases']['file']['count'] == 1
+    assert snapshot['phases']['file']['in_flight'] == 0
+    assert snapshot['phases']['body']['p50'] is None
+    assert snapshot['counters'] == {'files': {'result=completed': 1}}
+    assert snapshot['gauges'] == {'in_flight': {'phase=file': 0}}
+
+
+def test_finish_can_leave_out_time_spent_elsewhere(clock, monkeypatch):
+    monkeypatch.setattr(metrics_module, 'time', clock)
+    metrics = Metrics()
+    began = metrics.start('listing_fetch')
+    clock.sleep(3.0)
+    metrics.finish('listing_fetch', began, excluding=1.0)
+    assert metrics.histograms['listing_fetch'].sum == pytest.approx(2.0)
+    assert metrics.in_flight['listing_fetch'] == 0
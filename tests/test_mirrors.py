@@ -0,0 +1,80 @@
+"""Choosing between mirrors and failing over when one breaks."""
+import socket
+from urllib.parse import urlparse
+
+import pytest
+
+from aeropull.engine import DownloadEngine
+from aeropull.net import CircuitBreaker, MirrorSet
+
+
+PRIMARY = "http://fastdl.example.com/cstrike/"
+MIRROR = "http://mirror.example.net/cs/"
+FILE = "maps/de_x.bsp"
+
+
+def test_urls_move_onto_the_chosen_mirror():
+    mirrors = MirrorSet([PRIMARY, MIRROR.rstrip('/')])
+    assert mirrors.base_of(MIRROR + FILE) == MIRROR
+    assert mirrors.base_of("http://elsewhere.example.org/x") is None
+    assert mirrors.same_source(PRIMARY + FILE, PRIMARY + "sound/a.wav")
+    assert not mirrors.same_source(PRIMARY + FILE, MIRROR + FILE)
+    assert mirrors.choose(PRIMARY + FILE, avoid={PRIMARY}) == MIRROR + FILE
+    assert mirrors.choose("http://elsewhere.example.org/x") == "http://elsewhere.example.org/x"
+
+
+def test_unmeasured_and_idle_mirrors_go_first():
+    mirrors = MirrorSet([PRIMARY, MIRROR])
+    assert mirrors.choose(PRIMARY + FILE) == PRIMARY + FILE
+    with mirrors.use(PRIMARY + FILE):
+        assert mirrors.choose(PRIMARY + FILE) == MIRROR + FILE  # Spread over both while neither is measured
+    mirrors.record_transfer(PRIMARY + FILE, 1_000_000, 1.0)
+    assert mirrors.choose(PRIMARY + FILE) == MIRROR + FILE  # Measure the other one too
+
+
+def test_the_faster_mirror_wins_until_it_fails():
+    mirrors = MirrorSet([PRIMARY, MIRROR])
+    mirrors.record_transfer(PRIMARY + FILE, 1_000_000, 1.0)
+    mirrors.record_transfer(MIRROR + FILE, 3_000_000, 1.0)
+    assert mirrors.choose(PRIMARY + FILE) == MIRROR + FILE
+    
+    mirrors.record_failure(MIRROR + FILE)
+    assert mirrors.choose(PRIMARY + FILE) == MIRROR + FILE  # Halved, still faster
+    mirrors.record_failure(MIRROR + FILE)
+    assert mirrors.choose(PRIMARY + FILE) == PRIMARY + FILE
+    
+    mirrors.record_transfer(MIRROR + FILE, 3_000_000, 1.0)  # A good transfer forgives the failures
+    assert mirrors.choose(PRIMARY + FILE) == MIRROR + FILE
+
+
+def test_mirrors_with_an_open_circuit_are_passed_over(clock):
+    breaker = CircuitBreaker(threshold=1)
+    mirrors = MirrorSet([PRIMARY, MIRROR], breaker)
+    breaker.record_failure(PRIMARY)
+    assert mirrors.choose(PRIMARY + FILE) == MIRROR + FILE
+    breaker.record_failure(MIRROR)
+    assert mirrors.choose(PRIMARY + FILE) == PRIMARY + FILE  # Every circuit open: no better choice
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.mark.parametrize("engine_type", ["threaded", "asyncio"])
+def test_files_fail_over_from_a_dead_mirror(fastdl, tmp_path, engine_type):
+    served, url = fastdl
+    for n in range(4):
+        (served / f"de_{n}.bsp").write_bytes(bytes([n]) * 5000)
+    dead = f"http://127.0.0.1:{unused_port()}/maps/"
+    folder = tmp_path / "SCRAPE_maps"
+    
+    engine = DownloadEngine(url, str(folder), engine_type=engine_type, mirrors=[dead],
+                            history_file=None, crawl_index_path=None)
+    assert engine.run() == "complete"
+    for n in range(4):
+        assert (folder / f"de_{n}.bsp").read_bytes() == bytes([n]) * 5000
+    failovers = engine.metrics.snapshot()['counters']['failovers']
+    assert failovers.get(f"host={urlparse(dead).netloc}", 0) >= 1
+    assert not engine.retry_counts  # Moving to another mirror doesn't use up a retry
@@ -0,0 +1,164 @@
+"""Retries with backoff and Retry-After, and the per-host circuit breaker."""
+from email.utils import formatdate
+from http.client import IncompleteRead
+
+import pytest
+
+from aeropull import engine as engine_module
+from aeropull import net
+from aeropull.engine import DownloadEngine
+from aeropull.net import CircuitBreaker, HostUnavailable, RetryPolicy
+
+
+URL = "http://fastdl.example.com/maps/de_dust2.bsp"
+
+
+class HTTPError(Exception):
+    """An HTTP error the way aiohttp reports one: status and headers on the exception."""
+    
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.headers = headers or {}
+
+
+@pytest.fixture
+def longest_backoff(monkeypatch):
+    """Make full jitter always pick the longest wait."""
+    monkeypatch.setattr(net.random, 'uniform', lambda low, high: high)
+
+
+def test_what_gets_retried():
+    policy = RetryPolicy()
+    assert policy.retryable(HTTPError(503))
+    assert policy.retryable(HTTPError(429))
+    assert not policy.retryable(HTTPError(404))
+    assert policy.retryable(ConnectionResetError())
+    assert policy.retryable(IncompleteRead(b"partial", 100))  # A body cut short
+    assert not policy.retryable(ValueError())
+
+
+def test_backoff_doubles_up_to_the_cap(longest_backoff):
+    policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+    assert [policy.backoff(attempt) for attempt in range(1, 6)] == [2.0, 4.0, 8.0, 10.0, 10.0]
+
+
+def test_backoff_jitters_between_zero_and_the_cap():
+    policy = RetryPolicy(base_delay=1.0, max_delay=60.0)
+    delays = [policy.backoff(3) for _ in range(200)]
+    assert all(0 <= delay <= 8.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_retry_after_wins_within_reason(clock):
+    policy = RetryPolicy(max_delay=10.0)
+    assert policy.retry_after(HTTPError(503, {'retry-after': "7"})) == 7.0
+    assert policy.retry_after(HTTPError(503, {'retry-after': formatdate(clock.now + 30, usegmt=True)})) == 30.0
+    assert policy.retry_after(HTTPError(503)) is None
+    assert policy.backoff(1, retry_after=7.0) == 7.0
+    assert policy.backoff(1, retry_after=3600.0) == 50.0
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=5.0)
+    for _ in range(2):
+        breaker.record_failure(URL)
+    assert breaker.delay(URL) == 0
+    breaker.record_success(URL)  # Not consecutive any more
+    for _ in range(3):
+        breaker.record_failure(URL)
+    assert breaker.is_open(URL)
+    assert breaker.delay(URL) == 5.0
+    assert breaker.delay("http://other.example.com/") == 0
+
+
+def test_half_open_breaker_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=5.0, max_cooldown=15.0)
+    breaker.record_failure(URL)
+    clock.now += 5
+    assert breaker.delay(URL) == 0  # The probe
+    assert breaker.delay(URL) > 0  # Everyone else waits for it
+    
+    breaker.record_failure(URL)  # Probe failed: open again, for twice as long
+    assert breaker.delay(URL) == 10.0
+    clock.now += 10
+    assert breaker.delay(URL) == 0
+    breaker.record_failure(URL)
+    assert breaker.delay(URL) == 15.0  # Capped
+    
+    clock.now += 15
+    assert breaker.delay(URL) == 0
+    breaker.record_success(URL)  # Probe answered: closed
+    assert [breaker.delay(URL) for _ in range(3)] == [0, 0, 0]
+    breaker.record_failure(URL)
+    assert breaker.delay(URL) == 5.0  # Cooldown starts over
+
+
+def test_retry_after_holds_a_closed_circuit(clock):
+    breaker = CircuitBreaker(threshold=5)
+    breaker.record_response(URL, 503, "20")
+    assert breaker.delay(URL) == 20.0
+    breaker.record_response(URL, 200)
+    assert breaker.delay(URL) == 20.0  # Still honoured
+    clock.now += 20
+    assert breaker.delay(URL) == 0
+
+
+def test_breaker_gives_up_on_a_host_that_never_recovers(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=5.0, give_up=60.0)
+    breaker.record_failure(URL)
+    breaker.record_failure(URL)
+    clock.now += 61
+    with pytest.raises(HostUnavailable):
+        breaker.delay(URL)
+
+
+@pytest.fixture
+def engine(tmp_path, clock, monkeypatch, longest_backoff):
+    monkeypatch.setattr(engine_module, 'time', clock)
+    return DownloadEngine(URL, str(tmp_path), retries=3, history_file=None, crawl_index_path=None)
+
+
+def flaky(*errors, result="listing"):
+    """Return a fetch that raises each of errors in turn, then returns result."""
+    calls = []
+    
+    def fetch():
+        calls.append(True)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    fetch.calls = calls
+    return fetch
+
+
+def test_with_retries_backs_off_until_it_succeeds(engine, clock):
+    fetch = flaky(ConnectionResetError(), IncompleteRead(b"", 10))
+    began = clock.now
+    assert engine._with_retries(URL, fetch) == "listing"
+    assert len(fetch.calls) == 3
+    assert clock.now - began == pytest.approx(2.0 + 4.0)
+
+
+def test_with_retries_waits_as_long_as_retry_after_says(engine, clock):
+    fetch = flaky(HTTPError(503, {'retry-after': "12"}))
+    began = clock.now
+    assert engine._with_retries(URL, fetch) == "listing"
+    assert clock.now - began == pytest.approx(12.0)
+
+
+def test_with_retries_gives_up(engine):
+    fetch = flaky(*[ConnectionResetError()] * 10)
+    with pytest.raises(ConnectionResetError):
+        engine._with_retries(URL, fetch)
+    assert len(fetch.calls) == 4  # The first try and three retries
+    
+    fetch = flaky(HTTPError(404))
+    with pytest.raises(HTTPError):
+        engine._with_retries(URL, fetch)
+    assert len(fetch.calls) == 1  # Not worth retrying
+
+
+def test_retry_wait_stops_on_cancel(engine):
+    engine.cancel()
+    assert not engine._retry_wait(URL, ConnectionResetError(), 1)
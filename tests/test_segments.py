@@ -0,0 +1,57 @@
+"""Resuming a file that was being downloaded in segments."""
+import os
+
+import pytest
+
+from aeropull.engine import DownloadEngine
+from aeropull.storage import DownloadJournal, PART_SUFFIX
+from aeropull.verify import verify_folder
+
+
+SIZE = 40000
+CONTENT = bytes(i * 7 % 251 for i in range(SIZE))
+# Segment 0 and 2 finished, segment 1 part way, segment 3 not started
+SEGMENTS = [[0, 9999, 10000], [10000, 19999, 4000], [20000, 29999, 10000], [30000, 39999, 0]]
+
+
+def interrupted_download(fastdl, folder):
+    """Leave folder the way a cancelled segmented download of big.bsp does."""
+    served, url = fastdl
+    (served / "big.bsp").write_bytes(CONTENT)
+    st = os.stat(served / "big.bsp")
+    
+    folder.mkdir()
+    part = bytearray(SIZE)  # Preallocated, so unfinished segments are zeros
+    for start, end, done in SEGMENTS:
+        part[start:start + done] = CONTENT[start:start + done]
+    (folder / ("big.bsp" + PART_SUFFIX)).write_bytes(part)
+    DownloadJournal(str(folder), url).update(
+        "big.bsp", url=url + "big.bsp", etag='"%x-%x"' % (int(st.st_mtime), SIZE), size=SIZE, segments=SEGMENTS)
+    return url
+
+
+@pytest.mark.parametrize("engine_type, sync", [("threaded", False), ("threaded", True), ("asyncio", False)])
+def test_segmented_part_resumes_without_holes(fastdl, tmp_path, engine_type, sync):
+    folder = tmp_path / "SCRAPE_resume"
+    url = interrupted_download(fastdl, folder)
+    if sync:
+        (folder / "big.bsp").write_bytes(b"older copy")  # Revalidated with a conditional request
+    
+    engine = DownloadEngine(url, str(folder), engine_type=engine_type, sync=sync, segment_threshold=1000,
+                            history_file=None, crawl_index_path=None)
+    assert engine.run() == "complete"
+    assert (folder / "big.bsp").read_bytes() == CONTENT
+    assert not (folder / ("big.bsp" + PART_SUFFIX)).exists()
+    assert verify_folder(str(folder)) == []
+
+
+def test_resume_offset_keeps_only_finished_leading_segments(fastdl, tmp_path):
+    folder = tmp_path / "SCRAPE_resume"
+    url = interrupted_download(fastdl, folder)
+    engine = DownloadEngine(url, str(folder), history_file=None, crawl_index_path=None)
+    engine.journal = DownloadJournal(str(folder), url)
+    part = folder / ("big.bsp" + PART_SUFFIX)
+    
+    assert engine._resume_offset("big.bsp", str(part)) == 14000
+    assert part.read_bytes() == CONTENT[:14000]
+    assert not engine.journal.get("big.bsp")['segments']
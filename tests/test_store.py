@@ -0,0 +1,98 @@
+"""The content-addressed object store shared by scrape folders."""
+import hashlib
+import os
+
+import pytest
+
+from aeropull.engine import DownloadEngine
+from aeropull.storage import ObjectStore
+
+
+CONTENT = b"VBSP" + bytes(range(256)) * 16
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+ETAG = '"5f3a-1004"'
+
+
+def downloaded(folder, name, content=CONTENT):
+    path = folder / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_identical_files_are_stored_once(tmp_path):
+    store = ObjectStore(str(tmp_path / "store"))
+    first = downloaded(tmp_path / "a", "maps/de_x.bsp")
+    second = downloaded(tmp_path / "b", "maps/de_x.bsp")
+    store.add(first, DIGEST, "http://one.example.com/maps/de_x.bsp", ETAG)
+    store.add(second, DIGEST, "http://two.example.com/maps/de_x.bsp")
+    
+    stored = os.stat(store.object_path(DIGEST))
+    assert os.stat(first).st_ino == os.stat(second).st_ino == stored.st_ino
+    assert stored.st_nlink == 3
+    assert store.lookup("http://two.example.com/maps/de_x.bsp") == (DIGEST, len(CONTENT), None, None)
+    assert store.find(ETAG, len(CONTENT)) == DIGEST
+    assert store.find('W/' + ETAG, len(CONTENT)) is None  # Weak ETags don't promise identical bytes
+    assert store.find(ETAG, len(CONTENT) + 1) is None
+    store.close()
+
+
+def test_missing_objects_are_not_offered(tmp_path):
+    store = ObjectStore(str(tmp_path / "store"))
+    store.add(downloaded(tmp_path / "a", "de_x.bsp"), DIGEST, "http://one.example.com/de_x.bsp", ETAG)
+    os.remove(store.object_path(DIGEST))
+    
+    assert store.lookup("http://one.example.com/de_x.bsp") is None
+    assert store.find(ETAG, len(CONTENT)) is None
+    assert not store.materialize(DIGEST, str(tmp_path / "b" / "de_x.bsp"))
+    store.close()
+
+
+def test_files_are_copied_when_they_cant_be_hardlinked(tmp_path, monkeypatch):
+    def cross_device(src, dst):
+        raise OSError(18, "Invalid cross-device link")
+    monkeypatch.setattr(os, 'link', cross_device)
+    store = ObjectStore(str(tmp_path / "store"))
+    first = downloaded(tmp_path / "a", "de_x.bsp")
+    store.add(first, DIGEST, "http://one.example.com/de_x.bsp")
+    
+    assert store.materialize(DIGEST, str(tmp_path / "b" / "de_x.bsp"))
+    assert (tmp_path / "b" / "de_x.bsp").read_bytes() == CONTENT
+    assert os.stat(first).st_ino != os.stat(store.object_path(DIGEST)).st_ino
+    assert not os.path.exists(store.object_path(DIGEST) + ".link")
+    store.close()
+
+
+def test_files_are_copied_when_they_cant_be_reflinked(tmp_path, monkeypatch):
+    def unsupported(self, src, dst):
+        raise OSError(95, "Operation not supported")
+    monkeypatch.setattr(ObjectStore, '_reflink', unsupported)
+    store = ObjectStore(str(tmp_path / "store"), link="reflink")
+    store.add(downloaded(tmp_path / "a", "de_x.bsp"), DIGEST, "http://one.example.com/de_x.bsp")
+    
+    assert store.materialize(DIGEST, str(tmp_path / "b" / "de_x.bsp"))
+    assert (tmp_path / "b" / "de_x.bsp").read_bytes() == CONTENT
+    store.close()
+
+
+def test_unknown_link_mode(tmp_path):
+    with pytest.raises(ValueError):
+        ObjectStore(str(tmp_path / "store"), link="symlink")
+
+
+@pytest.mark.parametrize("engine_type", ["threaded", "asyncio"])
+def test_second_scrape_links_from_the_store(fastdl, tmp_path, engine_type):
+    served, url = fastdl
+    (served / "de_x.bsp").write_bytes(CONTENT)
+    store = str(tmp_path / "store")
+    
+    for run, name in enumerate(("SCRAPE_a", "SCRAPE_b")):
+        engine = DownloadEngine(url, str(tmp_path / name), engine_type=engine_type, store=store,
+                                history_file=None, crawl_index_path=None)
+        assert engine.run() == "complete"
+        if run:
+            assert engine.transferred_bytes == 0  # Revalidated, not downloaded again
+    
+    first, second = tmp_path / "SCRAPE_a" / "de_x.bsp", tmp_path / "SCRAPE_b" / "de_x.bsp"
+    assert second.read_bytes() == CONTENT
+    assert os.stat(first).st_ino == os.stat(second).st_ino
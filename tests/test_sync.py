@@ -0,0 +1,72 @@
+"""Deciding which files of an existing mirror a sync can skip."""
+import calendar
+import os
+import time
+
+import pytest
+
+from aeropull.engine import DownloadEngine
+from aeropull.storage import MirrorState
+
+
+BASE_URL = "http://fastdl.example.com/maps/"
+# 17 Oct 2026 12:34, as an HTML listing shows it
+LISTED = calendar.timegm((2026, 10, 17, 12, 34, 0))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = DownloadEngine(BASE_URL, str(tmp_path), sync=True, history_file=None, crawl_index_path=None)
+    engine.mirror_state = MirrorState(str(tmp_path))
+    return engine
+
+
+@pytest.fixture
+def local_file(tmp_path):
+    path = tmp_path / "de_dust2.bsp"
+    path.write_bytes(b"x" * 100)
+    return str(path)
+
+
+def set_mtime(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+
+def test_unchanged_within_the_listed_minute(engine, local_file):
+    for seconds in (0, 1, 59):
+        set_mtime(local_file, LISTED + seconds)
+        assert engine._mirror_unchanged("de_dust2.bsp", local_file, 100, LISTED)
+
+
+def test_changed_outside_the_listed_minute(engine, local_file):
+    for seconds in (-1, 60, 3600):
+        set_mtime(local_file, LISTED + seconds)
+        assert not engine._mirror_unchanged("de_dust2.bsp", local_file, 100, LISTED)
+
+
+def test_changed_size(engine, local_file):
+    set_mtime(local_file, LISTED)
+    assert not engine._mirror_unchanged("de_dust2.bsp", local_file, 101, LISTED)
+
+
+def test_unknown_size_or_time_is_revalidated(engine, local_file):
+    set_mtime(local_file, LISTED)
+    assert not engine._mirror_unchanged("de_dust2.bsp", local_file, None, LISTED)
+    assert not engine._mirror_unchanged("de_dust2.bsp", local_file, 100, None)
+
+
+def test_listing_with_seconds_must_match_exactly(engine, local_file):
+    listed = LISTED + 17
+    set_mtime(local_file, listed)
+    assert engine._mirror_unchanged("de_dust2.bsp", local_file, 100, listed)
+    set_mtime(local_file, listed + 1)
+    assert not engine._mirror_unchanged("de_dust2.bsp", local_file, 100, listed)
+
+
+def test_recorded_last_modified_wins_over_the_local_mtime(engine, local_file):
+    set_mtime(local_file, time.time())  # Touched locally since it was downloaded
+    engine.mirror_state.update("de_dust2.bsp", last_modified="Sat, 17 Oct 2026 12:34:56 GMT")
+    assert engine._mirror_unchanged("de_dust2.bsp", local_file, 100, LISTED)
+    
+    engine.mirror_state.update("de_dust2.bsp", last_modified="Sat, 17 Oct 2026 12:35:00 GMT")
+    assert not engine._mirror_unchanged("de_dust2.bsp", local_file, 100, LISTED)
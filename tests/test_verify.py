@@ -0,0 +1,92 @@
+"""Checksumming downloads into the manifest and verifying folders against it."""
+import hashlib
+import io
+import zlib
+
+import pytest
+
+from aeropull.engine import DownloadEngine
+from aeropull.storage import HashingWriter, Manifest
+from aeropull.verify import verify_folder
+
+
+CONTENT = bytes(i * 13 % 256 for i in range(300000))
+
+
+def test_hashing_writer_checksums_what_passes_through(tmp_path, monkeypatch):
+    out = io.BytesIO()
+    writer = HashingWriter().wrap(out)
+    for i in range(0, len(CONTENT), 4096):
+        writer.write(CONTENT[i:i + 4096])
+    expected = {'size': len(CONTENT), 'sha256': hashlib.sha256(CONTENT).hexdigest(),
+                'crc32': f"{zlib.crc32(CONTENT):08x}"}
+    assert out.getvalue() == CONTENT
+    assert writer.checksums() == expected
+    
+    path = tmp_path / "de_x.bsp"
+    path.write_bytes(CONTENT)
+    monkeypatch.setattr(HashingWriter, 'BLOCK', 65536)  # Several blocks
+    assert HashingWriter.from_file(str(path)).checksums() == expected
+    assert HashingWriter.from_file(str(path), length=1000).checksums()['crc32'] == f"{zlib.crc32(CONTENT[:1000]):08x}"
+    assert HashingWriter.from_file(str(path), sha256=False).checksums()['sha256'] is None
+    (tmp_path / "empty").write_bytes(b"")
+    assert HashingWriter.from_file(str(tmp_path / "empty")).checksums()['size'] == 0
+
+
+def test_manifest_round_trip(tmp_path):
+    manifest = Manifest(str(tmp_path), "http://fastdl.example.com/")
+    manifest.update("maps/de_x.bsp", size=3, sha256="ab", crc32="00000001")
+    manifest.update("maps/de_y.bsp", size=4)
+    manifest.remove("maps/de_y.bsp")
+    manifest.save()
+    
+    reloaded = Manifest(str(tmp_path))
+    assert reloaded.base_url == "http://fastdl.example.com/"
+    assert reloaded.files == {"maps/de_x.bsp": {'size': 3, 'sha256': "ab", 'crc32': "00000001"}}
+    assert reloaded.get("maps/de_y.bsp") == {}
+
+
+def scrape(fastdl, tmp_path, **options):
+    served, url = fastdl
+    (served / "de_small.bsp").write_bytes(CONTENT[:5000])
+    (served / "de_big.bsp").write_bytes(CONTENT)
+    folder = tmp_path / "SCRAPE_maps"
+    engine = DownloadEngine(url, str(folder), history_file=None, crawl_index_path=None, **options)
+    assert engine.run() == "complete"
+    return folder
+
+
+@pytest.mark.parametrize("options", [{}, {'engine_type': "asyncio"}, {'segment_threshold': 1000}])
+def test_downloads_are_recorded_in_the_manifest(fastdl, tmp_path, options):
+    folder = scrape(fastdl, tmp_path, **options)
+    manifest = Manifest(str(folder))
+    for name, content in (("de_small.bsp", CONTENT[:5000]), ("de_big.bsp", CONTENT)):
+        entry = manifest.get(name)
+        assert entry['size'] == len(content)
+        assert entry['sha256'] == hashlib.sha256(content).hexdigest()
+        assert entry['crc32'] == f"{zlib.crc32(content):08x}"
+        assert entry['url'].endswith(name)
+    assert verify_folder(str(folder)) == []
+
+
+def test_verify_reports_every_kind_of_damage(fastdl, tmp_path):
+    folder = scrape(fastdl, tmp_path)
+    (folder / "de_small.bsp").unlink()
+    with open(folder / "de_big.bsp", 'r+b') as f:
+        f.seek(1000)
+        f.write(b"\xff\xff")
+    
+    checked = []
+    problems = verify_folder(str(folder), workers=2, on_result=lambda *result: checked.append(result))
+    assert problems == [("de_big.bsp", "sha256 mismatch"), ("de_small.bsp", "missing")]
+    assert sorted(checked) == problems
+    assert verify_folder(str(folder), quick=True) == [("de_big.bsp", "crc32 mismatch"), ("de_small.bsp", "missing")]
+    
+    with open(folder / "de_big.bsp", 'ab') as f:
+        f.write(b"x")
+    assert ("de_big.bsp", f"size is {len(CONTENT) + 1}, expected {len(CONTENT)}") in verify_folder(str(folder))
+
+
+def test_verify_needs_a_manifest(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        verify_folder(str(tmp_path))